@@ -0,0 +1,23 @@
+from app.core.cache import CacheTTL
+from app.core.config import settings
+
+# Usuários autenticados, indexados pelo `sub` do token (e-mail). Os objetos
+# guardados aqui estão desanexados de qualquer sessão e são compartilhados
+# entre requests: só leia as colunas deles, nunca os altere.
+# O TTL curto limita por quanto tempo outro worker pode ver um usuário desatualizado.
+_cache = CacheTTL(max_itens=settings.AUTH_CACHE_MAX_ITENS, ttl_segundos=settings.AUTH_CACHE_TTL_SEGUNDOS)
+
+
+def obter(email: str):
+    return _cache.get(email)
+
+
+def guardar(email: str, usuario) -> None:
+    _cache.set(email, usuario)
+
+
+def invalidar(*emails: str | None) -> None:
+    """Remove os usuários do cache (chamar sempre que um usuário for alterado)."""
+    for email in emails:
+        if email:
+            _cache.delete(email)
@@ -2,6 +2,18 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    # Pool de conexões (por processo)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SEGUNDOS: float = 30.0 # Espera máxima por uma conexão livre
+    DB_POOL_RECYCLE_SEGUNDOS: int = 60 * 30
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_AQUECER: int | None = None # Conexões abertas no startup de cada worker da API (padrão: DB_POOL_SIZE)
+    DB_STATEMENT_TIMEOUT_MS: int = 30_000
+    DB_IDLE_TRANSACTION_TIMEOUT_MS: int = 60_000
+    DB_APPLICATION_NAME: str = "mustafa-backend"
+    DB_CONTAR_QUERIES: bool = False # Cabeçalho X-Query-Count em cada resposta (diagnóstico de N+1)
+
     SECRET_KEY: str
     SUPERUSER_EMAIL: str
     SUPERUSER_PASSWORD: str
@@ -11,9 +23,101 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7 # 7 dias
 
+    # Cache do usuário autenticado (evita uma query por request protegido)
+    AUTH_CACHE_TTL_SEGUNDOS: int = 30
+    AUTH_CACHE_MAX_ITENS: int = 5000
+
+    # Hash de senhas (bcrypt) num pool de processos dedicado
+    BCRYPT_ROUNDS: int = 12 # Hashes com outro custo são refeitos no próximo login
+    HASH_PROCESSOS: int = 2
+    HASH_MAX_CONCORRENTES: int = 8 # Por worker da API; o excedente espera na fila
+
+    # Upload de contratos
+    CONTRATO_MAX_BYTES: int = 20 * 1024 * 1024 # 20 MB
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024
+
+    # Armazenamento endereçado por conteúdo (fotos e contratos)
+    STORAGE_BACKEND: str = "local"
+    STORAGE_DIR: str = "./uploads/blobs"
+    STORAGE_URL_PREFIXO: str = "/midia"
+    # Armazenamento frio: para onde vão as mídias das partições arquivadas
+    # (ex.: um volume barato montado aqui; mesmo layout de chaves do STORAGE_DIR)
+    STORAGE_FRIO_DIR: str = "./uploads/frio"
+    # URLs de mídia são assinadas por empresa; a assinatura vale de 1 a 2 janelas deste tamanho
+    MIDIA_URL_TTL_SEGUNDOS: int = 60 * 60 * 24
+    # Quem entrega os bytes: 'api' (a própria API, com Range), 'nginx' (X-Accel-Redirect)
+    # ou 'sendfile' (X-Sendfile, Apache/lighttpd). Nos dois últimos a API só autoriza.
+    MIDIA_ENTREGA: str = "api"
+    MIDIA_ACCEL_PREFIXO: str = "/_midia_interna" # location `internal` do nginx apontando para STORAGE_DIR
+    # Arquivos de antes do storage por conteúdo (até rodar `manage.py migrar-storage`),
+    # servidos pela mesma rota assinada nas URLs antigas /fotos-promotores e /arquivos-contratos
+    LEGADO_FOTOS_DIR: str = "./uploads/fotos_promotores"
+    LEGADO_CONTRATOS_DIR: str = "./uploads"
+
     TWILIO_ACCOUNT_SID: str
     TWILIO_AUTH_TOKEN: str
 
+    # Fila de ingestão das fotos do WhatsApp
+    INGESTAO_WORKERS: int = 4
+    INGESTAO_MAX_PENDENTES: int = 5000 # Acima disso o webhook responde 503 (backpressure)
+    INGESTAO_MAX_TENTATIVAS: int = 5
+    INGESTAO_BACKOFF_BASE_SEGUNDOS: float = 10.0
+    INGESTAO_BACKOFF_MAX_SEGUNDOS: float = 60 * 30
+    INGESTAO_LEASE_SEGUNDOS: int = 60 * 5 # Tempo até um job "processando" ser considerado abandonado
+    INGESTAO_POLL_SEGUNDOS: float = 1.0
+    INGESTAO_DRENAGEM_SEGUNDOS: float = 20.0 # No desligamento, prazo para terminar os jobs em andamento
+    # Workers de ingestão rodando dentro de cada processo da API (0 = só no serviço
+    # separado `manage.py ingestao-worker`, como no docker-compose)
+    INGESTAO_WORKERS_NA_API: int = 0
+
+    # Cliente HTTP compartilhado para baixar as mídias da Twilio
+    MIDIA_MAX_CONEXOES: int = 50
+    MIDIA_MAX_CONCORRENTES_POR_HOST: int = 8
+    MIDIA_TIMEOUT_CONEXAO_SEGUNDOS: float = 5.0
+    MIDIA_TIMEOUT_LEITURA_SEGUNDOS: float = 30.0
+    MIDIA_CHUNK_BYTES: int = 64 * 1024
+
+    # Quase-duplicatas: distância de Hamming máxima entre os dHash de duas fotos
+    # da mesma empresa no mesmo dia (-1 desliga a detecção)
+    DUPLICATA_DISTANCIA_MAXIMA: int = 6
+
+    # Contexto enviado ao Gemini no /insights/ask
+    IA_CONTEXTO_MAX_TOKENS: int = 8000
+    IA_CONTEXTO_DIAS: int = 90
+    IA_CONTEXTO_AMOSTRAS: int = 30
+
+    # Cache das respostas do /insights/ask ('memoria' ou 'postgres', compartilhado entre workers)
+    IA_CACHE_BACKEND: str = "memoria"
+    IA_CACHE_TTL_SEGUNDOS: int = 60 * 60
+    IA_CACHE_MAX_ITENS: int = 1000
+    IA_STREAM_TIMEOUT_SEGUNDOS: float = 90.0
+
+    # Extração de loja/cidade das legendas (dicionário local + IA em lote)
+    EXTRACAO_DICIONARIO_TTL_SEGUNDOS: int = 300 # Lojas novas passam a valer na ingestão depois disso
+    EXTRACAO_IA_LEGENDAS_POR_CHAMADA: int = 40
+    EXTRACAO_IA_MAX_LOJAS_NO_PROMPT: int = 300
+    EXTRACAO_CACHE_TTL_SEGUNDOS: int = 60 * 60 * 24
+    EXTRACAO_CACHE_MAX_ITENS: int = 20000
+    EXTRACAO_IA_INTERVALO_SEGUNDOS: float = 60.0 # Rodadas do worker de ingestão nas pendentes (0 = só via `manage.py extrair-lojas`)
+    EXTRACAO_IA_FOTOS_POR_RODADA: int = 200
+
+    # Painéis de lojas/cidades/horários (ver crud/agregados.py)
+    ANALYTICS_JANELA_DIAS: int = 90 # Até onde a cobertura procura a última foto de cada loja
+
+    # Prestart e migrações (ver db/migracoes)
+    PRESTART_PRAZO_SEGUNDOS: float = 60.0 # Espera máxima pelo banco (backoff exponencial)
+    PRESTART_CONNECT_TIMEOUT_SEGUNDOS: int = 2
+    MIGRACAO_LOCK_TIMEOUT_MS: int = 3000 # Desiste (e tenta de novo) em vez de enfileirar atrás de queries longas
+    MIGRACAO_TENTATIVAS: int = 5
+
+    # Partições mensais de fotos_promotores e retenção (ver db/particoes.py)
+    PARTICOES_MESES_A_FRENTE: int = 3
+    RETENCAO_MESES: int = 24 # Partições mais antigas que isso são arquivadas por `manage.py arquivar-fotos`
+
+    # Exportações (CSV/XLSX)
+    EXPORTACAO_LOTE: int = 2000 # Linhas lidas do cursor no servidor por vez
+    FUSO_HORARIO_RELATORIOS: str = "America/Sao_Paulo"
+
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding='utf-8')
 
 settings = Settings()
\ No newline at end of file
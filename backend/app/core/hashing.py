@@ -1,6 +1,24 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# min_rounds = max_rounds = custo configurado: qualquer hash com outro custo
+# é considerado desatualizado e refeito no próximo login bem-sucedido.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica se a senha fornecida corresponde à senha com hash."""
@@ -8,4 +26,100 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     """Gera o hash de uma senha."""
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+
+# --- Versões assíncronas, para as rotas da API ---
+# O bcrypt custa ~250ms de CPU. Rodá-lo num pool de processos libera o event
+# loop e o threadpool do worker e usa os outros núcleos; o semáforo limita
+# quantos hashes cada worker pode ter em andamento.
+
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_semaforo: asyncio.Semaphore | None = None
+
+_metricas = {"total": 0, "em_espera": 0, "espera_total_s": 0.0, "espera_max_s": 0.0}
+_metricas_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # forkserver: o pool nasce dentro de um worker já com event loop,
+            # threads e pools de conexão; um fork desse estado não é seguro
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.HASH_PROCESSOS,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+        return _executor
+
+
+def _verificar_no_processo(plain_password: str, hashed_password: str) -> tuple[float, tuple[bool, str | None]]:
+    return time.time(), pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def _gerar_hash_no_processo(password: str) -> tuple[float, str]:
+    return time.time(), pwd_context.hash(password)
+
+
+async def _executar(funcao, *args):
+    global _semaforo
+    if _semaforo is None:
+        _semaforo = asyncio.Semaphore(settings.HASH_MAX_CONCORRENTES)
+
+    enfileirado_em = time.time()
+    with _metricas_lock:
+        _metricas["em_espera"] += 1
+    try:
+        async with _semaforo:
+            loop = asyncio.get_running_loop()
+            inicio, resultado = await loop.run_in_executor(_get_executor(), funcao, *args)
+    finally:
+        with _metricas_lock:
+            _metricas["em_espera"] -= 1
+
+    espera = max(inicio - enfileirado_em, 0.0)
+    with _metricas_lock:
+        _metricas["total"] += 1
+        _metricas["espera_total_s"] += espera
+        _metricas["espera_max_s"] = max(_metricas["espera_max_s"], espera)
+    if espera > 1.0:
+        logger.warning(f"Hash de senha esperou {espera:.2f}s na fila. Considere aumentar HASH_PROCESSOS.")
+    return resultado
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Verifica a senha fora do processo da API.
+
+    Returns:
+        tuple[bool, str | None]: se a senha confere e, se o hash estiver com
+        o custo desatualizado, o novo hash a ser gravado.
+    """
+    return await _executar(_verificar_no_processo, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Gera o hash de uma senha fora do processo da API."""
+    return await _executar(_gerar_hash_no_processo, password)
+
+
+def metricas_hashing() -> dict:
+    """Contadores do pool de hashing (tempo de fila em segundos)."""
+    with _metricas_lock:
+        total = _metricas["total"]
+        return {
+            "total": total,
+            "em_espera": _metricas["em_espera"],
+            "espera_media_s": round(_metricas["espera_total_s"] / total, 4) if total else 0.0,
+            "espera_max_s": round(_metricas["espera_max_s"], 4),
+        }
+
+
+def encerrar_pool_hashing() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
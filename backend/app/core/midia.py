@@ -0,0 +1,84 @@
+import hashlib
+import hmac
+import os
+import time
+from urllib.parse import urlencode
+
+from app.core.config import settings
+
+# Chave própria para as URLs de mídia, derivada da SECRET_KEY (um vazamento de
+# URL assinada não ajuda a forjar tokens de login, e vice-versa).
+_CHAVE = hashlib.sha256(f"midia:{settings.SECRET_KEY}".encode()).digest()
+
+
+def _assinatura(chave: str, empresa_id: int, expira_em: int) -> str:
+    mensagem = f"{chave}|{empresa_id}|{expira_em}".encode()
+    return hmac.new(_CHAVE, mensagem, hashlib.sha256).hexdigest()[:32]
+
+
+def _expiracao(agora: float | None = None) -> int:
+    """
+    Expiração arredondada para o fim da próxima janela de MIDIA_URL_TTL_SEGUNDOS:
+    a URL de um arquivo fica idêntica durante a janela inteira, então o
+    navegador reaproveita o cache em vez de baixar a mesma foto com outra URL.
+    Vale entre 1 e 2 janelas a partir de agora.
+    """
+    janela = settings.MIDIA_URL_TTL_SEGUNDOS
+    agora = time.time() if agora is None else agora
+    return (int(agora) // janela + 2) * janela
+
+
+# URLs antigas (arquivos ainda não migrados para o storage por conteúdo) ->
+# prefixo da chave na rota de mídia e diretório onde os arquivos estão
+_LEGADO = {
+    "/fotos-promotores/": ("legado/fotos/", settings.LEGADO_FOTOS_DIR),
+    "/arquivos-contratos/": ("legado/contratos/", settings.LEGADO_CONTRATOS_DIR),
+}
+
+
+def _chave_da_url(url: str) -> str | None:
+    prefixo = settings.STORAGE_URL_PREFIXO + "/"
+    if url.startswith(prefixo):
+        return url[len(prefixo):]
+    for url_antiga, (prefixo_chave, _) in _LEGADO.items():
+        if url.startswith(url_antiga):
+            return prefixo_chave + url[len(url_antiga):]
+    return None
+
+
+def caminho_legado(chave: str) -> str | None:
+    """
+    Caminho no disco de uma chave `legado/...` (None se a chave não é legada).
+    Só aceita um nome de arquivo direto no diretório antigo, nada de subpastas.
+    """
+    for prefixo_chave, diretorio in _LEGADO.values():
+        if chave.startswith(prefixo_chave):
+            nome = chave[len(prefixo_chave):]
+            if not nome or nome in (".", "..") or "/" in nome or "\\" in nome:
+                raise ValueError(f"Chave legada inválida: {chave}")
+            return os.path.join(diretorio, nome)
+    return None
+
+
+def assinar_url(url: str | None, empresa_id: int) -> str | None:
+    """
+    Acrescenta a assinatura (empresa + expiração) a uma URL do storage
+    (STORAGE_URL_PREFIXO/...). URLs antigas de arquivos ainda não migrados
+    (/fotos-promotores/..., /arquivos-contratos/...) viram URLs assinadas da
+    mesma rota, sob `legado/`. Outras URLs passam intactas.
+    """
+    if not url or "?" in url:
+        return url
+    chave = _chave_da_url(url)
+    if chave is None:
+        return url
+    expira_em = _expiracao()
+    parametros = {"e": empresa_id, "exp": expira_em, "sig": _assinatura(chave, empresa_id, expira_em)}
+    return f"{settings.STORAGE_URL_PREFIXO}/{chave}?{urlencode(parametros)}"
+
+
+def verificar_assinatura(chave: str, empresa_id: int, expira_em: int, assinatura: str) -> bool:
+    """Assinatura válida para esta chave e empresa, e ainda não expirada."""
+    if expira_em < time.time():
+        return False
+    return hmac.compare_digest(_assinatura(chave, empresa_id, expira_em), assinatura)
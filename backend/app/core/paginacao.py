@@ -0,0 +1,31 @@
+import base64
+import json
+from datetime import datetime
+
+
+def codificar_cursor(*valores) -> str:
+    """
+    Gera o cursor opaco a partir da chave de ordenação do último item da página,
+    ex.: codificar_cursor(foto.data_envio, foto.id).
+    """
+    serializaveis = [{"dt": v.isoformat()} if isinstance(v, datetime) else v for v in valores]
+    bruto = json.dumps(serializaveis, separators=(",", ":"))
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, quantidade: int) -> tuple:
+    """
+    Lê um cursor gerado por `codificar_cursor` com `quantidade` valores.
+    Lança ValueError se o cursor for inválido.
+    """
+    try:
+        preenchido = cursor + "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(preenchido))
+        if not isinstance(valores, list) or len(valores) != quantidade:
+            raise ValueError
+        return tuple(
+            datetime.fromisoformat(v["dt"]) if isinstance(v, dict) else v
+            for v in valores
+        )
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("Cursor inválido.") from e
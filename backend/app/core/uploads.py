@@ -0,0 +1,158 @@
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+
+import anyio
+from fastapi import UploadFile
+from starlette.responses import JSONResponse
+
+from app.core.config import settings
+
+# Assinaturas ("magic bytes") dos formatos aceitos: o tipo é decidido pelo
+# conteúdo do arquivo, não pelo content-type enviado pelo cliente.
+ASSINATURAS = [
+    (b"%PDF-", "application/pdf", "pdf"),
+    (b"\xff\xd8\xff", "image/jpeg", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", "png"),
+]
+
+FOLGA_MULTIPART = 64 * 1024 # Cabeçalhos e campos do formulário além do arquivo
+
+
+class ArquivoMuitoGrande(ValueError):
+    pass
+
+
+class TipoNaoPermitido(ValueError):
+    pass
+
+
+class _CorpoMuitoGrande(Exception):
+    pass
+
+
+class LimiteDeCorpo:
+    """
+    Middleware ASGI que limita o corpo dos requests de certas rotas
+    (`limites`: caminho -> bytes). O multipart é lido e espalhado em arquivos
+    temporários antes de a rota rodar, então o limite de `salvar_upload` chega
+    tarde: aqui os bytes são contados conforme chegam de `receive` e a leitura
+    é abortada com 413 assim que passam do limite (com ou sem Content-Length).
+    """
+
+    def __init__(self, app, limites: dict[str, int]):
+        self.app = app
+        self.limites = limites
+
+    async def __call__(self, scope, receive, send):
+        limite = self.limites.get(scope["path"]) if scope["type"] == "http" else None
+        if limite is None:
+            await self.app(scope, receive, send)
+            return
+
+        resposta_413 = JSONResponse(
+            {"detail": f"O arquivo excede o limite de {limite // (1024 * 1024)} MB."}, status_code=413
+        )
+        declarado = dict(scope["headers"]).get(b"content-length", b"")
+        if declarado.isdigit() and int(declarado) > limite:
+            await resposta_413(scope, receive, send)
+            return
+
+        recebidos, excedeu, iniciou = 0, False, False
+
+        async def receber():
+            nonlocal recebidos, excedeu
+            mensagem = await receive()
+            if mensagem["type"] == "http.request":
+                recebidos += len(mensagem.get("body", b""))
+                if recebidos > limite:
+                    excedeu = True
+                    raise _CorpoMuitoGrande()
+            return mensagem
+
+        async def enviar(mensagem):
+            nonlocal iniciou
+            # Depois de abortar, descarta a resposta da aplicação (o parser
+            # do FastAPI transforma a exceção num 400 genérico)
+            if excedeu and not iniciou:
+                return
+            iniciou = True
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receber, enviar)
+        except _CorpoMuitoGrande:
+            pass
+        if excedeu and not iniciou:
+            await resposta_413(scope, receive, send)
+
+
+@dataclass
+class ArquivoSalvo:
+    nome_servidor: str
+    caminho: str
+    content_type: str
+    extensao: str
+    tamanho: int
+    sha256: str
+
+
+def detectar_tipo(inicio: bytes) -> tuple[str, str] | None:
+    """Retorna (content_type, extensão) a partir dos primeiros bytes, ou None."""
+    for assinatura, content_type, extensao in ASSINATURAS:
+        if inicio.startswith(assinatura):
+            return content_type, extensao
+    return None
+
+
+async def salvar_upload(
+    arquivo: UploadFile,
+    diretorio: str,
+    max_bytes: int,
+    tipos_permitidos: set[str],
+) -> ArquivoSalvo:
+    """
+    Copia o upload para `diretorio` em chunks, sem bloquear o event loop e sem
+    carregar o arquivo inteiro em memória. Na mesma passada valida o tipo pelos
+    magic bytes, aplica o limite de tamanho e calcula o SHA-256.
+
+    Lança TipoNaoPermitido ou ArquivoMuitoGrande; nesses casos nada fica no disco.
+    """
+    primeiro_chunk = await arquivo.read(settings.UPLOAD_CHUNK_BYTES)
+    tipo = detectar_tipo(primeiro_chunk)
+    if tipo is None or tipo[0] not in tipos_permitidos:
+        raise TipoNaoPermitido("Formato de arquivo inválido.")
+    content_type, extensao = tipo
+
+    os.makedirs(diretorio, exist_ok=True)
+    nome_servidor = f"{uuid.uuid4()}.{extensao}"
+    caminho = os.path.join(diretorio, nome_servidor)
+    caminho_temporario = f"{caminho}.part"
+
+    sha256 = hashlib.sha256()
+    tamanho = 0
+    try:
+        async with await anyio.open_file(caminho_temporario, "wb") as destino:
+            chunk = primeiro_chunk
+            while chunk:
+                tamanho += len(chunk)
+                if tamanho > max_bytes:
+                    raise ArquivoMuitoGrande(f"O arquivo excede o limite de {max_bytes // (1024 * 1024)} MB.")
+                sha256.update(chunk)
+                await destino.write(chunk)
+                chunk = await arquivo.read(settings.UPLOAD_CHUNK_BYTES)
+        os.replace(caminho_temporario, caminho)
+    except BaseException:
+        if os.path.exists(caminho_temporario):
+            os.remove(caminho_temporario)
+        raise
+
+    return ArquivoSalvo(
+        nome_servidor=nome_servidor,
+        caminho=caminho,
+        content_type=content_type,
+        extensao=extensao,
+        tamanho=tamanho,
+        sha256=sha256.hexdigest(),
+    )
@@ -0,0 +1,230 @@
+# backend/app/crud/agregados.py
+#
+# Painéis de lojas, cidades e horários, sempre sobre `painel_fotos_loja_hora`
+# (nunca sobre fotos_promotores). A tabela é mantida incrementalmente por
+# `somar_painel`, na mesma transação que grava a foto, como o rollup de KPIs.
+# Os SELECTs são montados aqui e executados tanto aqui quanto em `crud.aio.agregados`.
+
+from datetime import date, datetime, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
+from sqlalchemy import Select, and_, cast, extract, func, select, text, Integer
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..db import models
+
+_painel = models.PainelFotosLojaHora
+
+
+def hoje_local() -> date:
+    """Data de hoje no fuso dos relatórios (a mesma dos buckets do painel)."""
+    return datetime.now(ZoneInfo(settings.FUSO_HORARIO_RELATORIOS)).date()
+
+
+def _identificado(valor: str) -> Optional[str]:
+    return valor or None
+
+
+def _hora_local(data_envio):
+    """Expressão SQL da hora local (o bucket do painel) de um timestamptz."""
+    return func.date_trunc("hour", func.timezone(settings.FUSO_HORARIO_RELATORIOS, data_envio))
+
+
+def somar_painel(
+    db: Session,
+    empresa_id: int,
+    data_envio,
+    loja: Optional[str],
+    cidade: Optional[str],
+    delta: int = 1
+) -> None:
+    """
+    Soma `delta` fotos (1 ou -1) ao bucket (empresa, hora local, loja, cidade)
+    de `data_envio` (datetime ou expressão SQL, ex.: func.now() na ingestão).
+    Sem commit: roda na transação que grava/altera a foto, então o painel
+    nunca diverge das fotos. Uma subtração só atualiza um bucket que existe,
+    sem passar de zero (o CHECK da tabela garante).
+    """
+    if delta < 0:
+        db.query(_painel).filter(
+            _painel.empresa_id == empresa_id,
+            _painel.hora == _hora_local(data_envio),
+            _painel.loja == (loja or ""),
+            _painel.cidade == (cidade or ""),
+        ).update(
+            {"total_fotos": func.greatest(_painel.total_fotos + delta, 0)}, synchronize_session=False
+        )
+        return
+    stmt = insert(_painel).values(
+        empresa_id=empresa_id,
+        hora=_hora_local(data_envio),
+        loja=loja or "",
+        cidade=cidade or "",
+        total_fotos=delta,
+        ultima_foto=data_envio,
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["empresa_id", "hora", "loja", "cidade"],
+        set_={
+            "total_fotos": _painel.total_fotos + stmt.excluded.total_fotos,
+            "ultima_foto": func.greatest(_painel.ultima_foto, stmt.excluded.ultima_foto),
+        },
+    ))
+
+
+def select_cobertura_lojas(empresa_id: int, hoje: date) -> Select:
+    """
+    Cada loja cadastrada com as fotos de hoje e a data da última foto (na
+    janela de ANALYTICS_JANELA_DIAS). Lojas sem nenhuma foto na janela vêm com
+    `ultima_foto` nula; as mais "apagadas" primeiro.
+    """
+    p = _painel
+    inicio_de_hoje = datetime.combine(hoje, datetime.min.time())
+    ultimas = (
+        select(
+            p.loja,
+            p.cidade,
+            func.max(p.ultima_foto).label("ultima_foto"),
+            func.coalesce(func.sum(p.total_fotos).filter(p.hora >= inicio_de_hoje), 0).label("fotos_hoje"),
+        )
+        .where(
+            p.empresa_id == empresa_id,
+            p.loja != "",
+            p.total_fotos > 0,
+            p.hora >= inicio_de_hoje - timedelta(days=settings.ANALYTICS_JANELA_DIAS),
+        )
+        .group_by(p.loja, p.cidade)
+        .subquery()
+    )
+    return (
+        select(
+            models.Loja.nome,
+            models.Loja.cidade,
+            func.coalesce(ultimas.c.fotos_hoje, 0).label("fotos_hoje"),
+            ultimas.c.ultima_foto,
+        )
+        .outerjoin(ultimas, and_(ultimas.c.loja == models.Loja.nome, ultimas.c.cidade == models.Loja.cidade))
+        .where(models.Loja.empresa_id == empresa_id)
+        .order_by(ultimas.c.ultima_foto.asc().nulls_first(), models.Loja.nome, models.Loja.cidade)
+    )
+
+
+def montar_cobertura(linhas, hoje: date, dias_sem_foto: int) -> dict:
+    """Resposta do /insights/lojas/cobertura a partir de `select_cobertura_lojas`."""
+    fuso = ZoneInfo(settings.FUSO_HORARIO_RELATORIOS)
+    lojas, ativas, apagadas = [], 0, 0
+    for nome, cidade, fotos_hoje, ultima_foto in linhas:
+        dias = (hoje - ultima_foto.astimezone(fuso).date()).days if ultima_foto else None
+        apagada = dias is None or dias >= dias_sem_foto
+        ativas += fotos_hoje > 0
+        apagadas += apagada
+        lojas.append({
+            "loja": nome,
+            "cidade": cidade,
+            "fotos_hoje": fotos_hoje,
+            "ultima_foto": ultima_foto,
+            "dias_sem_foto": dias,
+            "apagada": apagada,
+        })
+    return {
+        "data": hoje,
+        "total_lojas": len(lojas),
+        "lojas_com_foto_hoje": ativas,
+        "lojas_apagadas": apagadas,
+        "lojas": lojas,
+    }
+
+
+def select_cidades(empresa_id: int, data_inicio: date, data_fim: date) -> Select:
+    """Fotos, lojas distintas e última foto por cidade no período (dias locais, inclusivos)."""
+    p = _painel
+    total = func.sum(p.total_fotos)
+    return (
+        select(
+            p.cidade,
+            total.label("total_fotos"),
+            func.count(func.distinct(p.loja)).filter(p.loja != "").label("lojas"),
+            func.max(p.ultima_foto).label("ultima_foto"),
+        )
+        .where(
+            p.empresa_id == empresa_id,
+            p.total_fotos > 0,
+            p.hora >= datetime.combine(data_inicio, datetime.min.time()),
+            p.hora < datetime.combine(data_fim + timedelta(days=1), datetime.min.time()),
+        )
+        .group_by(p.cidade)
+        .order_by(total.desc())
+    )
+
+
+def montar_cidades(linhas) -> list[dict]:
+    return [
+        {"cidade": _identificado(cidade), "total_fotos": total, "lojas": lojas, "ultima_foto": ultima_foto}
+        for cidade, total, lojas, ultima_foto in linhas
+    ]
+
+
+def select_heatmap(
+    empresa_id: int,
+    desde: date,
+    loja: Optional[str] = None,
+    cidade: Optional[str] = None
+) -> Select:
+    """Fotos por (dia da semana ISO, hora local) desde `desde`, opcionalmente de uma loja/cidade."""
+    p = _painel
+    dia_semana = cast(extract("isodow", p.hora), Integer).label("dia_semana")
+    hora = cast(extract("hour", p.hora), Integer).label("hora")
+    stmt = select(dia_semana, hora, func.sum(p.total_fotos).label("total_fotos")).where(
+        p.empresa_id == empresa_id,
+        p.hora >= datetime.combine(desde, datetime.min.time()),
+    )
+    if loja:
+        stmt = stmt.where(p.loja == loja)
+    if cidade:
+        stmt = stmt.where(p.cidade == cidade)
+    return stmt.group_by(dia_semana, hora)
+
+
+def montar_heatmap(linhas, desde: date) -> dict:
+    """Matriz 7x24: linha 0 = segunda-feira, coluna = hora local."""
+    matriz = [[0] * 24 for _ in range(7)]
+    for dia_semana, hora, total in linhas:
+        matriz[dia_semana - 1][hora] = total
+    return {"desde": desde, "matriz": matriz}
+
+
+def preencher_paineis(conexao) -> int:
+    """
+    Recalcula do zero `painel_fotos_loja_hora` a partir de fotos_promotores,
+    sem commit. A tabela fica travada até o fim da transação: as fotos gravadas
+    enquanto isso esperam para somar ao painel já reconstruído (nada é contado
+    duas vezes nem perdido). Retorna o número de linhas geradas.
+    """
+    foto = models.FotoPromotor
+    hora = _hora_local(foto.data_envio)
+    loja, cidade = func.coalesce(foto.loja, ""), func.coalesce(foto.cidade, "")
+    agregado = (
+        select(foto.empresa_id, hora, loja, cidade, func.count(foto.id), func.max(foto.data_envio))
+        .where(foto.duplicata_de_id.is_(None))
+        .group_by(foto.empresa_id, hora, loja, cidade)
+    )
+    # Varre todas as fotos: não cabe no statement_timeout das rotas
+    conexao.execute(text("SET LOCAL statement_timeout = 0"))
+    conexao.execute(text(f"LOCK TABLE {_painel.__tablename__} IN EXCLUSIVE MODE"))
+    conexao.execute(_painel.__table__.delete())
+    return conexao.execute(
+        insert(_painel).from_select(
+            ["empresa_id", "hora", "loja", "cidade", "total_fotos", "ultima_foto"], agregado
+        )
+    ).rowcount
+
+
+def reconstruir_paineis(db: Session) -> int:
+    """
+    Ver `preencher_paineis`, numa única transação (para depois de mexer nas
+    fotos por fora da API, ou se o painel divergir).
+    """
+    linhas = preencher_paineis(db.connection())
+    db.commit()
+    return linhas
@@ -0,0 +1,35 @@
+# backend/app/crud/aio/agregados.py
+#
+# Versão assíncrona das leituras dos painéis (SELECTs de `crud.agregados`).
+
+from datetime import date
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import agregados as crud_agregados
+from ..agregados import hoje_local
+
+
+async def get_cobertura_lojas(db: AsyncSession, empresa_id: int, dias_sem_foto: int) -> dict:
+    """Ver `crud.agregados.select_cobertura_lojas`."""
+    hoje = hoje_local()
+    resultado = await db.execute(crud_agregados.select_cobertura_lojas(empresa_id, hoje))
+    return crud_agregados.montar_cobertura(resultado.all(), hoje, dias_sem_foto)
+
+
+async def get_cidades(db: AsyncSession, empresa_id: int, data_inicio: date, data_fim: date) -> list[dict]:
+    """Ver `crud.agregados.select_cidades`."""
+    resultado = await db.execute(crud_agregados.select_cidades(empresa_id, data_inicio, data_fim))
+    return crud_agregados.montar_cidades(resultado.all())
+
+
+async def get_heatmap(
+    db: AsyncSession,
+    empresa_id: int,
+    desde: date,
+    loja: Optional[str] = None,
+    cidade: Optional[str] = None
+) -> dict:
+    """Ver `crud.agregados.select_heatmap`."""
+    resultado = await db.execute(crud_agregados.select_heatmap(empresa_id, desde, loja, cidade))
+    return crud_agregados.montar_heatmap(resultado.all(), desde)
+
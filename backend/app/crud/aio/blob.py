@@ -0,0 +1,17 @@
+# backend/app/crud/aio/blob.py
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import blob as crud_blob
+from ...db import models
+
+
+async def adicionar_referencia(db: AsyncSession, sha256: str, chave: str, content_type: str, tamanho: int) -> int:
+    """Versão assíncrona de `crud.blob.adicionar_referencia` (sem commit)."""
+    resultado = await db.execute(crud_blob.stmt_adicionar_referencia(sha256, chave, content_type, tamanho))
+    return resultado.scalar_one()
+
+
+async def existe(db: AsyncSession, sha256: str) -> bool:
+    """Se o blob está registrado (isto é, referenciado por alguém)."""
+    return await db.scalar(select(models.Blob.sha256).where(models.Blob.sha256 == sha256)) is not None
@@ -0,0 +1,55 @@
+# backend/app/crud/aio/contrato.py
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ...db import models
+from .. import contrato as crud_contrato
+
+
+async def create_contrato(
+    db: AsyncSession,
+    nome_promotor: str,
+    cpf_promotor: str,
+    nome_original: str,
+    nome_servidor: str,
+    caminho: str,
+    usuario_id: int,
+    empresa_id: int,
+    sha256: str | None = None,
+    blob_sha256: str | None = None
+) -> models.Contrato:
+    """
+    Versão assíncrona de `crud.contrato.create_contrato`. Quem chama deve ter
+    registrado a referência ao blob na mesma transação.
+    """
+    db_contrato = models.Contrato(
+        nome_promotor=nome_promotor,
+        cpf_promotor=cpf_promotor,
+        nome_arquivo_original=nome_original,
+        nome_arquivo_servidor=nome_servidor,
+        caminho_arquivo=caminho,
+        sha256=sha256,
+        blob_sha256=blob_sha256,
+        usuario_id=usuario_id,
+        empresa_id=empresa_id
+    )
+    db.add(db_contrato)
+    await db.commit()
+    await db.refresh(db_contrato)
+    return db_contrato
+
+
+async def get_contratos_by_empresa(db: AsyncSession, empresa_id: int) -> list[models.Contrato]:
+    """Contratos da empresa, do mais recente para o mais antigo."""
+    resultado = await db.scalars(
+        select(models.Contrato)
+        .where(models.Contrato.empresa_id == empresa_id)
+        .order_by(models.Contrato.data_upload.desc())
+    )
+    return resultado.all()
+
+
+async def get_contratos_resposta(db: AsyncSession, empresa_id: int) -> list[dict]:
+    """Contratos da empresa no formato da resposta da API (com a url_acesso), numa única query."""
+    linhas = (await db.execute(crud_contrato.select_contratos_empresa(empresa_id))).all()
+    return crud_contrato.montar_contratos(linhas)
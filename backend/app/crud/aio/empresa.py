@@ -0,0 +1,26 @@
+# backend/app/crud/aio/empresa.py
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ...db import models
+from ...schemas import empresa as schemas_empresa
+
+
+async def get_empresa(db: AsyncSession, empresa_id: int) -> models.Empresa | None:
+    """Busca uma única empresa pelo seu ID."""
+    return await db.get(models.Empresa, empresa_id)
+
+
+async def get_empresas(db: AsyncSession, skip: int = 0, limit: int = 100) -> list[models.Empresa]:
+    """Busca uma lista de empresas com paginação."""
+    resultado = await db.scalars(select(models.Empresa).order_by(models.Empresa.id).offset(skip).limit(limit))
+    return resultado.all()
+
+
+async def create_empresa(db: AsyncSession, empresa: schemas_empresa.EmpresaCreate) -> models.Empresa:
+    """Cria uma nova empresa no banco de dados."""
+    db_empresa = models.Empresa(**empresa.model_dump())
+    db.add(db_empresa)
+    await db.commit()
+    await db.refresh(db_empresa)
+    return db_empresa
@@ -0,0 +1,66 @@
+# backend/app/crud/aio/foto_promotor.py
+#
+# Leituras das rotas em versão assíncrona. Os SELECTs são os mesmos do
+# `crud.foto_promotor` (montados lá), só a execução muda.
+
+from datetime import date, datetime
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from ...db import models
+from .. import foto_promotor as crud_foto
+
+
+async def get_fotos_by_empresa(
+    db: AsyncSession,
+    empresa_id: int,
+    promotor_id: Optional[int] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    busca: Optional[str] = None,
+    limite: Optional[int] = None,
+    apos: Optional[tuple[datetime, int]] = None,
+    ocultar_duplicatas: bool = False,
+    loja: Optional[str] = None,
+    cidade: Optional[str] = None
+) -> list[models.FotoPromotor]:
+    """Ver `crud.foto_promotor.get_fotos_by_empresa`."""
+    resultado = await db.scalars(crud_foto.select_fotos_by_empresa(
+        empresa_id, promotor_id, data_inicio, data_fim, busca, limite, apos, ocultar_duplicatas, loja, cidade
+    ))
+    return resultado.all()
+
+
+async def buscar_fotos_por_relevancia(
+    db: AsyncSession,
+    empresa_id: int,
+    busca: str,
+    promotor_id: Optional[int] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    limite: Optional[int] = None,
+    apos: Optional[tuple[float, int]] = None,
+    ocultar_duplicatas: bool = False,
+    loja: Optional[str] = None,
+    cidade: Optional[str] = None
+) -> list[tuple[models.FotoPromotor, float]]:
+    """Ver `crud.foto_promotor.buscar_fotos_por_relevancia`."""
+    stmt = crud_foto.select_fotos_por_relevancia(
+        empresa_id, busca, promotor_id, data_inicio, data_fim, limite, apos, ocultar_duplicatas, loja, cidade
+    )
+    if stmt is None:
+        return []
+    resultado = await db.execute(stmt)
+    return [(foto, valor) for foto, valor in resultado.all()]
+
+
+async def get_versao_dados(db: AsyncSession, empresa_id: int) -> str:
+    """Ver `crud.foto_promotor.get_versao_dados`."""
+    resultado = await db.execute(crud_foto.select_versao_dados(empresa_id))
+    return crud_foto.formatar_versao(resultado.first())
+
+
+async def get_dashboard_kpis(db: AsyncSession, empresa_id: int) -> dict:
+    """Ver `crud.foto_promotor.get_dashboard_kpis`."""
+    mes = (await db.execute(crud_foto.select_kpis_mes(empresa_id))).one()
+    ranking = (await db.execute(crud_foto.select_ranking_promotores(empresa_id))).all()
+    return crud_foto.montar_kpis(mes, ranking)
@@ -0,0 +1,27 @@
+# backend/app/crud/aio/ingestao.py
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from ...db import models
+from ..ingestao import STATUS_PENDENTE, STATUS_PROCESSANDO
+
+
+async def enfileirar_foto(db: AsyncSession, from_number: str, media_url: str, legenda: str | None) -> models.IngestaoFoto:
+    """Adiciona uma foto recebida pelo webhook na fila de ingestão."""
+    job = models.IngestaoFoto(
+        from_number=from_number,
+        media_url=media_url,
+        legenda=legenda,
+        status=STATUS_PENDENTE,
+    )
+    db.add(job)
+    await db.commit()
+    return job
+
+
+async def contar_ativos(db: AsyncSession) -> int:
+    """Conta os jobs ainda não finalizados (usa o índice parcial da fila)."""
+    return await db.scalar(
+        select(func.count(models.IngestaoFoto.id))
+        .where(models.IngestaoFoto.status.in_([STATUS_PENDENTE, STATUS_PROCESSANDO]))
+    )
@@ -0,0 +1,86 @@
+# backend/app/crud/aio/usuario.py
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from ...db import models
+from ...schemas import usuario as schemas_usuario
+from ...core import cache_usuarios
+from .. import contrato as crud_contrato
+from .. import usuario as crud_usuario
+
+# O schema de resposta tem `contratos` (com a `url_acesso`, que o modelo não
+# tem): as respostas são montadas por projeção, usuários numa query e os
+# contratos de todos eles em outra, nunca por objeto.
+
+
+async def get_user_by_email(db: AsyncSession, email: str) -> models.Usuario | None:
+    """Busca um usuário pelo e-mail."""
+    return await db.scalar(select(models.Usuario).where(models.Usuario.email == email))
+
+
+async def _usuarios_resposta(db: AsyncSession, filtro) -> list[dict]:
+    linhas = (await db.execute(crud_usuario.select_usuarios_resposta().where(filtro))).all()
+    if not linhas:
+        return []
+    contratos = (await db.execute(crud_contrato.select_contratos_dos_usuarios([l.id for l in linhas]))).all()
+    return crud_usuario.montar_usuarios(linhas, crud_contrato.agrupar_por_usuario(contratos))
+
+
+async def get_user_com_contratos(db: AsyncSession, user_id: int) -> dict | None:
+    """Um usuário no formato da resposta da API, já com os contratos."""
+    usuarios = await _usuarios_resposta(db, models.Usuario.id == user_id)
+    return usuarios[0] if usuarios else None
+
+
+async def create_user(
+    db: AsyncSession,
+    user_in: schemas_usuario.UsuarioCreate,
+    empresa_id: int,
+    hashed_password: str
+) -> dict:
+    """Cria um novo usuário; o hash da senha já vem calculado do pool de hashing. Retorna a resposta da API."""
+    db_user = models.Usuario(
+        email=user_in.email,
+        hashed_password=hashed_password,
+        nome=user_in.nome,
+        empresa_id=empresa_id,
+        perfil=user_in.perfil,
+        whatsapp_number=user_in.whatsapp_number
+    )
+    db.add(db_user)
+    await db.commit()
+    return await get_user_com_contratos(db, db_user.id)
+
+
+async def atualizar_hash_senha(db: AsyncSession, user: models.Usuario, novo_hash: str) -> None:
+    """Grava o hash refeito com o custo atual do bcrypt (rehash transparente no login)."""
+    await db.execute(
+        update(models.Usuario)
+        .where(models.Usuario.id == user.id)
+        .values(hashed_password=novo_hash)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    cache_usuarios.invalidar(user.email)
+
+
+async def get_users_by_empresa(db: AsyncSession, empresa_id: int) -> list[dict]:
+    """Usuários de uma empresa com os contratos: duas queries, seja qual for o número de linhas."""
+    return await _usuarios_resposta(db, models.Usuario.empresa_id == empresa_id)
+
+
+async def update_user(db: AsyncSession, user_id: int, user_in: schemas_usuario.UsuarioUpdate) -> dict | None:
+    """Atualiza um usuário existente e retorna a resposta da API."""
+    db_user = await db.get(models.Usuario, user_id)
+    if not db_user:
+        return None
+
+    email_anterior = db_user.email
+    update_data = user_in.model_dump(exclude_unset=True)
+    for key, value in update_data.items():
+        setattr(db_user, key, value)
+
+    await db.commit()
+    # Perfil, is_active etc. mudaram: o próximo request recarrega do banco
+    cache_usuarios.invalidar(email_anterior, db_user.email)
+    return await get_user_com_contratos(db, user_id)
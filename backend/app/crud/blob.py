@@ -0,0 +1,46 @@
+# backend/app/crud/blob.py
+
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from ..db import models
+
+
+def stmt_adicionar_referencia(sha256: str, chave: str, content_type: str, tamanho: int):
+    """Upsert que cria o blob ou soma uma referência, retornando o ref_count."""
+    stmt = insert(models.Blob).values(
+        sha256=sha256,
+        chave=chave,
+        content_type=content_type,
+        tamanho=tamanho,
+        ref_count=1
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["sha256"],
+        set_={"ref_count": models.Blob.ref_count + 1}
+    )
+    return stmt.returning(models.Blob.ref_count)
+
+
+def adicionar_referencia(db: Session, sha256: str, chave: str, content_type: str, tamanho: int) -> int:
+    """
+    Registra mais uma referência ao blob, criando-o se for novo (sem commit:
+    roda na mesma transação do registro que o referencia).
+    Retorna o ref_count atualizado.
+    """
+    return db.execute(stmt_adicionar_referencia(sha256, chave, content_type, tamanho)).scalar_one()
+
+
+def remover_referencia(db: Session, sha256: str, quantidade: int = 1) -> models.Blob | None:
+    """
+    Remove `quantidade` referências ao blob (sem commit). Se não sobrar nenhuma, apaga o
+    registro e retorna o blob para que o chamador remova o arquivo do storage
+    depois do commit; caso contrário retorna None.
+    """
+    blob = db.query(models.Blob).filter(models.Blob.sha256 == sha256).with_for_update().first()
+    if not blob:
+        return None
+    blob.ref_count -= quantidade
+    if blob.ref_count > 0:
+        return None
+    db.delete(blob)
+    return blob
@@ -1,7 +1,92 @@
 # backend/app/crud/contrato.py
 
+from sqlalchemy import Select, select
 from sqlalchemy.orm import Session
+from ..core.midia import assinar_url
 from ..db import models
+from ..services.storage import get_storage
+
+# Colunas que a URL de acesso precisa; as listagens selecionam só elas + as do schema
+_COLUNAS_URL = (
+    models.Contrato.empresa_id,
+    models.Contrato.caminho_arquivo,
+    models.Contrato.blob_sha256,
+    models.Contrato.nome_arquivo_servidor,
+)
+
+
+def url_acesso(empresa_id: int, caminho_arquivo: str, blob_sha256: str | None, nome_arquivo_servidor: str) -> str:
+    """
+    URL assinada (para a empresa do contrato) do arquivo no storage. Contratos
+    ainda não migrados (`manage.py migrar-storage`) usam a URL antiga, servida
+    assinada pela mesma rota (ver `core.midia.assinar_url`).
+    """
+    if blob_sha256:
+        return assinar_url(get_storage().url(caminho_arquivo), empresa_id)
+    return assinar_url(f"/arquivos-contratos/{nome_arquivo_servidor}", empresa_id)
+
+
+def _url_da_linha(linha) -> str:
+    return url_acesso(linha.empresa_id, linha.caminho_arquivo, linha.blob_sha256, linha.nome_arquivo_servidor)
+
+
+def select_contratos_empresa(empresa_id: int) -> Select:
+    """Contratos da empresa (mais recente primeiro), só com as colunas do `schemas.contrato.Contrato`."""
+    return (
+        select(
+            models.Contrato.id,
+            models.Contrato.nome_promotor,
+            models.Contrato.cpf_promotor,
+            models.Contrato.nome_arquivo_original,
+            models.Contrato.data_upload,
+            models.Contrato.usuario_id,
+            *_COLUNAS_URL,
+        )
+        .where(models.Contrato.empresa_id == empresa_id)
+        .order_by(models.Contrato.data_upload.desc())
+    )
+
+
+def montar_contratos(linhas) -> list[dict]:
+    """Resposta do GET /contratos a partir de `select_contratos_empresa`."""
+    return [
+        {
+            "id": linha.id,
+            "nome_promotor": linha.nome_promotor,
+            "cpf_promotor": linha.cpf_promotor,
+            "nome_arquivo_original": linha.nome_arquivo_original,
+            "data_upload": linha.data_upload,
+            "usuario_id": linha.usuario_id,
+            "url_acesso": _url_da_linha(linha),
+        }
+        for linha in linhas
+    ]
+
+
+def select_contratos_dos_usuarios(usuario_ids: list[int]) -> Select:
+    """Contratos (colunas do `ContratoInfo`) de vários usuários numa única query."""
+    return (
+        select(
+            models.Contrato.id,
+            models.Contrato.usuario_id,
+            models.Contrato.nome_arquivo_original,
+            *_COLUNAS_URL,
+        )
+        .where(models.Contrato.usuario_id.in_(usuario_ids))
+        .order_by(models.Contrato.usuario_id, models.Contrato.data_upload.desc())
+    )
+
+
+def agrupar_por_usuario(linhas) -> dict[int, list[dict]]:
+    """usuario_id -> contratos no formato do `ContratoInfo`, numa única passada."""
+    por_usuario: dict[int, list[dict]] = {}
+    for linha in linhas:
+        por_usuario.setdefault(linha.usuario_id, []).append({
+            "id": linha.id,
+            "nome_arquivo_original": linha.nome_arquivo_original,
+            "url_acesso": _url_da_linha(linha),
+        })
+    return por_usuario
 
 # =============================================================
 # Sua função existente (não altere)
@@ -14,9 +99,14 @@ def create_contrato(
     nome_servidor: str,
     caminho: str,
     usuario_id: int, 
-    empresa_id: int
+    empresa_id: int,
+    sha256: str | None = None,
+    blob_sha256: str | None = None
 ) -> models.Contrato:
-    """Cria um novo registro de contrato no banco de dados."""
+    """
+    Cria um novo registro de contrato no banco de dados. Quem chama deve ter
+    registrado a referência ao blob (`crud.blob.adicionar_referencia`) na mesma transação.
+    """
     
     db_contrato = models.Contrato(
         nome_promotor=nome_promotor,
@@ -24,6 +114,8 @@ def create_contrato(
         nome_arquivo_original=nome_original,
         nome_arquivo_servidor=nome_servidor,
         caminho_arquivo=caminho,
+        sha256=sha256,
+        blob_sha256=blob_sha256,
         usuario_id=usuario_id,
         empresa_id=empresa_id
     )
@@ -1,79 +1,601 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func, distinct, extract
+import re
+from sqlalchemy.orm import Session, joinedload, load_only
+from sqlalchemy import func, tuple_, cast, Date, Float, select, or_, text, Select
+from sqlalchemy.dialects.postgresql import insert
 from ..db import models
+from ..core.config import settings
+from ..services import duplicatas
+from .agregados import somar_painel
 from datetime import date, datetime
 from typing import Optional
 
-def create_foto_registro(db: Session, url_foto: str, nome_arquivo: str, legenda: str, promotor_id: int, empresa_id: int) -> models.FotoPromotor:
+def create_foto_registro(
+    db: Session,
+    url_foto: str,
+    nome_arquivo: str,
+    legenda: str,
+    promotor_id: int,
+    empresa_id: int,
+    urls_derivados: Optional[dict[str, str]] = None,
+    blob_sha256: Optional[str] = None,
+    phash: Optional[int] = None,
+    loja: Optional[str] = None,
+    cidade: Optional[str] = None,
+    extracao_status: Optional[str] = None
+) -> models.FotoPromotor:
+    """
+    Registra uma foto. Quem chama deve ter registrado a referência ao blob
+    (`crud.blob.adicionar_referencia`) na mesma transação.
+
+    `loja`, `cidade` e `extracao_status` vêm da extração local da legenda
+    (`services.extracao_legenda.extrair_local`).
+
+    Com o `phash` (dHash sem sinal), a foto é marcada como quase-duplicata
+    se a empresa já recebeu uma foto parecida hoje; duplicatas não contam nos KPIs.
+    """
+    urls_derivados = urls_derivados or {}
+    # Busca antes do add(): o autoflush não deixa a foto nova encontrar a si mesma
+    duplicata_de_id = buscar_duplicata(db, empresa_id, phash) if phash is not None else None
     db_foto = models.FotoPromotor(
         url_foto=url_foto,
         nome_arquivo_servidor=nome_arquivo,
         legenda=legenda,
         promotor_id=promotor_id,
-        empresa_id=empresa_id
+        empresa_id=empresa_id,
+        url_miniatura=urls_derivados.get("miniatura"),
+        url_preview=urls_derivados.get("preview"),
+        url_grande=urls_derivados.get("grande"),
+        blob_sha256=blob_sha256,
+        loja=loja,
+        cidade=cidade,
+        extracao_status=extracao_status,
+        duplicata_de_id=duplicata_de_id,
+        **_colunas_phash(phash)
     )
     db.add(db_foto)
+    # Atualiza o rollup na mesma transação: o KPI nunca diverge das fotos
+    if duplicata_de_id is None:
+        _incrementar_kpi_diario(db, empresa_id=empresa_id, promotor_id=promotor_id)
+        # data_envio é o now() da transação (server_default)
+        somar_painel(db, empresa_id, func.now(), loja, cidade)
     db.commit()
     db.refresh(db_foto)
     return db_foto
 
+def _colunas_phash(phash: Optional[int]) -> dict:
+    if phash is None:
+        return {}
+    s0, s1, s2, s3 = duplicatas.segmentos(phash)
+    return {
+        "phash": duplicatas.para_bigint(phash),
+        "phash_s0": s0, "phash_s1": s1, "phash_s2": s2, "phash_s3": s3,
+    }
+
+def buscar_duplicata(
+    db: Session,
+    empresa_id: int,
+    phash: int,
+    referencia: Optional[datetime] = None,
+    antes_de_id: Optional[int] = None
+) -> Optional[int]:
+    """
+    Procura, entre as fotos da empresa no mesmo dia de `referencia` (padrão:
+    agora, no relógio do banco), uma a até DUPLICATA_DISTANCIA_MAXIMA bits do
+    `phash`. Retorna o ID da foto original (nunca o de outra duplicata) ou None.
+
+    Cada segmento do hash é buscado com suas variações num índice
+    (empresa_id, phash_sN, data_envio); só os candidatos voltam para o Python
+    para conferir a distância exata.
+    """
+    distancia_maxima = settings.DUPLICATA_DISTANCIA_MAXIMA
+    if distancia_maxima < 0:
+        return None
+
+    raio = distancia_maxima // duplicatas.QUANTIDADE_SEGMENTOS
+    colunas = [
+        models.FotoPromotor.phash_s0, models.FotoPromotor.phash_s1,
+        models.FotoPromotor.phash_s2, models.FotoPromotor.phash_s3,
+    ]
+    condicoes = [
+        coluna.in_(duplicatas.variacoes(segmento, raio))
+        for coluna, segmento in zip(colunas, duplicatas.segmentos(phash))
+    ]
+
+    inicio_dia = func.date_trunc("day", referencia if referencia is not None else func.now())
+    query = db.query(
+        models.FotoPromotor.id, models.FotoPromotor.phash, models.FotoPromotor.duplicata_de_id
+    ).filter(
+        models.FotoPromotor.empresa_id == empresa_id,
+        models.FotoPromotor.data_envio >= inicio_dia,
+        models.FotoPromotor.data_envio < inicio_dia + text("interval '1 day'"),
+        or_(*condicoes)
+    )
+    if antes_de_id is not None:
+        query = query.filter(models.FotoPromotor.id < antes_de_id)
+
+    melhor = None
+    for foto_id, candidato, duplicata_de_id in query:
+        distancia = duplicatas.distancia_hamming(phash, duplicatas.de_bigint(candidato))
+        if distancia <= distancia_maxima and (melhor is None or distancia < melhor[0]):
+            melhor = (distancia, duplicata_de_id or foto_id)
+    return melhor[1] if melhor else None
+
+def get_fotos_sem_phash(db: Session, apos_id: int = 0, limite: int = 200) -> list[models.FotoPromotor]:
+    """Como `get_fotos_sem_derivados`, mas para as fotos que ainda não têm hash perceptual."""
+    return (
+        db.query(models.FotoPromotor)
+        .options(joinedload(models.FotoPromotor.blob))
+        .filter(
+            models.FotoPromotor.phash.is_(None),
+            models.FotoPromotor.blob_sha256.isnot(None),
+            models.FotoPromotor.id > apos_id
+        )
+        .order_by(models.FotoPromotor.id)
+        .limit(limite)
+        .all()
+    )
+
+def atualizar_phash(db: Session, foto_id: int, phash: int) -> None:
+    """Grava o hash perceptual de uma foto já existente (sem commit)."""
+    db.query(models.FotoPromotor).filter(models.FotoPromotor.id == foto_id).update(
+        _colunas_phash(phash), synchronize_session=False
+    )
+
+def get_fotos_para_extracao(
+    db: Session,
+    status: Optional[str],
+    empresa_id: Optional[int] = None,
+    apos_id: int = 0,
+    limite: int = 500
+) -> list[models.FotoPromotor]:
+    """
+    Próximo lote (por ID) de fotos com legenda e o `extracao_status` dado
+    (None = nunca processadas), só com as colunas que a extração usa.
+    """
+    foto = models.FotoPromotor
+    query = (
+        db.query(foto)
+        .options(load_only(foto.id, foto.empresa_id, foto.legenda, foto.cidade))
+        .filter(foto.legenda.isnot(None), foto.id > apos_id)
+    )
+    query = query.filter(foto.extracao_status.is_(None) if status is None else foto.extracao_status == status)
+    if empresa_id is not None:
+        query = query.filter(foto.empresa_id == empresa_id)
+    return query.order_by(foto.id).limit(limite).all()
+
+def get_empresas_com_extracao_pendente(db: Session) -> list[int]:
+    """Empresas com fotos aguardando a extração pela IA (lê só o índice parcial)."""
+    return [
+        empresa_id for (empresa_id,) in
+        db.query(models.FotoPromotor.empresa_id)
+        .filter(models.FotoPromotor.extracao_status == "pendente")
+        .distinct()
+        .order_by(models.FotoPromotor.empresa_id)
+    ]
+
+def atualizar_extracao(
+    db: Session,
+    foto_id: int,
+    loja: Optional[str],
+    cidade: Optional[str],
+    status: Optional[str],
+    se_status: Optional[str] = None
+) -> bool:
+    """
+    Grava loja/cidade extraídas da legenda (sem commit) e move a foto de
+    bucket no painel de lojas, se ela conta nele. Com `se_status`, só grava
+    se a foto ainda estiver nesse status. Retorna se gravou.
+    """
+    foto = models.FotoPromotor
+    anterior = db.execute(
+        select(foto.empresa_id, foto.data_envio, foto.loja, foto.cidade, foto.duplicata_de_id, foto.extracao_status)
+        .where(foto.id == foto_id)
+        .with_for_update()
+    ).first()
+    if anterior is None or (se_status is not None and anterior.extracao_status != se_status):
+        return False
+    db.query(foto).filter(foto.id == foto_id).update(
+        {"loja": loja, "cidade": cidade, "extracao_status": status}, synchronize_session=False
+    )
+    empresa_id, data_envio, loja_anterior, cidade_anterior, duplicata_de_id, _ = anterior
+    marcar_fotos_alteradas(db, [empresa_id])
+    if duplicata_de_id is None and ((loja_anterior or ""), (cidade_anterior or "")) != ((loja or ""), (cidade or "")):
+        somar_painel(db, empresa_id, data_envio, loja_anterior, cidade_anterior, -1)
+        somar_painel(db, empresa_id, data_envio, loja, cidade, 1)
+    return True
+
+def marcar_duplicatas(db: Session, lote: int = 500) -> int:
+    """
+    Recalcula a marcação de quase-duplicatas de todas as fotos com hash, em
+    ordem de ID (a primeira foto de cada grupo é a original). Faz commit por
+    lote e retorna quantas fotos ficaram marcadas. O painel de lojas é
+    corrigido junto; rode `reconstruir_kpis` depois.
+    """
+    marcadas, ultimo_id = 0, 0
+    while True:
+        fotos = (
+            db.query(models.FotoPromotor)
+            .filter(models.FotoPromotor.phash.isnot(None), models.FotoPromotor.id > ultimo_id)
+            .order_by(models.FotoPromotor.id)
+            .limit(lote)
+            .all()
+        )
+        if not fotos:
+            break
+        ultimo_id = fotos[-1].id
+        for foto in fotos:
+            contava = foto.duplicata_de_id is None
+            foto.duplicata_de_id = buscar_duplicata(
+                db,
+                foto.empresa_id,
+                duplicatas.de_bigint(foto.phash),
+                referencia=foto.data_envio,
+                antes_de_id=foto.id
+            )
+            conta = foto.duplicata_de_id is None
+            if not conta:
+                marcadas += 1
+            if conta != contava:
+                somar_painel(db, foto.empresa_id, foto.data_envio, foto.loja, foto.cidade, 1 if conta else -1)
+                marcar_fotos_alteradas(db, [foto.empresa_id])
+            # Grava já: as próximas fotos do lote precisam enxergar esta marcação
+            db.flush()
+        db.commit()
+    return marcadas
+
+def _incrementar_kpi_diario(db: Session, empresa_id: int, promotor_id: int) -> None:
+    """Soma 1 foto ao rollup do dia (data do banco, a mesma do server_default de data_envio)."""
+    stmt = insert(models.KpiDiarioPromotor).values(
+        empresa_id=empresa_id,
+        dia=func.current_date(),
+        promotor_id=promotor_id,
+        total_fotos=1
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["empresa_id", "dia", "promotor_id"],
+        set_={"total_fotos": models.KpiDiarioPromotor.total_fotos + 1}
+    )
+    db.execute(stmt)
+
+def preencher_kpis(conexao) -> int:
+    """
+    Recalcula todo o rollup diário a partir de `fotos_promotores`, sem commit.
+    A tabela fica travada (EXCLUSIVE, leituras continuam) do DELETE ao fim da
+    transação: uma foto gravada no meio da reconstrução espera e soma por cima
+    do rollup novo, em vez de se perder no DELETE ou contar duas vezes.
+    Retorna o número de linhas geradas.
+    """
+    dia = cast(models.FotoPromotor.data_envio, Date)
+    agregado = (
+        select(
+            models.FotoPromotor.empresa_id,
+            dia,
+            models.FotoPromotor.promotor_id,
+            func.count(models.FotoPromotor.id)
+        )
+        .where(models.FotoPromotor.duplicata_de_id.is_(None)) # Quase-duplicatas não contam
+        .group_by(models.FotoPromotor.empresa_id, dia, models.FotoPromotor.promotor_id)
+    )
+    conexao.execute(text(f"LOCK TABLE {models.KpiDiarioPromotor.__tablename__} IN EXCLUSIVE MODE"))
+    conexao.execute(models.KpiDiarioPromotor.__table__.delete())
+    return conexao.execute(
+        insert(models.KpiDiarioPromotor).from_select(
+            ["empresa_id", "dia", "promotor_id", "total_fotos"], agregado
+        )
+    ).rowcount
+
+def reconstruir_kpis(db: Session) -> int:
+    """Ver `preencher_kpis`, numa única transação."""
+    linhas = preencher_kpis(db.connection())
+    db.commit()
+    return linhas
+
+def get_fotos_sem_derivados(db: Session, apos_id: int = 0, limite: int = 200) -> list[models.FotoPromotor]:
+    """
+    Busca, em ordem de ID, um lote de fotos que ainda não têm derivados (com o
+    blob já carregado). Fotos ainda fora do storage (sem blob) ficam de fora.
+    """
+    return (
+        db.query(models.FotoPromotor)
+        .options(joinedload(models.FotoPromotor.blob))
+        .filter(
+            models.FotoPromotor.url_miniatura.is_(None),
+            models.FotoPromotor.blob_sha256.isnot(None),
+            models.FotoPromotor.id > apos_id
+        )
+        .order_by(models.FotoPromotor.id)
+        .limit(limite)
+        .all()
+    )
+
+def atualizar_derivados(db: Session, foto_id: int, urls_derivados: dict[str, str]) -> None:
+    """Grava as URLs dos derivados de uma foto já existente (sem commit)."""
+    db.query(models.FotoPromotor).filter(models.FotoPromotor.id == foto_id).update({
+        models.FotoPromotor.url_miniatura: urls_derivados.get("miniatura"),
+        models.FotoPromotor.url_preview: urls_derivados.get("preview"),
+        models.FotoPromotor.url_grande: urls_derivados.get("grande"),
+    }, synchronize_session=False)
+
+def montar_tsquery(busca: str):
+    """
+    Converte o texto digitado em uma tsquery com prefixo em cada termo
+    ("coca zona sul" -> "coca:* & zona:* & sul:*"), sem acentos.
+    Retorna None se não sobrar nenhum termo pesquisável.
+    """
+    termos = re.findall(r"[^\W_]+", busca)
+    if not termos:
+        return None
+    expressao = " & ".join(f"{termo}:*" for termo in termos)
+    return func.to_tsquery("portuguese", func.f_unaccent(expressao))
+
+def _filtrar_fotos(
+    query,  # Query ou Select: os dois aceitam .filter()
+    empresa_id: int,
+    promotor_id: Optional[int] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    tsquery=None,
+    ocultar_duplicatas: bool = False,
+    loja: Optional[str] = None,
+    cidade: Optional[str] = None
+):
+    query = query.filter(models.FotoPromotor.empresa_id == empresa_id)
+    if loja:
+        query = query.filter(models.FotoPromotor.loja == loja)
+    if cidade:
+        query = query.filter(models.FotoPromotor.cidade == cidade)
+    if ocultar_duplicatas:
+        query = query.filter(models.FotoPromotor.duplicata_de_id.is_(None))
+    if promotor_id:
+        query = query.filter(models.FotoPromotor.promotor_id == promotor_id)
+    if data_inicio:
+        query = query.filter(models.FotoPromotor.data_envio >= data_inicio)
+    if data_fim:
+        # Adiciona 1 dia para incluir o dia final completo
+        query = query.filter(models.FotoPromotor.data_envio < datetime.combine(data_fim, datetime.max.time()))
+    if tsquery is not None:
+        # Usa o índice GIN ix_fotos_busca_tsv
+        query = query.filter(models.FotoPromotor.busca_tsv.op("@@")(tsquery))
+    return query
+
+def select_fotos_by_empresa(
+    empresa_id: int,
+    promotor_id: Optional[int] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    busca: Optional[str] = None,
+    limite: Optional[int] = None,
+    apos: Optional[tuple[datetime, int]] = None,
+    ocultar_duplicatas: bool = False,
+    loja: Optional[str] = None,
+    cidade: Optional[str] = None
+) -> Select:
+    """SELECT de `get_fotos_by_empresa`, compartilhado com `crud.aio.foto_promotor`."""
+    tsquery = montar_tsquery(busca) if busca else None
+    stmt = _filtrar_fotos(
+        select(models.FotoPromotor), empresa_id, promotor_id, data_inicio, data_fim, tsquery,
+        ocultar_duplicatas, loja, cidade
+    )
+    if apos:
+        stmt = stmt.filter(tuple_(models.FotoPromotor.data_envio, models.FotoPromotor.id) < tuple_(*apos))
+
+    stmt = stmt.order_by(models.FotoPromotor.data_envio.desc(), models.FotoPromotor.id.desc())
+    if limite:
+        stmt = stmt.limit(limite)
+    return stmt
+
 def get_fotos_by_empresa(
     db: Session, 
     empresa_id: int, 
     promotor_id: Optional[int] = None,
     data_inicio: Optional[date] = None,
     data_fim: Optional[date] = None,
-    busca: Optional[str] = None
+    busca: Optional[str] = None,
+    limite: Optional[int] = None,
+    apos: Optional[tuple[datetime, int]] = None,
+    ocultar_duplicatas: bool = False,
+    loja: Optional[str] = None,
+    cidade: Optional[str] = None
 ) -> list[models.FotoPromotor]:
-    """Busca fotos com filtros opcionais."""
-    query = db.query(models.FotoPromotor).filter(models.FotoPromotor.empresa_id == empresa_id)
+    """
+    Busca fotos com filtros opcionais, da mais recente para a mais antiga.
+
+    `busca` faz busca textual (com prefixo e sem acentos) na legenda, loja e cidade.
+    `apos` é a chave (data_envio, id) do último item da página anterior
+    (paginação por cursor): o banco desce direto no índice
+    ix_fotos_empresa_data_id, então qualquer página custa o mesmo que a primeira.
+    `ocultar_duplicatas` deixa de fora as fotos marcadas como quase-duplicatas.
+    `loja` e `cidade` filtram pelos valores extraídos das legendas.
+    """
+    return db.scalars(select_fotos_by_empresa(
+        empresa_id, promotor_id, data_inicio, data_fim, busca, limite, apos, ocultar_duplicatas, loja, cidade
+    )).all()
+
+def select_fotos_por_relevancia(
+    empresa_id: int,
+    busca: str,
+    promotor_id: Optional[int] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    limite: Optional[int] = None,
+    apos: Optional[tuple[float, int]] = None,
+    ocultar_duplicatas: bool = False,
+    loja: Optional[str] = None,
+    cidade: Optional[str] = None
+) -> Optional[Select]:
+    """SELECT (foto, rank) de `buscar_fotos_por_relevancia`; None se a busca não tiver termos."""
+    tsquery = montar_tsquery(busca)
+    if tsquery is None:
+        return None
+
+    # ts_rank_cd devolve real: o cursor traz o rank como float8 (JSON), e
+    # comparar real com float8 promove o real de forma inexata, pulando ou
+    # repetindo fotos na virada da página. Em float8 dos dois lados, o valor
+    # que vai no cursor é exatamente o comparado.
+    rank = cast(func.ts_rank_cd(models.FotoPromotor.busca_tsv, tsquery), Float).label("rank")
+    stmt = _filtrar_fotos(
+        select(models.FotoPromotor, rank), empresa_id, promotor_id, data_inicio, data_fim, tsquery,
+        ocultar_duplicatas, loja, cidade
+    )
+    if apos:
+        stmt = stmt.filter(tuple_(rank, models.FotoPromotor.id) < tuple_(*apos))
+
+    stmt = stmt.order_by(rank.desc(), models.FotoPromotor.id.desc())
+    if limite:
+        stmt = stmt.limit(limite)
+    return stmt
 
+def buscar_fotos_por_relevancia(
+    db: Session,
+    empresa_id: int,
+    busca: str,
+    promotor_id: Optional[int] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    limite: Optional[int] = None,
+    apos: Optional[tuple[float, int]] = None,
+    ocultar_duplicatas: bool = False,
+    loja: Optional[str] = None,
+    cidade: Optional[str] = None
+) -> list[tuple[models.FotoPromotor, float]]:
+    """
+    Busca textual ordenada por relevância (ts_rank_cd), com os mesmos filtros
+    de `get_fotos_by_empresa`. Retorna pares (foto, rank); `apos` é o
+    (rank, id) do último item da página anterior.
+    """
+    stmt = select_fotos_por_relevancia(
+        empresa_id, busca, promotor_id, data_inicio, data_fim, limite, apos, ocultar_duplicatas, loja, cidade
+    )
+    if stmt is None:
+        return []
+    return [(foto, valor) for foto, valor in db.execute(stmt).all()]
+
+def select_exportacao_fotos(
+    empresa_id: int,
+    promotor_id: Optional[int] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    busca: Optional[str] = None,
+    ocultar_duplicatas: bool = False,
+    loja: Optional[str] = None,
+    cidade: Optional[str] = None
+) -> Select:
+    """
+    Projeção das fotos para exportação (sem carregar objetos ORM), com os
+    filtros de `get_fotos_by_empresa` e o nome do promotor. Feita para ser
+    lida por cursor no servidor (yield_per), sem limite de linhas.
+    """
+    tsquery = montar_tsquery(busca) if busca else None
+    stmt = select(
+        models.FotoPromotor.id,
+        models.FotoPromotor.data_envio,
+        models.Usuario.nome.label("promotor"),
+        models.FotoPromotor.loja,
+        models.FotoPromotor.cidade,
+        models.FotoPromotor.legenda,
+        models.FotoPromotor.duplicata_de_id,
+        models.FotoPromotor.url_foto,
+    ).join(models.Usuario, models.FotoPromotor.promotor_id == models.Usuario.id)
+    stmt = _filtrar_fotos(
+        stmt, empresa_id, promotor_id, data_inicio, data_fim, tsquery, ocultar_duplicatas, loja, cidade
+    )
+    return stmt.order_by(models.FotoPromotor.data_envio.desc(), models.FotoPromotor.id.desc())
+
+def select_exportacao_kpis(
+    empresa_id: int,
+    promotor_id: Optional[int] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None
+) -> Select:
+    """Rollup diário (dia, promotor, fotos) da empresa para exportação, do dia mais recente ao mais antigo."""
+    kpi = models.KpiDiarioPromotor
+    stmt = (
+        select(kpi.dia, models.Usuario.nome.label("promotor"), kpi.total_fotos)
+        .join(models.Usuario, kpi.promotor_id == models.Usuario.id)
+        .where(kpi.empresa_id == empresa_id)
+    )
     if promotor_id:
-        query = query.filter(models.FotoPromotor.promotor_id == promotor_id)
+        stmt = stmt.where(kpi.promotor_id == promotor_id)
     if data_inicio:
-        query = query.filter(models.FotoPromotor.data_envio >= data_inicio)
+        stmt = stmt.where(kpi.dia >= data_inicio)
     if data_fim:
-        # Adiciona 1 dia para incluir o dia final completo
-        query = query.filter(models.FotoPromotor.data_envio < datetime.combine(data_fim, datetime.max.time()))
-    if busca:
-        query = query.filter(models.FotoPromotor.legenda.ilike(f"%{busca}%"))
+        stmt = stmt.where(kpi.dia <= data_fim)
+    return stmt.order_by(kpi.dia.desc(), models.Usuario.nome)
 
-    return query.order_by(models.FotoPromotor.data_envio.desc()).all()
+def marcar_fotos_alteradas(db: Session, empresa_ids) -> None:
+    """
+    Sobe `Empresa.versao_fotos` (sem commit). Todo caminho que altera ou
+    remove fotos já gravadas chama isto na mesma transação; fotos novas não
+    precisam (a versão já inclui a mais nova).
+    """
+    db.query(models.Empresa).filter(models.Empresa.id.in_(list(empresa_ids))).update(
+        {"versao_fotos": models.Empresa.versao_fotos + 1}, synchronize_session=False
+    )
 
-# <<<< NOVA FUNÇÃO DE KPIS AQUI >>>>
-def get_dashboard_kpis(db: Session, empresa_id: int):
-    """Calcula os KPIs para o dashboard."""
-    today = date.today()
-    
-    fotos_hoje = db.query(func.count(models.FotoPromotor.id)).filter(
-        models.FotoPromotor.empresa_id == empresa_id,
-        func.date(models.FotoPromotor.data_envio) == today
-    ).scalar()
+def select_versao_dados(empresa_id: int) -> Select:
+    """
+    SELECT de `get_versao_dados`: a foto mais nova (só a primeira entrada do
+    índice ix_fotos_empresa_data_id) e o contador de alterações da empresa.
+    """
+    mais_nova = (
+        select(models.FotoPromotor.id)
+        .where(models.FotoPromotor.empresa_id == empresa_id)
+        .order_by(models.FotoPromotor.data_envio.desc(), models.FotoPromotor.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    return select(func.coalesce(mais_nova, 0), models.Empresa.versao_fotos).where(models.Empresa.id == empresa_id)
 
-    promotores_ativos_hoje = db.query(func.count(distinct(models.FotoPromotor.promotor_id))).filter(
-        models.FotoPromotor.empresa_id == empresa_id,
-        func.date(models.FotoPromotor.data_envio) == today
-    ).scalar()
-    
-    fotos_mes = db.query(func.count(models.FotoPromotor.id)).filter(
-        models.FotoPromotor.empresa_id == empresa_id,
-        extract('month', models.FotoPromotor.data_envio) == today.month,
-        extract('year', models.FotoPromotor.data_envio) == today.year
-    ).scalar()
-
-    # Ranking (retorna ID e contagem)
-    ranking = db.query(
-        models.Usuario.nome,
-        func.count(models.FotoPromotor.id).label('total_fotos')
-    ).join(models.Usuario, models.FotoPromotor.promotor_id == models.Usuario.id)\
-    .filter(models.FotoPromotor.empresa_id == empresa_id)\
-    .group_by(models.Usuario.nome)\
-    .order_by(func.count(models.FotoPromotor.id).desc())\
-    .limit(3).all()
-    
+def formatar_versao(linha) -> str:
+    mais_nova, alteracoes = linha or (0, 0)
+    return f"{mais_nova}.{alteracoes}"
+
+def get_versao_dados(db: Session, empresa_id: int) -> str:
+    """
+    Identifica o estado atual das fotos da empresa: muda sempre que chega
+    uma foto nova ou que uma foto existente é alterada ou arquivada.
+    """
+    return formatar_versao(db.execute(select_versao_dados(empresa_id)).first())
+
+def select_kpis_mes(empresa_id: int) -> Select:
+    """Hoje e mês em uma única leitura das linhas do mês corrente do rollup."""
+    kpi = models.KpiDiarioPromotor
+    hoje = func.current_date()
+    return select(
+        func.coalesce(func.sum(kpi.total_fotos).filter(kpi.dia == hoje), 0),
+        func.count().filter(kpi.dia == hoje),
+        func.coalesce(func.sum(kpi.total_fotos), 0)
+    ).where(
+        kpi.empresa_id == empresa_id,
+        kpi.dia >= cast(func.date_trunc('month', hoje), Date)
+    )
+
+def select_ranking_promotores(empresa_id: int, limite: int = 3) -> Select:
+    """Ranking (nome e contagem) a partir do rollup."""
+    kpi = models.KpiDiarioPromotor
+    total = func.sum(kpi.total_fotos)
+    return (
+        select(models.Usuario.nome, total.label('total_fotos'))
+        .join(models.Usuario, kpi.promotor_id == models.Usuario.id)
+        .where(kpi.empresa_id == empresa_id)
+        .group_by(kpi.promotor_id, models.Usuario.nome)
+        .order_by(total.desc())
+        .limit(limite)
+    )
+
+def montar_kpis(mes, ranking) -> dict:
+    fotos_hoje, promotores_ativos_hoje, fotos_mes = mes
     return {
         "fotos_hoje": fotos_hoje,
         "promotores_ativos_hoje": promotores_ativos_hoje,
         "fotos_mes": fotos_mes,
         "ranking_promotores": [{"nome": nome, "total": total} for nome, total in ranking]
-    }
\ No newline at end of file
+    }
+
+# <<<< NOVA FUNÇÃO DE KPIS AQUI >>>>
+def get_dashboard_kpis(db: Session, empresa_id: int):
+    """Calcula os KPIs para o dashboard a partir do rollup diário."""
+    return montar_kpis(
+        db.execute(select_kpis_mes(empresa_id)).one(),
+        db.execute(select_ranking_promotores(empresa_id)).all()
+    )
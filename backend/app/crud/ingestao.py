@@ -0,0 +1,171 @@
+# backend/app/crud/ingestao.py
+
+import uuid
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ..db import models
+
+STATUS_PENDENTE = "pendente"
+STATUS_PROCESSANDO = "processando"
+STATUS_MORTO = "morto"
+
+
+def enfileirar_foto(db: Session, from_number: str, media_url: str, legenda: str | None) -> models.IngestaoFoto:
+    """Adiciona uma foto recebida pelo webhook na fila de ingestão."""
+    job = models.IngestaoFoto(
+        from_number=from_number,
+        media_url=media_url,
+        legenda=legenda,
+        status=STATUS_PENDENTE,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def contar_ativos(db: Session) -> int:
+    """Conta os jobs ainda não finalizados (usa o índice parcial da fila)."""
+    return db.query(func.count(models.IngestaoFoto.id)).filter(
+        models.IngestaoFoto.status.in_([STATUS_PENDENTE, STATUS_PROCESSANDO])
+    ).scalar()
+
+
+def reservar_jobs(
+    db: Session, limite: int, lease_segundos: int, max_tentativas: int
+) -> list[models.IngestaoFoto]:
+    """
+    Reserva até `limite` jobs disponíveis para este worker.
+
+    Jobs 'processando' cujo lease expirou (worker morreu no meio) voltam a ser
+    elegíveis, a menos que já tenham gasto `max_tentativas`: um job que derruba
+    o worker toda vez (ex.: imagem que estoura a memória) nunca passa por
+    `registrar_falha`, então vai para o dead-letter aqui. O SKIP LOCKED
+    garante que workers concorrentes nunca peguem o mesmo job e que nenhum
+    deles fique esperando pelo lock do outro. Cada
+    reserva recebe um token novo (`job.reserva`), exigido para concluir ou
+    registrar a falha: o worker cujo lease venceu não mexe mais no job.
+    """
+    agora = datetime.now(timezone.utc)
+    jobs = (
+        db.query(models.IngestaoFoto)
+        .filter(
+            models.IngestaoFoto.status.in_([STATUS_PENDENTE, STATUS_PROCESSANDO]),
+            models.IngestaoFoto.disponivel_em <= agora,
+        )
+        .order_by(models.IngestaoFoto.disponivel_em)
+        .limit(limite)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    reservados = []
+    for job in jobs:
+        if job.status == STATUS_PROCESSANDO and job.tentativas >= max_tentativas:
+            job.status = STATUS_MORTO
+            job.reserva = None
+            job.ultimo_erro = f"Lease vencido na tentativa {job.tentativas}: o worker parou no meio do job."
+            continue
+        reservados.append(job)
+        job.status = STATUS_PROCESSANDO
+        job.tentativas += 1
+        job.disponivel_em = agora + timedelta(seconds=lease_segundos)
+        job.reserva = uuid.uuid4().hex
+    db.commit()
+    return reservados
+
+
+def consumir_job(db: Session, job_id: int, reserva: str) -> bool:
+    """
+    Remove da fila o job ainda reservado com o token `reserva` (sem commit).
+    Roda na mesma transação que registra a foto: o job sai da fila se, e só
+    se, a foto entra, e o DELETE trava a linha do job até o commit. Retorna
+    False se o job já não é deste worker (lease vencido e reservado por outro,
+    devolvido ou já concluído): quem chama desfaz a transação.
+    """
+    return db.query(models.IngestaoFoto).filter(
+        models.IngestaoFoto.id == job_id,
+        models.IngestaoFoto.reserva == reserva,
+        models.IngestaoFoto.status == STATUS_PROCESSANDO,
+    ).delete(synchronize_session=False) == 1
+
+
+def devolver_job(db: Session, job_id: int, reserva: str) -> bool:
+    """
+    Devolve à fila, disponível imediatamente, um job interrompido no desligamento
+    do worker (não conta como tentativa). Invalida o token: um registro da
+    foto ainda em andamento numa thread do worker cancelado não consegue mais
+    consumir o job. Se o registro já tinha consumido o job (ou está
+    consumindo: o UPDATE espera o lock da linha), não há o que devolver e
+    retorna False.
+    """
+    devolvidos = db.query(models.IngestaoFoto).filter(
+        models.IngestaoFoto.id == job_id,
+        models.IngestaoFoto.reserva == reserva,
+        models.IngestaoFoto.status == STATUS_PROCESSANDO,
+    ).update({
+        models.IngestaoFoto.status: STATUS_PENDENTE,
+        models.IngestaoFoto.tentativas: models.IngestaoFoto.tentativas - 1,
+        models.IngestaoFoto.disponivel_em: datetime.now(timezone.utc),
+        models.IngestaoFoto.reserva: None,
+    }, synchronize_session=False)
+    db.commit()
+    return devolvidos == 1
+
+
+def registrar_falha(
+    db: Session,
+    job_id: int,
+    reserva: str,
+    erro: str,
+    max_tentativas: int,
+    backoff_base: float,
+    backoff_max: float,
+    permanente: bool = False,
+    espera_minima: float | None = None,
+) -> models.IngestaoFoto | None:
+    """
+    Registra a falha de um job. Reagenda com backoff exponencial (nunca antes
+    de `espera_minima` segundos, ex.: o Retry-After da Twilio) ou, se as
+    tentativas acabaram (ou o erro é permanente), move para o dead-letter.
+    Retorna None, sem mexer em nada, se o job já não é desta reserva.
+    """
+    job = db.query(models.IngestaoFoto).filter(
+        models.IngestaoFoto.id == job_id,
+        models.IngestaoFoto.reserva == reserva,
+        models.IngestaoFoto.status == STATUS_PROCESSANDO,
+    ).with_for_update().first()
+    if not job:
+        db.rollback()
+        return None
+
+    job.ultimo_erro = erro
+    job.reserva = None
+    if permanente or job.tentativas >= max_tentativas:
+        job.status = STATUS_MORTO
+    else:
+        espera = max(min(backoff_base * (2 ** (job.tentativas - 1)), backoff_max), espera_minima or 0)
+        job.status = STATUS_PENDENTE
+        job.disponivel_em = datetime.now(timezone.utc) + timedelta(seconds=espera)
+
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def reprocessar_mortos(db: Session) -> int:
+    """Devolve todos os jobs do dead-letter para a fila, zerando as tentativas."""
+    total = (
+        db.query(models.IngestaoFoto)
+        .filter(models.IngestaoFoto.status == STATUS_MORTO)
+        .update(
+            {
+                models.IngestaoFoto.status: STATUS_PENDENTE,
+                models.IngestaoFoto.tentativas: 0,
+                models.IngestaoFoto.disponivel_em: func.now(),
+            },
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return total
@@ -0,0 +1,33 @@
+# backend/app/crud/loja.py
+
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from ..db import models
+
+
+def get_lojas(db: Session, empresa_id: int) -> list[models.Loja]:
+    """Todas as lojas da empresa (o dicionário da extração cabe em memória)."""
+    return (
+        db.query(models.Loja)
+        .filter(models.Loja.empresa_id == empresa_id)
+        .order_by(models.Loja.nome, models.Loja.cidade)
+        .all()
+    )
+
+
+def get_empresas_com_lojas(db: Session) -> list[int]:
+    """IDs das empresas que têm ao menos uma loja cadastrada."""
+    return [empresa_id for (empresa_id,) in db.query(models.Loja.empresa_id).distinct().order_by(models.Loja.empresa_id)]
+
+
+def salvar_loja(db: Session, empresa_id: int, nome: str, cidade: str, apelidos: list[str] | None = None) -> None:
+    """
+    Cria a loja ou, se já existir (mesmo nome e cidade na empresa), substitui
+    os apelidos. Sem commit: quem importa em lote decide quando gravar.
+    """
+    apelidos = apelidos or []
+    stmt = insert(models.Loja).values(empresa_id=empresa_id, nome=nome, cidade=cidade, apelidos=apelidos)
+    db.execute(stmt.on_conflict_do_update(
+        constraint="uq_lojas_empresa_nome_cidade",
+        set_={"apelidos": stmt.excluded.apelidos}
+    ))
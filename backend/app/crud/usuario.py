@@ -1,9 +1,12 @@
-from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import Select, select
+from sqlalchemy.orm import Session
 from app.db import models
+from app.crud import contrato as crud_contrato
 from app.schemas import usuario as schemas_usuario
 
 # Importa as funções de segurança necessárias do local correto.
 from app.core.hashing import get_password_hash, verify_password
+from app.core import cache_usuarios
 
 def get_user_by_whatsapp(db: Session, whatsapp_number: str) -> models.Usuario | None:
     """Busca um usuário pelo número de WhatsApp."""
@@ -13,9 +16,17 @@ def get_user_by_email(db: Session, email: str) -> models.Usuario | None:
     """Busca um usuário pelo e-mail."""
     return db.query(models.Usuario).filter(models.Usuario.email == email).first()
 
-def create_user(db: Session, user_in: schemas_usuario.UsuarioCreate, empresa_id: int) -> models.Usuario:
-    """Cria um novo usuário no banco de dados."""
-    hashed_password = get_password_hash(user_in.password)
+def create_user(
+    db: Session,
+    user_in: schemas_usuario.UsuarioCreate,
+    empresa_id: int,
+    hashed_password: str | None = None
+) -> models.Usuario:
+    """
+    Cria um novo usuário no banco de dados. Rotas assíncronas passam o
+    `hashed_password` já calculado no pool de hashing.
+    """
+    hashed_password = hashed_password or get_password_hash(user_in.password)
     
     db_user = models.Usuario(
         email=user_in.email,
@@ -43,15 +54,46 @@ def authenticate_user(db: Session, email: str, password: str) -> models.Usuario
         return None
     return user
 
-def get_users_by_empresa(db: Session, empresa_id: int):
-    """Retorna todos os usuários de uma empresa."""
-    return (
-        db.query(models.Usuario)
-        .options(selectinload(models.Usuario.contratos))
-        .filter(models.Usuario.empresa_id == empresa_id)
-        .order_by(models.Usuario.nome)
-        .all()
+def atualizar_hash_senha(db: Session, user: models.Usuario, novo_hash: str) -> None:
+    """Grava o hash refeito com o custo atual do bcrypt (rehash transparente no login)."""
+    db.query(models.Usuario).filter(models.Usuario.id == user.id).update(
+        {models.Usuario.hashed_password: novo_hash}, synchronize_session=False
     )
+    db.commit()
+    cache_usuarios.invalidar(user.email)
+
+def select_usuarios_resposta() -> Select:
+    """
+    Só as colunas do `schemas.usuario.Usuario` (sem hashed_password); quem
+    chama acrescenta o filtro. Os contratos vêm de `crud.contrato.select_contratos_dos_usuarios`.
+    """
+    return select(
+        models.Usuario.id,
+        models.Usuario.nome,
+        models.Usuario.email,
+        models.Usuario.empresa_id,
+        models.Usuario.perfil,
+        models.Usuario.is_active,
+        models.Usuario.data_criacao,
+    ).order_by(models.Usuario.nome)
+
+def montar_usuarios(linhas, contratos_por_usuario: dict[int, list[dict]]) -> list[dict]:
+    """Resposta no formato do `schemas.usuario.Usuario`, já com os contratos de cada um."""
+    return [
+        {**linha._asdict(), "contratos": contratos_por_usuario.get(linha.id, [])}
+        for linha in linhas
+    ]
+
+def get_users_by_empresa(db: Session, empresa_id: int) -> list[dict]:
+    """
+    Usuários de uma empresa com os contratos, prontos para a resposta: duas
+    queries (usuários e contratos), seja qual for o número de linhas.
+    """
+    linhas = db.execute(select_usuarios_resposta().where(models.Usuario.empresa_id == empresa_id)).all()
+    if not linhas:
+        return []
+    contratos = db.execute(crud_contrato.select_contratos_dos_usuarios([l.id for l in linhas])).all()
+    return montar_usuarios(linhas, crud_contrato.agrupar_por_usuario(contratos))
 
 def update_user(db: Session, user_id: int, user_in: schemas_usuario.UsuarioUpdate) -> models.Usuario | None:
     """Atualiza um usuário existente."""
@@ -59,10 +101,13 @@ def update_user(db: Session, user_id: int, user_in: schemas_usuario.UsuarioUpdat
     if not db_user:
         return None
 
+    email_anterior = db_user.email
     update_data = user_in.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_user, key, value)
     
     db.commit()
+    # Perfil, is_active etc. mudaram: o próximo request recarrega do banco
+    cache_usuarios.invalidar(email_anterior, db_user.email)
     db.refresh(db_user)
     return db_user
\ No newline at end of file
@@ -1,80 +1,397 @@
-import os
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-import psycopg2
-from psycopg2.pool import SimpleConnectionPool
-from psycopg2.extensions import connection as PgConnection
-
-
-connection_pool: SimpleConnectionPool | None = None
-
-def init_connection_pool():
-    global connection_pool
-    if connection_pool is None:
-        DB_NAME = os.getenv("DB_NAME")
-        DB_USER = os.getenv("DB_USER")
-        DB_PASSWORD = os.getenv("DB_PASSWORD")
-        DB_HOST = "postgres"
-        DB_PORT = "5432"
-        print("Inicializando o pool de conexões psycopg2...")
-        connection_pool = SimpleConnectionPool(minconn=1, maxconn=20, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
-        print("Pool psycopg2 inicializado.")
-
-def close_connection_pool():
-    global connection_pool
-    if connection_pool:
-        print("Fechando o pool de conexões psycopg2...")
-        connection_pool.closeall()
-        connection_pool = None
-        print("Pool psycopg2 fechado.")
-
-# --- CONFIGURAÇÃO DO SQLALCHEMY (A parte que estamos depurando) ---
-# Lendo as variáveis de ambiente para o SQLAlchemy
-DB_USER_SA = os.getenv("DB_USER")
-DB_PASSWORD_SA = os.getenv("DB_PASSWORD")
-DB_NAME_SA = os.getenv("DB_NAME")
-DB_HOST_SA = "postgres"  # O nome do serviço no docker-compose
-DB_PORT_SA = "5432"
-
-# Montando a string de conexão que o SQLAlchemy entende
-SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
-
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+import asyncio
+import threading
+import time
+
+from typing import TYPE_CHECKING
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+from app.core.config import settings
+from app.db.contagem_queries import instrumentar
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class _MetricasPool:
+    """Contadores de espera por conexão do pool deste processo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.esperas = 0
+        self.espera_total = 0.0
+        self.espera_maxima = 0.0
+        self.timeouts = 0
+
+    def registrar(self, segundos: float, timeout: bool = False):
+        with self._lock:
+            self.esperas += 1
+            self.espera_total += segundos
+            self.espera_maxima = max(self.espera_maxima, segundos)
+            if timeout:
+                self.timeouts += 1
+
+
+class _MedeEspera:
+    """Mixin de pool que mede quanto tempo cada checkout esperou por uma conexão."""
+
+    metricas: _MetricasPool
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conexao = super()._do_get()
+        except PoolTimeoutError:
+            self.metricas.registrar(time.perf_counter() - inicio, timeout=True)
+            raise
+        self.metricas.registrar(time.perf_counter() - inicio)
+        return conexao
+
+
+class PoolInstrumentado(_MedeEspera, QueuePool):
+    metricas = _MetricasPool()
+
+
+class PoolAsyncInstrumentado(_MedeEspera, AsyncAdaptedQueuePool):
+    metricas = _MetricasPool()
+
+
+def _opcoes_pool() -> dict:
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SEGUNDOS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SEGUNDOS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def criar_engine(url: str = settings.DATABASE_URL, sem_timeouts: bool = False, **opcoes):
+    """
+    Cria o engine com o pool configurado pelo Settings. Cada processo (API,
+    worker de ingestão, CLI) usa um único engine; dimensione
+    DB_POOL_SIZE + DB_MAX_OVERFLOW vezes o número de processos abaixo do
+    max_connections do Postgres. `sem_timeouts` é só para os comandos em lote
+    (ver `get_engine_lote`).
+    """
+    statement_timeout_ms = 0 if sem_timeouts else settings.DB_STATEMENT_TIMEOUT_MS
+    ociosa_ms = 0 if sem_timeouts else settings.DB_IDLE_TRANSACTION_TIMEOUT_MS
+    engine = create_engine(
+        url,
+        poolclass=PoolInstrumentado,
+        **_opcoes_pool(),
+        connect_args={
+            # Nenhuma query (nem transação esquecida aberta) segura uma conexão para sempre
+            "options": (
+                f"-c statement_timeout={statement_timeout_ms} "
+                f"-c idle_in_transaction_session_timeout={ociosa_ms}"
+            ),
+            "application_name": settings.DB_APPLICATION_NAME,
+        },
+        **opcoes,
+    )
+    instrumentar(engine)
+    return engine
+
+
+def criar_engine_administrativo(lock_timeout_ms: int | None = None):
+    """
+    Engine sem pool para o prestart e as migrações: conexão com timeout curto
+    (a sondagem de prontidão falha rápido), sem statement_timeout (índices e
+    cópias longas) e com lock_timeout, para que um ALTER nunca fique na fila
+    do lock de uma tabela quente bloqueando as queries que chegam depois dele.
+    """
+    from sqlalchemy.pool import NullPool
+
+    if lock_timeout_ms is None:
+        lock_timeout_ms = settings.MIGRACAO_LOCK_TIMEOUT_MS
+    return create_engine(
+        settings.DATABASE_URL,
+        poolclass=NullPool,
+        connect_args={
+            "connect_timeout": settings.PRESTART_CONNECT_TIMEOUT_SEGUNDOS,
+            "options": f"-c statement_timeout=0 -c lock_timeout={lock_timeout_ms}",
+            "application_name": f"{settings.DB_APPLICATION_NAME}-migracoes",
+        },
+    )
+
+
+# Parâmetros de conexão da libpq que o asyncpg não aceita na URL: os que têm
+# equivalente são traduzidos em `_url_asyncpg`, os demais são descartados
+_PARAMETROS_LIBPQ = {
+    "sslmode", "sslrootcert", "sslcert", "sslkey", "sslcrl", "sslpassword", "sslcompression",
+    "options", "connect_timeout", "application_name", "client_encoding", "target_session_attrs",
+    "gssencmode", "channel_binding", "keepalives", "keepalives_idle", "keepalives_interval",
+    "keepalives_count", "tcp_user_timeout",
+}
+
+
+def _ssl_asyncpg(parametros: dict):
+    """
+    `ssl` do asyncpg equivalente ao sslmode da URL. Com certificados na URL
+    (sslrootcert/sslcert/sslkey) monta o SSLContext; sem eles, o asyncpg
+    aceita o próprio nome do modo.
+    """
+    modo = parametros.get("sslmode", "prefer")
+    if modo == "disable":
+        return False
+    if not any(parametros.get(chave) for chave in ("sslrootcert", "sslcert", "sslkey")):
+        return modo
+    import ssl
+
+    contexto = ssl.create_default_context(cafile=parametros.get("sslrootcert"))
+    if modo not in ("verify-ca", "verify-full"):
+        contexto.check_hostname = False
+        contexto.verify_mode = ssl.CERT_NONE
+    elif modo == "verify-ca":
+        contexto.check_hostname = False
+    if parametros.get("sslcert"):
+        contexto.load_cert_chain(parametros["sslcert"], parametros.get("sslkey"))
+    return contexto
+
+
+def _url_asyncpg(url: str):
+    """
+    Converte a DATABASE_URL (escrita para o psycopg2/libpq) para o asyncpg:
+    troca o driver, tira da query string os parâmetros da libpq e devolve o
+    equivalente de cada um em connect_args. Retorna (url, connect_args,
+    server_settings).
+    """
+    url = make_url(url).set(drivername="postgresql+asyncpg")
+    parametros = {
+        chave: valor[-1] if isinstance(valor, tuple) else valor
+        for chave, valor in url.query.items()
+        if chave in _PARAMETROS_LIBPQ
+    }
+    url = url.difference_update_query(parametros)
+    connect_args: dict = {}
+    server_settings: dict[str, str] = {}
+    if any(chave.startswith("ssl") for chave in parametros):
+        connect_args["ssl"] = _ssl_asyncpg(parametros)
+    if parametros.get("connect_timeout"):
+        connect_args["timeout"] = float(parametros["connect_timeout"])
+    # options=-c chave=valor [-c ...] vira server_settings
+    partes = iter(parametros.get("options", "").split())
+    for parte in partes:
+        if parte == "-c":
+            parte = next(partes, "")
+        elif parte.startswith(("-c", "--")):
+            parte = parte[2:]
+        else:
+            continue
+        chave, _, valor = parte.partition("=")
+        if chave and valor:
+            server_settings[chave.replace("-", "_")] = valor
+    for chave in ("application_name", "client_encoding"):
+        if parametros.get(chave):
+            server_settings[chave] = parametros[chave]
+    return url, connect_args, server_settings
+
+
+def criar_async_engine(url: str = settings.DATABASE_URL, **opcoes):
+    """
+    Engine assíncrono (asyncpg) usado pelas rotas da API, com o mesmo pool e
+    timeouts do síncrono. Aceita a mesma DATABASE_URL: os parâmetros da libpq
+    (sslmode, options, ...) são traduzidos por `_url_asyncpg`.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url, connect_args, server_settings = _url_asyncpg(url)
+    engine = create_async_engine(
+        url,
+        poolclass=PoolAsyncInstrumentado,
+        **_opcoes_pool(),
+        connect_args={
+            **connect_args,
+            "server_settings": {
+                **server_settings,
+                "statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS),
+                "idle_in_transaction_session_timeout": str(settings.DB_IDLE_TRANSACTION_TIMEOUT_MS),
+                "application_name": settings.DB_APPLICATION_NAME,
+            },
+        },
+        **opcoes,
+    )
+    instrumentar(engine.sync_engine)
+    return engine
+
+
+# Os engines e as fábricas de sessão são criados no primeiro uso, não no import:
+# comandos do manage.py que não tocam no banco (e o processo mestre do gunicorn)
+# não pagam pelo driver nem pelo pool. `engine` e `async_engine` continuam
+# acessíveis como atributos do módulo (via __getattr__ abaixo).
+_lock = threading.Lock()
+_engine = None
+_async_engine = None
+_engine_lote = None
+_fabrica_sync = None
+_fabrica_async = None
+_fabrica_lote = None
+
+
+def get_engine():
+    """Engine síncrono: manage.py, prestart.py e o worker de ingestão."""
+    global _engine, _fabrica_sync
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                _engine = criar_engine()
+                _fabrica_sync = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+    return _engine
+
+
+def get_engine_lote():
+    """
+    Engine síncrono dos comandos em lote do manage.py (reconstruir-kpis,
+    detectar-duplicatas, gerar-derivados...): sem o statement_timeout das
+    rotas, que derrubaria as varreduras de tabela inteira, e sem o
+    idle_in_transaction_session_timeout, que derrubaria a transação aberta
+    enquanto um lote é processado fora do banco (hashes, derivados, IA).
+    """
+    global _engine_lote, _fabrica_lote
+    if _engine_lote is None:
+        with _lock:
+            if _engine_lote is None:
+                _engine_lote = criar_engine(sem_timeouts=True)
+                _fabrica_lote = sessionmaker(autocommit=False, autoflush=False, bind=_engine_lote)
+    return _engine_lote
+
+
+def get_async_engine():
+    """Engine assíncrono: rotas da API."""
+    global _async_engine, _fabrica_async
+    if _async_engine is None:
+        with _lock:
+            if _async_engine is None:
+                from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+                _async_engine = criar_async_engine()
+                # Sem expirar no commit, para que os objetos continuem legíveis depois
+                # do commit sem nova ida ao banco (lazy load não existe em async).
+                _fabrica_async = async_sessionmaker(
+                    _async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+                )
+    return _async_engine
+
+
+def SessionLocal() -> Session:
+    """A fábrica de sessões que o CRUD precisa (uso: `db = SessionLocal()`)."""
+    get_engine()
+    return _fabrica_sync()
+
+
+def SessionLote() -> Session:
+    """Sessão do engine em lote (ver `get_engine_lote`)."""
+    get_engine_lote()
+    return _fabrica_lote()
+
+
+def AsyncSessionLocal() -> "AsyncSession":
+    """Fábrica de AsyncSession (uso: `async with AsyncSessionLocal() as db`)."""
+    get_async_engine()
+    return _fabrica_async()
+
+
+def __getattr__(nome: str):
+    if nome == "engine":
+        return get_engine()
+    if nome == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
+
+# A 'Base' que o models.py precisa para funcionar
 Base = declarative_base()
 
+
 def get_db():
+    """Dependência do FastAPI: uma sessão por request, devolvida ao pool no fim."""
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
-# ===================================================================
-# <<< ADICIONADO: Câmera de Debug para a URL de Conexão >>>
-# Esta linha vai nos mostrar no log do Docker exatamente como a URL
-# está sendo montada, revelando o problema.
-print("--- [DEBUG] URL DE CONEXÃO GERADA ---")
-print(f"--- [DEBUG] URL: {SQLALCHEMY_DATABASE_URL}")
-print("-------------------------------------")
-# ===================================================================
 
-# O 'engine' do SQLAlchemy usa a URL acima para se conectar.
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
 
-# A fábrica de sessões que o CRUD precisa
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def get_db_lote():
+    """Como `get_db`, para os comandos em lote do manage.py (sem os timeouts)."""
+    db = SessionLote()
+    try:
+        yield db
+    finally:
+        db.close()
+
 
-# A 'Base' que o models.py precisa para funcionar
-Base = declarative_base()
+async def get_async_db():
+    """Dependência do FastAPI para as rotas assíncronas: uma AsyncSession por request."""
+    async with AsyncSessionLocal() as db:
+        yield db
 
 
-# --- NOVA DEPENDÊNCIA get_db ---
-# Esta função agora retorna uma SESSÃO do SQLAlchemy,
-# que é o que as nossas funções em `crud/` esperam receber.
-def get_db():
-    db = SessionLocal()
+async def aquecer_pool_async(quantidade: int | None = None) -> int:
+    """
+    Abre `quantidade` conexões do pool assíncrono ao mesmo tempo (padrão:
+    DB_POOL_AQUECER ou DB_POOL_SIZE) e as devolve ao pool, para que os
+    primeiros requests não paguem o handshake com o Postgres. Retorna quantas abriu.
+    """
+    if quantidade is None:
+        quantidade = settings.DB_POOL_AQUECER if settings.DB_POOL_AQUECER is not None else settings.DB_POOL_SIZE
+    quantidade = min(quantidade, settings.DB_POOL_SIZE)
+    if quantidade <= 0:
+        return 0
+    async_engine = get_async_engine()
+    conexoes = await asyncio.gather(*(async_engine.connect() for _ in range(quantidade)))
     try:
-        yield db
+        await asyncio.gather(*(conexao.execute(text("SELECT 1")) for conexao in conexoes))
     finally:
-        db.close()
\ No newline at end of file
+        await asyncio.gather(*(conexao.close() for conexao in conexoes))
+    return quantidade
+
+
+def descartar_conexoes_herdadas() -> None:
+    """
+    Chamar no processo filho logo após um fork (gunicorn com preload): esquece
+    as conexões herdadas do processo pai sem fechá-las, para que cada worker
+    abra as suas.
+    """
+    if _engine is not None:
+        _engine.dispose(close=False)
+    if _async_engine is not None:
+        _async_engine.sync_engine.dispose(close=False)
+
+
+async def fechar_engines() -> None:
+    """Fecha as conexões dos engines já criados (desligamento do processo)."""
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _engine is not None:
+        _engine.dispose()
+
+
+def _estado_pool(pool) -> dict:
+    metricas = pool.metricas
+    return {
+        "tamanho": pool.size(),
+        "em_uso": pool.checkedout(),
+        "ociosas": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "esperas": metricas.esperas,
+        "espera_media_ms": round(1000 * metricas.espera_total / metricas.esperas, 2) if metricas.esperas else 0.0,
+        "espera_maxima_ms": round(1000 * metricas.espera_maxima, 2),
+        "timeouts": metricas.timeouts,
+    }
+
+
+def metricas_pool() -> dict:
+    """Estado dos pools (síncrono e assíncrono) já criados neste processo, para o endpoint /metricas."""
+    metricas = {}
+    if _engine is not None:
+        metricas["sincrono"] = _estado_pool(_engine.pool)
+    if _async_engine is not None:
+        metricas["assincrono"] = _estado_pool(_async_engine.sync_engine.pool)
+    return metricas
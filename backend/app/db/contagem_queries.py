@@ -0,0 +1,71 @@
+# backend/app/db/contagem_queries.py
+#
+# Conta as queries que chegam ao banco dentro de um trecho de código (ou de um
+# request), para provar que uma listagem roda um número constante de queries,
+# seja qual for o número de linhas. Os engines de `db/connection.py` já vêm
+# instrumentados; fora de `contar_queries()` o listener não faz nada.
+#
+# Uso (num teste ou num shell com o banco de pé):
+#
+#     with limite_de_queries(2):
+#         await crud_usuario.get_users_by_empresa(db, empresa_id)
+#
+# Com DB_CONTAR_QUERIES=true, cada resposta da API traz o cabeçalho X-Query-Count.
+# `tests/test_listagens_queries.py` confere que as listagens da API rodam o
+# mesmo número de queries com N e com 10N linhas.
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+# Mutável de propósito: o contextvar é copiado para a greenlet do driver
+# assíncrono, mas o contador é o mesmo objeto.
+_contagem: ContextVar["Contagem | None"] = ContextVar("contagem_queries", default=None)
+
+
+class Contagem:
+    def __init__(self):
+        self.total = 0
+        self.queries: list[str] = []
+
+    def registrar(self, sql: str) -> None:
+        self.total += 1
+        self.queries.append(sql)
+
+
+class QueriesDemais(AssertionError):
+    """O trecho rodou mais queries que o limite (provável N+1)."""
+
+
+def _antes_de_executar(conexao, cursor, sql, parametros, contexto, executemany):
+    contagem = _contagem.get()
+    if contagem is not None:
+        contagem.registrar(sql)
+
+
+def instrumentar(engine) -> None:
+    """Registra o contador num engine (síncrono, ou o `sync_engine` de um assíncrono)."""
+    if not event.contains(engine, "before_cursor_execute", _antes_de_executar):
+        event.listen(engine, "before_cursor_execute", _antes_de_executar)
+
+
+@contextmanager
+def contar_queries():
+    """Conta as queries executadas dentro do bloco (também as de corrotinas aguardadas nele)."""
+    contagem = Contagem()
+    token = _contagem.set(contagem)
+    try:
+        yield contagem
+    finally:
+        _contagem.reset(token)
+
+
+@contextmanager
+def limite_de_queries(maximo: int):
+    """Como `contar_queries`, mas falha com QueriesDemais se o bloco passar de `maximo` queries."""
+    with contar_queries() as contagem:
+        yield contagem
+    if contagem.total > maximo:
+        listagem = "\n".join(f"  {i}. {sql}" for i, sql in enumerate(contagem.queries, 1))
+        raise QueriesDemais(f"{contagem.total} queries (limite: {maximo}):\n{listagem}")
@@ -0,0 +1,128 @@
+# backend/app/db/migracoes/__init__.py
+#
+# Migrações versionadas do esquema, no lugar do `create_all` a cada boot.
+#
+# Cada migração é um módulo em `versoes/` (aplicados em ordem de nome:
+# m0001_..., m0002_...) com:
+#   DESCRICAO: str
+#   TRANSACIONAL: bool = True  -> False para quem usa CREATE INDEX CONCURRENTLY
+#   def aplicar(conexao) -> None
+#
+# As migrações devem ser idempotentes (IF NOT EXISTS & cia.): a m0001 cria um
+# banco novo já no modelo atual, e uma migração não transacional que falhou no
+# meio é executada de novo do começo.
+#
+# Bancos de antes deste executor (o prestart rodava `create_all` e
+# `db/esquema.py`) chegam com parte das colunas e índices: como tudo aqui é
+# idempotente, as migrações completam o que falta sem refazer o resto.
+
+import importlib
+import logging
+import pkgutil
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TABELA_CONTROLE = "schema_migracoes"
+# pg_advisory_lock: só uma réplica migra; as outras esperam e encontram tudo aplicado
+CHAVE_LOCK = 7_240_001
+# lock_not_available: estourou o lock_timeout
+_SQLSTATE_LOCK_TIMEOUT = "55P03"
+
+
+def disponiveis() -> list[tuple[str, object]]:
+    """(versão, módulo) de todas as migrações, em ordem."""
+    from . import versoes
+
+    nomes = sorted(m.name for m in pkgutil.iter_modules(versoes.__path__) if m.name.startswith("m"))
+    return [(nome, importlib.import_module(f"{versoes.__name__}.{nome}")) for nome in nomes]
+
+
+def _garantir_tabela_controle(conexao) -> None:
+    conexao.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {TABELA_CONTROLE} ("
+        "versao VARCHAR PRIMARY KEY, "
+        "descricao TEXT, "
+        "aplicada_em TIMESTAMPTZ NOT NULL DEFAULT now(), "
+        "duracao_ms INTEGER)"
+    ))
+
+
+def aplicadas(conexao) -> dict[str, object]:
+    """versão -> data em que foi aplicada."""
+    _garantir_tabela_controle(conexao)
+    return dict(conexao.execute(text(f"SELECT versao, aplicada_em FROM {TABELA_CONTROLE}")).all())
+
+
+def _lock_timeout(erro: OperationalError) -> bool:
+    original = erro.orig
+    return (getattr(original, "pgcode", None) or getattr(original, "sqlstate", None)) == _SQLSTATE_LOCK_TIMEOUT
+
+
+def _executar(engine, versao: str, modulo) -> None:
+    inicio = time.perf_counter()
+    registro = text(
+        f"INSERT INTO {TABELA_CONTROLE} (versao, descricao, duracao_ms) VALUES (:versao, :descricao, :duracao)"
+    )
+    if getattr(modulo, "TRANSACIONAL", True):
+        with engine.begin() as conexao:
+            modulo.aplicar(conexao)
+            conexao.execute(registro, {
+                "versao": versao, "descricao": modulo.DESCRICAO,
+                "duracao": int((time.perf_counter() - inicio) * 1000),
+            })
+        return
+    # CREATE INDEX CONCURRENTLY não roda dentro de transação
+    with engine.connect() as conexao:
+        conexao = conexao.execution_options(isolation_level="AUTOCOMMIT")
+        modulo.aplicar(conexao)
+        conexao.execute(registro, {
+            "versao": versao, "descricao": modulo.DESCRICAO,
+            "duracao": int((time.perf_counter() - inicio) * 1000),
+        })
+
+
+def _executar_com_tentativas(engine, versao: str, modulo) -> None:
+    espera = 1.0
+    for tentativa in range(1, settings.MIGRACAO_TENTATIVAS + 1):
+        try:
+            _executar(engine, versao, modulo)
+            return
+        except OperationalError as e:
+            if not _lock_timeout(e) or tentativa == settings.MIGRACAO_TENTATIVAS:
+                raise
+            logger.warning(
+                f"Migração {versao}: tabela ocupada (lock_timeout). "
+                f"Tentativa {tentativa}/{settings.MIGRACAO_TENTATIVAS}; nova tentativa em {espera:.0f}s."
+            )
+            time.sleep(espera)
+            espera *= 2
+
+
+def aplicar_pendentes(engine=None) -> list[str]:
+    """Aplica, em ordem, as migrações que ainda não constam em schema_migracoes."""
+    from app.db.connection import criar_engine_administrativo
+
+    engine = engine or criar_engine_administrativo()
+    feitas = []
+    # O lock é de sessão: fica numa conexão à parte durante todas as migrações
+    with engine.connect() as controle:
+        controle = controle.execution_options(isolation_level="AUTOCOMMIT")
+        controle.execute(text("SET lock_timeout = 0"))
+        controle.execute(text("SELECT pg_advisory_lock(:chave)"), {"chave": CHAVE_LOCK})
+        try:
+            ja_aplicadas = aplicadas(controle)
+            for versao, modulo in disponiveis():
+                if versao in ja_aplicadas:
+                    continue
+                logger.info(f"Aplicando migração {versao}: {modulo.DESCRICAO}")
+                _executar_com_tentativas(engine, versao, modulo)
+                feitas.append(versao)
+        finally:
+            controle.execute(text("SELECT pg_advisory_unlock(:chave)"), {"chave": CHAVE_LOCK})
+    return feitas
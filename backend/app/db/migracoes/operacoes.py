@@ -0,0 +1,120 @@
+# backend/app/db/migracoes/operacoes.py
+#
+# Operações idempotentes usadas pelas migrações, escritas para não travar
+# tabelas quentes: índices CONCURRENTLY e FKs NOT VALID + VALIDATE.
+
+import re
+
+from sqlalchemy import Index, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+
+def _existe(conexao, sql: str, **parametros) -> bool:
+    return conexao.execute(text(sql), parametros).scalar() is not None
+
+
+def adicionar_coluna(conexao, tabela: str, coluna: str, definicao: str) -> None:
+    """
+    ADD COLUMN IF NOT EXISTS. Coluna anulável e sem default volátil só mexe no
+    catálogo (lock curto, sem reescrever a tabela).
+    """
+    conexao.execute(text(f"ALTER TABLE {tabela} ADD COLUMN IF NOT EXISTS {coluna} {definicao}"))
+
+
+def adicionar_fk(conexao, tabela: str, coluna: str, referencia: str) -> None:
+    """
+    FK `<tabela>_<coluna>_fkey` criada NOT VALID (sem varrer a tabela sob
+    lock) e validada em seguida, com um lock que não bloqueia escritas.
+    """
+    nome = f"{tabela}_{coluna}_fkey"
+    if _existe(
+        conexao,
+        "SELECT 1 FROM pg_constraint WHERE conrelid = CAST(:tabela AS regclass) AND conname = :nome",
+        tabela=tabela, nome=nome,
+    ):
+        return
+    conexao.execute(text(f"ALTER TABLE {tabela} ADD CONSTRAINT {nome} FOREIGN KEY ({coluna}) REFERENCES {referencia} NOT VALID"))
+    conexao.execute(text(f"ALTER TABLE {tabela} VALIDATE CONSTRAINT {nome}"))
+
+
+def _estado_indice(conexao, nome: str) -> bool | None:
+    """True: existe e é válido; False: existe, mas inválido (CONCURRENTLY interrompido); None: não existe."""
+    return conexao.execute(text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :nome"
+    ), {"nome": nome}).scalar()
+
+
+def _particoes(conexao, tabela: str) -> list[str]:
+    return list(conexao.execute(text(
+        "SELECT filha.relname FROM pg_inherits i "
+        "JOIN pg_class pai ON pai.oid = i.inhparent "
+        "JOIN pg_class filha ON filha.oid = i.inhrelid "
+        "WHERE pai.relname = :tabela ORDER BY filha.relname"
+    ), {"tabela": tabela}).scalars())
+
+
+def _particionada(conexao, tabela: str) -> bool:
+    return _existe(
+        conexao,
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :tabela",
+        tabela=tabela,
+    )
+
+
+def _ddl(indice: Index, tabela: str, nome: str, concorrente: bool, so_pai: bool = False) -> str:
+    """DDL do índice do modelo, aplicado a `tabela` (o pai ou uma partição) com outro nome."""
+    sql = str(CreateIndex(indice, if_not_exists=True).compile(dialect=postgresql.dialect()))
+    original = indice.table.name
+    sql = re.sub(rf"\bON {re.escape(original)}\b", f"ON {'ONLY ' if so_pai else ''}{tabela}", sql, count=1)
+    sql = sql.replace(f" {indice.name} ", f" {nome} ", 1)
+    if concorrente:
+        sql = sql.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1).replace(
+            "CREATE UNIQUE INDEX", "CREATE UNIQUE INDEX CONCURRENTLY", 1
+        )
+    return sql
+
+
+def _criar_concorrente(conexao, indice: Index, tabela: str, nome: str) -> None:
+    estado = _estado_indice(conexao, nome)
+    if estado is True:
+        return
+    if estado is False:
+        conexao.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {nome}"))
+    conexao.execute(text(_ddl(indice, tabela, nome, concorrente=True)))
+
+
+def criar_indice_concorrente(conexao, indice: Index) -> None:
+    """
+    Cria um índice do modelo sem bloquear escritas. Precisa de uma conexão em
+    AUTOCOMMIT (migração com TRANSACIONAL = False).
+
+    Tabela particionada não aceita CONCURRENTLY no pai: o índice é criado
+    ON ONLY no pai (inválido), CONCURRENTLY em cada partição e as partições
+    são anexadas a ele, que fica válido quando a última entra.
+    """
+    tabela = indice.table.name
+    if not _particionada(conexao, tabela):
+        _criar_concorrente(conexao, indice, tabela, indice.name)
+        return
+    if _estado_indice(conexao, indice.name) is True:
+        return
+    conexao.execute(text(_ddl(indice, tabela, indice.name, concorrente=False, so_pai=True)))
+    for particao in _particoes(conexao, tabela):
+        nome = f"{indice.name}_{particao[len(tabela) + 1:]}"[:63]
+        _criar_concorrente(conexao, indice, particao, nome)
+        anexado = _existe(
+            conexao,
+            "SELECT 1 FROM pg_inherits WHERE inhrelid = CAST(:filho AS regclass) AND inhparent = CAST(:pai AS regclass)",
+            filho=nome, pai=indice.name,
+        )
+        if not anexado:
+            conexao.execute(text(f"ALTER INDEX {indice.name} ATTACH PARTITION {nome}"))
+
+
+def indice_do_modelo(tabela, nome: str) -> Index:
+    """O objeto Index de nome `nome` declarado no modelo de `tabela`."""
+    for indice in tabela.indexes:
+        if indice.name == nome:
+            return indice
+    raise KeyError(f"Índice {nome} não declarado em {tabela.name}")
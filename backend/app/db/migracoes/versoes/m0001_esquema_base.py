@@ -0,0 +1,14 @@
+# Banco novo: cria todas as tabelas do modelo atual (com as partições do mês
+# corrente em diante). Banco existente: cria só as tabelas que faltam; as
+# colunas e índices novos das tabelas antigas vêm nas migrações seguintes.
+
+from app.db import models
+from app.db.particoes import garantir_particoes, tabela_particionada
+
+DESCRICAO = "Tabelas do modelo e partições iniciais de fotos_promotores"
+
+
+def aplicar(conexao):
+    models.Base.metadata.create_all(conexao)
+    if tabela_particionada(conexao):
+        garantir_particoes(conexao)
@@ -0,0 +1,42 @@
+# Colunas adicionadas a fotos_promotores, contratos e empresas depois do
+# esquema original (derivados, storage por conteúdo, busca textual,
+# duplicatas, extração de loja/cidade e versão das fotos). Anuláveis ou com
+# default constante: só catálogo, sem reescrever a tabela. busca_tsv é
+# mantida por trigger a partir daqui; as fotos antigas são preenchidas em
+# lotes pela m0003.
+
+from sqlalchemy import text
+
+from app.db.models import DDL_BUSCA_TSV
+
+from app.db.migracoes.operacoes import adicionar_coluna, adicionar_fk
+
+DESCRICAO = "Colunas novas de fotos_promotores, contratos e empresas"
+
+
+def aplicar(conexao):
+    conexao.execute(text("CREATE EXTENSION IF NOT EXISTS unaccent"))
+    conexao.execute(text(
+        "CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS "
+        "$$ SELECT public.unaccent('public.unaccent', $1) $$ "
+        "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT"
+    ))
+
+    fotos = "fotos_promotores"
+    for coluna in ("url_miniatura", "url_preview", "url_grande", "extracao_status"):
+        adicionar_coluna(conexao, fotos, coluna, "VARCHAR")
+    adicionar_coluna(conexao, fotos, "blob_sha256", "VARCHAR(64)")
+    adicionar_coluna(conexao, fotos, "phash", "BIGINT")
+    for segmento in range(4):
+        adicionar_coluna(conexao, fotos, f"phash_s{segmento}", "INTEGER")
+    adicionar_coluna(conexao, fotos, "duplicata_de_id", "INTEGER")
+    adicionar_fk(conexao, fotos, "blob_sha256", "blobs (sha256)")
+    adicionar_coluna(conexao, fotos, "busca_tsv", "TSVECTOR")
+    for comando in DDL_BUSCA_TSV:
+        conexao.execute(text(comando))
+
+    adicionar_coluna(conexao, "contratos", "sha256", "VARCHAR(64)")
+    adicionar_coluna(conexao, "contratos", "blob_sha256", "VARCHAR(64)")
+    adicionar_fk(conexao, "contratos", "blob_sha256", "blobs (sha256)")
+
+    adicionar_coluna(conexao, "empresas", "versao_fotos", "INTEGER NOT NULL DEFAULT 0")
@@ -0,0 +1,67 @@
+# Preenche busca_tsv das fotos anteriores ao trigger (m0002) em lotes curtos,
+# cada um na própria transação: nenhum lock longo em fotos_promotores. Depois
+# cria os índices novos sem bloquear escritas (CONCURRENTLY; em tabela
+# particionada, partição por partição), o GIN da busca já sobre o vetor
+# preenchido. Interrompida, recomeça de onde parou (só pega linhas com
+# busca_tsv nula; índice inválido é refeito).
+
+import logging
+
+from sqlalchemy import text
+
+from app.db import models
+from app.db.migracoes.operacoes import criar_indice_concorrente, indice_do_modelo
+
+logger = logging.getLogger(__name__)
+
+DESCRICAO = "Preenchimento de busca_tsv e índices de listagem, busca, duplicatas, extração e blobs (CONCURRENTLY)"
+TRANSACIONAL = False
+
+LOTE = 5000
+
+INDICES = {
+    models.FotoPromotor.__table__: [
+        "ix_fotos_empresa_data_id",
+        "ix_fotos_busca_tsv",
+        "ix_fotos_phash_s0",
+        "ix_fotos_phash_s1",
+        "ix_fotos_phash_s2",
+        "ix_fotos_phash_s3",
+        "ix_fotos_extracao_pendente",
+        "ix_fotos_promotores_blob_sha256",
+        "ix_fotos_promotores_duplicata_de_id",
+    ],
+    models.Contrato.__table__: [
+        "ix_contratos_sha256",
+        "ix_contratos_blob_sha256",
+    ],
+}
+
+
+def preencher_busca_tsv(conexao) -> int:
+    """Preenche busca_tsv em lotes de LOTE fotos (uma transação por lote); retorna quantas."""
+    # SET legenda = legenda dispara trg_fotos_busca_tsv: o vetor sai da mesma
+    # expressão usada na ingestão, sem repeti-la aqui
+    lote = text(
+        "WITH alvo AS ("
+        "  SELECT id, data_envio FROM fotos_promotores"
+        "  WHERE busca_tsv IS NULL AND id > :ultimo ORDER BY id LIMIT :lote"
+        ") "
+        "UPDATE fotos_promotores f SET legenda = f.legenda FROM alvo "
+        "WHERE f.id = alvo.id AND f.data_envio = alvo.data_envio "
+        "RETURNING f.id"
+    )
+    ultimo, total = 0, 0
+    while True:
+        ids = conexao.execute(lote, {"ultimo": ultimo, "lote": LOTE}).scalars().all()
+        if not ids:
+            return total
+        ultimo, total = max(ids), total + len(ids)
+        logger.info(f"busca_tsv: {total} foto(s) preenchida(s) até o ID {ultimo}")
+
+
+def aplicar(conexao):
+    preencher_busca_tsv(conexao)
+    for tabela, nomes in INDICES.items():
+        for nome in nomes:
+            criar_indice_concorrente(conexao, indice_do_modelo(tabela, nome))
@@ -0,0 +1,16 @@
+# Banco que chega aqui sem nunca ter tido o painel de lojas, cidades e
+# horários: a m0001 criou painel_fotos_loja_hora vazio, e ele só passa a
+# somar as fotos novas. Preenche a tabela a partir de fotos_promotores se ela
+# estiver vazia (lê as fotos uma vez, ACCESS SHARE: não bloqueia a ingestão).
+
+from sqlalchemy import exists, select
+
+from app.crud.agregados import preencher_paineis
+from app.db import models
+
+DESCRICAO = "Preenchimento inicial de painel_fotos_loja_hora"
+
+
+def aplicar(conexao):
+    if not conexao.execute(select(exists().select_from(models.PainelFotosLojaHora))).scalar():
+        preencher_paineis(conexao)
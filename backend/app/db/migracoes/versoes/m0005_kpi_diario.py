@@ -0,0 +1,15 @@
+# Banco criado antes do rollup diário de KPIs: a m0001 criou
+# kpi_diario_promotor vazio, e os cartões do dashboard só contariam as fotos
+# novas. Preenche a tabela a partir de fotos_promotores se ela estiver vazia.
+
+from sqlalchemy import exists, select
+
+from app.crud.foto_promotor import preencher_kpis
+from app.db import models
+
+DESCRICAO = "Preenchimento inicial de kpi_diario_promotor"
+
+
+def aplicar(conexao):
+    if not conexao.execute(select(exists().select_from(models.KpiDiarioPromotor))).scalar():
+        preencher_kpis(conexao)
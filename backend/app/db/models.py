@@ -1,16 +1,29 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Float, Date, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import BigInteger, Boolean, Column, ForeignKey, Integer, String, DateTime, Float, Date, Enum, Text, Index, DDL, UniqueConstraint, CheckConstraint, event
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from .connection import Base
 from datetime import datetime
 import uuid
 
+# unaccent() não é IMMUTABLE, então não pode ser usada direto numa coluna gerada
+# nem num índice. O wrapper abaixo fixa o dicionário e pode.
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS unaccent"))
+event.listen(Base.metadata, "before_create", DDL(
+    "CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS "
+    "$$ SELECT public.unaccent('public.unaccent', $1) $$ "
+    "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT"
+))
+
 class Empresa(Base):
     __tablename__ = "empresas"
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String, unique=True, index=True)
     cnpj = Column(String, unique=True, index=True, nullable=True)
     data_criacao = Column(DateTime, default=datetime.utcnow)
+    # Sobe a cada alteração em fotos já gravadas (extração, quase-duplicatas,
+    # arquivamento); com a foto mais nova, forma a versão dos dados do cache da IA
+    versao_fotos = Column(Integer, nullable=False, default=0, server_default="0")
     usuarios = relationship("Usuario", back_populates="empresa")
     contratos = relationship("Contrato", back_populates="empresa")
     fotos_enviadas = relationship("FotoPromotor", back_populates="empresa")
@@ -31,24 +44,109 @@ class Usuario(Base):
     fotos_enviadas = relationship("FotoPromotor", back_populates="promotor")
 
 class FotoPromotor(Base):
+    """
+    Particionada por mês em data_envio (ver db/particoes.py). Chaves únicas
+    de tabela particionada precisam conter a coluna de partição, por isso a
+    PK é (id, data_envio) e não há FKs apontando para esta tabela.
+    """
     __tablename__ = "fotos_promotores"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     url_foto = Column(String, nullable=False) # URL pública da imagem salva
-    nome_arquivo_servidor = Column(String, nullable=False, unique=True)
+    nome_arquivo_servidor = Column(String, nullable=False, index=True) # Único na prática (UUID)
     legenda = Column(String, nullable=True) # Texto que veio junto com a foto
+
+    # Versões reduzidas (WebP) geradas na ingestão; nulas até serem geradas
+    url_miniatura = Column(String, nullable=True) # 160px
+    url_preview = Column(String, nullable=True) # 640px
+    url_grande = Column(String, nullable=True) # 1280px
     
-    # Contexto do envio (extraído da legenda pela IA ou pelo promotor)
+    # Contexto do envio, extraído da legenda (ver services/extracao_legenda.py)
     loja = Column(String, index=True, nullable=True)
     cidade = Column(String, index=True, nullable=True)
+    # Nulo: ainda não processada (ou sem legenda). 'local': resolvida pelo
+    # dicionário de lojas da empresa; 'pendente': aguarda a extração em lote
+    # pela IA; 'ia': resolvida pela IA; 'sem_resultado': nem a IA encontrou.
+    extracao_status = Column(String, nullable=True)
+
+    # Vetor de busca textual (legenda + loja + cidade), mantido pelo trigger
+    # trg_fotos_busca_tsv (ver DDL_BUSCA_TSV). Não é coluna gerada: adicionar uma
+    # coluna gerada reescreve a tabela inteira sob ACCESS EXCLUSIVE.
+    # Deferred: só é lido quando alguém pede explicitamente.
+    busca_tsv = deferred(Column(TSVECTOR, nullable=True))
     
     # Data e Relacionamentos
-    data_envio = Column(DateTime(timezone=True), server_default=func.now())
+    data_envio = Column(DateTime(timezone=True), primary_key=True, nullable=False, server_default=func.now())
     promotor_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
     empresa_id = Column(Integer, ForeignKey("empresas.id"), nullable=False)
+    blob_sha256 = Column(String(64), ForeignKey("blobs.sha256"), nullable=True, index=True) # Nulo só em fotos ainda não migradas
+
+    # Hash perceptual (dHash, 64 bits com sinal) e seus 4 segmentos de 16 bits,
+    # indexados para a busca de quase-duplicatas (ver services/duplicatas.py)
+    phash = Column(BigInteger, nullable=True)
+    phash_s0 = Column(Integer, nullable=True)
+    phash_s1 = Column(Integer, nullable=True)
+    phash_s2 = Column(Integer, nullable=True)
+    phash_s3 = Column(Integer, nullable=True)
+    # Foto original (do mesmo dia e empresa) da qual esta é quase-duplicata; não conta nos KPIs.
+    # Sem FK (ver docstring); original e duplicata são do mesmo dia, logo da mesma partição.
+    duplicata_de_id = Column(Integer, nullable=True, index=True)
 
     promotor = relationship("Usuario", back_populates="fotos_enviadas")
     empresa = relationship("Empresa")
+    blob = relationship("Blob")
+
+    __table_args__ = (
+        # Atende a listagem paginada por cursor: WHERE empresa_id = ? AND (data_envio, id) < (?, ?)
+        Index("ix_fotos_empresa_data_id", empresa_id, data_envio.desc(), id.desc()),
+        Index("ix_fotos_busca_tsv", "busca_tsv", postgresql_using="gin"),
+        # Multi-index hashing: WHERE empresa_id = ? AND phash_sN IN (...) AND data_envio no dia
+        Index("ix_fotos_phash_s0", empresa_id, phash_s0, data_envio),
+        Index("ix_fotos_phash_s1", empresa_id, phash_s1, data_envio),
+        Index("ix_fotos_phash_s2", empresa_id, phash_s2, data_envio),
+        Index("ix_fotos_phash_s3", empresa_id, phash_s3, data_envio),
+        # Fila da extração pela IA: só as fotos pendentes entram no índice
+        Index(
+            "ix_fotos_extracao_pendente",
+            empresa_id,
+            id,
+            postgresql_where=extracao_status == "pendente",
+        ),
+        {"postgresql_partition_by": "RANGE (data_envio)"},
+    )
+
+
+# Trigger de busca_tsv. Em tabela particionada, criado no pai vale para todas
+# as partições (inclusive as futuras).
+DDL_BUSCA_TSV = [
+    "CREATE OR REPLACE FUNCTION fotos_busca_tsv() RETURNS trigger AS $$ BEGIN "
+    "NEW.busca_tsv := to_tsvector('portuguese', f_unaccent("
+    "coalesce(NEW.legenda, '') || ' ' || coalesce(NEW.loja, '') || ' ' || coalesce(NEW.cidade, ''))); "
+    "RETURN NEW; END $$ LANGUAGE plpgsql",
+    "CREATE OR REPLACE TRIGGER trg_fotos_busca_tsv BEFORE INSERT OR UPDATE OF legenda, loja, cidade "
+    "ON fotos_promotores FOR EACH ROW EXECUTE FUNCTION fotos_busca_tsv()",
+]
+for _comando in DDL_BUSCA_TSV:
+    event.listen(FotoPromotor.__table__, "after_create", DDL(_comando))
+
+class Loja(Base):
+    """
+    Lojas (pontos de venda) conhecidas de cada empresa. Nome, apelidos e
+    cidades formam o dicionário usado para extrair loja/cidade das legendas.
+    """
+    __tablename__ = "lojas"
+
+    id = Column(Integer, primary_key=True, index=True)
+    empresa_id = Column(Integer, ForeignKey("empresas.id"), nullable=False, index=True)
+    nome = Column(String, nullable=False)
+    cidade = Column(String, nullable=False)
+    # Outras formas como os promotores escrevem a loja (ex.: 'carrefour pinheiros', 'cf pinheiros')
+    apelidos = Column(ARRAY(String), nullable=False, server_default="{}")
+    data_criacao = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("empresa_id", "nome", "cidade", name="uq_lojas_empresa_nome_cidade"),
+    )
 
 class Contrato(Base):
     __tablename__ = "contratos"
@@ -60,6 +158,8 @@ class Contrato(Base):
     nome_arquivo_original = Column(String, nullable=False)
     nome_arquivo_servidor = Column(String, nullable=False, unique=True) # Nome único para evitar conflitos
     caminho_arquivo = Column(String, nullable=False)
+    sha256 = Column(String(64), nullable=True, index=True) # Calculado no upload
+    blob_sha256 = Column(String(64), ForeignKey("blobs.sha256"), nullable=True, index=True) # Nulo só em contratos ainda não migrados
     
     data_upload = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -69,3 +169,98 @@ class Contrato(Base):
 
     usuario = relationship("Usuario") # Podemos chamar contrato.usuario
     empresa = relationship("Empresa") # Podemos chamar contrato.empresa
+    blob = relationship("Blob")
+
+class Blob(Base):
+    """
+    Conteúdo armazenado uma única vez (endereçado pelo SHA-256) e contado
+    pelas fotos e contratos que o referenciam. Com ref_count = 0 o arquivo
+    pode ser removido do storage.
+    """
+    __tablename__ = "blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    chave = Column(String, nullable=False) # Chave no storage: 'ab/cd/<sha256>.<ext>'
+    content_type = Column(String, nullable=False)
+    tamanho = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    data_criacao = Column(DateTime(timezone=True), server_default=func.now())
+
+class IngestaoFoto(Base):
+    """
+    Fila persistente das fotos recebidas pelo webhook do WhatsApp.
+    Os workers reservam os jobs com SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    __tablename__ = "fila_ingestao_fotos"
+
+    id = Column(Integer, primary_key=True, index=True)
+    from_number = Column(String, nullable=False)
+    media_url = Column(String, nullable=False)
+    legenda = Column(String, nullable=True)
+
+    # 'pendente' -> 'processando' -> (removido ao concluir) | 'morto' (dead-letter)
+    status = Column(String, nullable=False, default="pendente")
+    tentativas = Column(Integer, nullable=False, default=0)
+    # Para 'pendente': quando pode ser tentado de novo. Para 'processando': fim do lease.
+    disponivel_em = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # Token da reserva atual: só o worker que o detém conclui, falha ou devolve o job
+    # (um lease vencido e reservado por outro worker invalida o token do anterior)
+    reserva = Column(String(32), nullable=True)
+    ultimo_erro = Column(Text, nullable=True)
+    data_criacao = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index(
+            "ix_fila_ingestao_ativos",
+            "disponivel_em",
+            postgresql_where=status.in_(["pendente", "processando"]),
+        ),
+    )
+
+class KpiDiarioPromotor(Base):
+    """
+    Rollup diário de fotos por empresa e promotor, mantido incrementalmente
+    por `create_foto_registro`. Os KPIs do dashboard leem daqui em vez de
+    varrer `fotos_promotores`.
+    """
+    __tablename__ = "kpi_diario_promotor"
+
+    empresa_id = Column(Integer, ForeignKey("empresas.id"), primary_key=True)
+    dia = Column(Date, primary_key=True)
+    promotor_id = Column(Integer, ForeignKey("usuarios.id"), primary_key=True)
+    total_fotos = Column(Integer, nullable=False, default=0)
+
+class PainelFotosLojaHora(Base):
+    """
+    Fotos por empresa, hora local (FUSO_HORARIO_RELATORIOS, sem fuso), loja e
+    cidade, mantido incrementalmente como o rollup de KPIs: `create_foto_registro`,
+    `atualizar_extracao` e `marcar_duplicatas` somam/subtraem na mesma transação
+    (ver `crud.agregados.somar_painel`). Os painéis de lojas, cidades e
+    horários leem daqui. Quase-duplicatas não contam; loja/cidade não
+    identificadas ficam como '' (fazem parte da chave).
+    `ultima_foto` não recua quando uma foto sai do bucket.
+    """
+    __tablename__ = "painel_fotos_loja_hora"
+
+    empresa_id = Column(Integer, ForeignKey("empresas.id"), primary_key=True)
+    hora = Column(DateTime, primary_key=True)
+    loja = Column(String, primary_key=True)
+    cidade = Column(String, primary_key=True)
+    total_fotos = Column(Integer, nullable=False, default=0)
+    ultima_foto = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        CheckConstraint("total_fotos >= 0", name="ck_painel_total_nao_negativo"),
+        # Cobertura: última hora com foto de cada loja sem varrer todas as horas da empresa
+        Index("ix_painel_loja_hora_loja", empresa_id, loja, cidade, hora.desc()),
+    )
+
+class CacheRespostaIA(Base):
+    """Backend compartilhado (entre workers) do cache de respostas do /insights/ask."""
+    __tablename__ = "cache_respostas_ia"
+
+    chave = Column(String(64), primary_key=True) # sha256 de (empresa, versão dos dados, pergunta)
+    empresa_id = Column(Integer, ForeignKey("empresas.id"), nullable=False, index=True)
+    resposta = Column(Text, nullable=False)
+    expira_em = Column(DateTime(timezone=True), nullable=False)
+    ultimo_acesso = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
@@ -0,0 +1,168 @@
+# backend/app/db/particoes.py
+#
+# Partições mensais (RANGE em data_envio, meses em UTC) de fotos_promotores.
+# Com a data no WHERE, o Postgres só lê as partições do intervalo (partition
+# pruning): listagem, KPIs e busca de duplicatas não crescem com o histórico.
+
+import logging
+import re
+from datetime import date, timezone
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db import models
+
+logger = logging.getLogger(__name__)
+
+TABELA = models.FotoPromotor.__tablename__
+PARTICAO_PADRAO = f"{TABELA}_padrao"
+_PADRAO_NOME = re.compile(rf"^{TABELA}_p(\d{{4}})_(\d{{2}})$")
+
+
+def inicio_do_mes(dia: date) -> date:
+    return dia.replace(day=1)
+
+
+def somar_meses(mes: date, quantidade: int) -> date:
+    indice = mes.year * 12 + mes.month - 1 + quantidade
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def nome_particao(mes: date) -> str:
+    """Ex.: 2024-05-01 -> 'fotos_promotores_p2024_05'."""
+    return f"{TABELA}_p{mes.year:04d}_{mes.month:02d}"
+
+
+def tabela_particionada(conexao) -> bool:
+    return bool(conexao.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :tabela"
+    ), {"tabela": TABELA}).scalar())
+
+
+def listar_particoes(conexao) -> list[tuple[str, date]]:
+    """Partições mensais anexadas (nome, primeiro dia do mês), da mais antiga para a mais nova."""
+    nomes = conexao.execute(text(
+        "SELECT filha.relname FROM pg_inherits i "
+        "JOIN pg_class pai ON pai.oid = i.inhparent "
+        "JOIN pg_class filha ON filha.oid = i.inhrelid "
+        "WHERE pai.relname = :tabela"
+    ), {"tabela": TABELA}).scalars()
+    particoes = []
+    for nome in nomes:
+        casou = _PADRAO_NOME.match(nome)
+        if casou:
+            particoes.append((nome, date(int(casou.group(1)), int(casou.group(2)), 1)))
+    return sorted(particoes, key=lambda p: p[1])
+
+
+def _existe_tabela(conexao, nome: str) -> bool:
+    return conexao.execute(text("SELECT to_regclass(:nome)"), {"nome": nome}).scalar() is not None
+
+
+def _colunas_copiaveis() -> str:
+    # Colunas geradas (se houver) são recalculadas pelo Postgres na cópia; busca_tsv, pelo trigger
+    return ", ".join(c.name for c in models.FotoPromotor.__table__.columns if c.computed is None)
+
+
+def criar_particao(conexao, mes: date) -> str:
+    """
+    Cria (se não existir) a partição do mês de `mes`. Se a partição DEFAULT já
+    recebeu fotos desse mês (ninguém rodou `garantir-particoes` a tempo), o
+    CREATE falharia: as fotos são movidas para a partição nova, com a DEFAULT
+    desanexada durante a operação (trava a tabela, mas só nesse caso).
+    """
+    inicio = inicio_do_mes(mes)
+    nome = nome_particao(inicio)
+    de, ate = f"{inicio.isoformat()} 00:00:00+00", f"{somar_meses(inicio, 1).isoformat()} 00:00:00+00"
+    limites = f"FOR VALUES FROM ('{de}') TO ('{ate}')"
+    if _existe_tabela(conexao, nome):
+        return nome
+
+    faixa = f"data_envio >= '{de}' AND data_envio < '{ate}'"
+    na_padrao = _existe_tabela(conexao, PARTICAO_PADRAO) and conexao.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {PARTICAO_PADRAO} WHERE {faixa})"
+    )).scalar()
+    if not na_padrao:
+        conexao.execute(text(f"CREATE TABLE IF NOT EXISTS {nome} PARTITION OF {TABELA} {limites}"))
+        return nome
+
+    colunas = _colunas_copiaveis()
+    conexao.execute(text(f"ALTER TABLE {TABELA} DETACH PARTITION {PARTICAO_PADRAO}"))
+    conexao.execute(text(f"CREATE TABLE {nome} PARTITION OF {TABELA} {limites}"))
+    movidas = conexao.execute(text(
+        f"WITH movidas AS (DELETE FROM {PARTICAO_PADRAO} WHERE {faixa} RETURNING {colunas}) "
+        f"INSERT INTO {TABELA} ({colunas}) SELECT {colunas} FROM movidas"
+    )).rowcount
+    conexao.execute(text(f"ALTER TABLE {TABELA} ATTACH PARTITION {PARTICAO_PADRAO} DEFAULT"))
+    logger.warning(f"{nome}: {movidas} foto(s) movida(s) da partição DEFAULT.")
+    return nome
+
+
+def garantir_particoes(conexao, desde: date | None = None, meses_a_frente: int | None = None) -> list[str]:
+    """
+    Garante as partições de `desde` (padrão: mês atual) até PARTICOES_MESES_A_FRENTE
+    meses à frente, mais a partição DEFAULT (rede de segurança para datas fora
+    de qualquer mês criado; o que cair nela vai para a partição do mês quando
+    ela for criada). Idempotente: rodar no prestart e num cron diário.
+    Retorna os nomes das partições mensais garantidas.
+    """
+    if meses_a_frente is None:
+        meses_a_frente = settings.PARTICOES_MESES_A_FRENTE
+    atual = inicio_do_mes(date.today())
+    mes = inicio_do_mes(desde or atual)
+    ultimo = somar_meses(atual, meses_a_frente)
+    nomes = []
+    while mes <= ultimo:
+        nomes.append(criar_particao(conexao, mes))
+        mes = somar_meses(mes, 1)
+    conexao.execute(text(f"CREATE TABLE IF NOT EXISTS {PARTICAO_PADRAO} PARTITION OF {TABELA} DEFAULT"))
+    return nomes
+
+
+def _renomear_legado(conexao, legado: str) -> None:
+    # Índices e a sequence mantêm o nome depois do RENAME da tabela e colidiriam com os da tabela nova
+    for (indice,) in conexao.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :t"), {"t": legado}):
+        conexao.execute(text(f'ALTER INDEX "{indice}" RENAME TO "{indice[:55]}_legado"'))
+    sequence = conexao.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": legado}).scalar()
+    if sequence:
+        conexao.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO {TABELA}_id_seq_legado"))
+
+
+def particionar_tabela_existente(conexao) -> int:
+    """
+    Converte uma fotos_promotores comum (de antes do particionamento) na
+    tabela particionada, copiando as fotos. Roda numa única transação, com a
+    tabela travada: faça numa janela de manutenção. Retorna as fotos copiadas
+    (0 se a tabela já é particionada).
+    """
+    if tabela_particionada(conexao):
+        return 0
+    legado = f"{TABELA}_legado"
+    conexao.execute(text(f"LOCK TABLE {TABELA} IN ACCESS EXCLUSIVE MODE"))
+    conexao.execute(text(f"ALTER TABLE {TABELA} RENAME TO {legado}"))
+    _renomear_legado(conexao, legado)
+
+    models.FotoPromotor.__table__.create(conexao)
+    mais_antiga = conexao.execute(text(f"SELECT min(data_envio) FROM {legado}")).scalar()
+    garantir_particoes(conexao, desde=mais_antiga.astimezone(timezone.utc).date() if mais_antiga else None)
+
+    # busca_tsv é recalculada pelo trigger na cópia. Colunas que a tabela
+    # antiga ainda não tinha ficam com o default.
+    existentes = set(conexao.execute(text(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = :t"
+    ), {"t": legado}).scalars())
+    colunas = ", ".join(
+        c.name for c in models.FotoPromotor.__table__.columns
+        if c.computed is None and c.name != "data_envio" and c.name in existentes
+    )
+    copiadas = conexao.execute(text(
+        f"INSERT INTO {TABELA} ({colunas}, data_envio) "
+        f"SELECT {colunas}, coalesce(data_envio, now()) FROM {legado}"
+    )).rowcount
+    conexao.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{TABELA}', 'id'), coalesce((SELECT max(id) FROM {TABELA}), 0) + 1, false)"
+    ))
+    conexao.execute(text(f"DROP TABLE {legado}"))
+    logger.info(f"{TABELA}: {copiadas} foto(s) copiada(s) para a tabela particionada.")
+    return copiadas
@@ -2,15 +2,16 @@ from datetime import datetime, timedelta, timezone
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Importa dos novos módulos de core
 from app.core.config import settings
+from app.core import cache_usuarios
 
 # Importa dos outros módulos da aplicação
 from app.db import models
-from app.db.connection import get_db
-from app.crud import usuario as crud_usuario
+from app.db.connection import get_async_db
+from app.crud.aio import usuario as crud_usuario
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/token")
@@ -23,10 +24,14 @@ def create_access_token(data: dict) -> str:
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.Usuario:
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> models.Usuario:
     """
     Decodifica o token JWT e retorna o usuário do banco de dados correspondente.
     Esta é a dependência principal para proteger rotas.
+
+    O usuário retornado está desanexado de qualquer sessão (é o mesmo objeto
+    do cache): use só as colunas dele. Para alterá-lo ou ler relacionamentos,
+    busque-o de novo na sessão do request.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -41,7 +46,16 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
     
-    user = crud_usuario.get_user_by_email(db, email=email)
+    # Cache hit: nenhuma query
+    cached_user = cache_usuarios.obter(email)
+    if cached_user is not None:
+        return cached_user
+
+    user = await crud_usuario.get_user_by_email(db, email=email)
     if user is None:
         raise credentials_exception
+
+    # Guarda a instância carregada, desanexada da sessão deste request
+    db.expunge(user)
+    cache_usuarios.guardar(email, user)
     return user
\ No newline at end of file
@@ -1,14 +1,58 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 # Nossos routers
-from app.routers import auth, empresas, insights, contratos as contratos_router, webhook_whatsapp, fotos
-from fastapi.staticfiles import StaticFiles
+from app.routers import auth, empresas, insights, contratos as contratos_router, webhook_whatsapp, fotos, midia
+from app.core.hashing import metricas_hashing, encerrar_pool_hashing
+from app.db.connection import metricas_pool, aquecer_pool_async, fechar_engines
+from app.core.config import settings
+from app.core.uploads import LimiteDeCorpo, FOLGA_MULTIPART
+from app.services import ai_service
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Roda em cada worker (depois do fork, com o gunicorn): aquece o pool do
+    banco e os clientes compartilhados antes do primeiro request e, no
+    desligamento, drena a ingestão embutida e fecha tudo.
+    """
+    conexoes = await aquecer_pool_async()
+    logger.info(f"Startup: {conexoes} conexão(ões) do pool abertas.")
+    # O SDK do Gemini é pesado de importar: carrega em segundo plano, sem atrasar o startup
+    aquecimento_ia = asyncio.create_task(asyncio.to_thread(ai_service.get_cliente_ia))
+
+    parar = asyncio.Event()
+    workers_ingestao = None
+    if settings.INGESTAO_WORKERS_NA_API > 0:
+        # Importado só aqui: httpx e Pillow ficam fora do import do app quando não há ingestão embutida
+        from app.services.ingestao_worker import executar_workers
+        from app.services.media_client import get_media_client
+        get_media_client()
+        workers_ingestao = asyncio.create_task(executar_workers(settings.INGESTAO_WORKERS_NA_API, parar))
+
+    yield
+
+    # SIGTERM: o servidor já parou de aceitar requests; termina os jobs em andamento
+    # (executar_workers também fecha o cliente de mídia)
+    if workers_ingestao is not None:
+        parar.set()
+        await workers_ingestao
+    await asyncio.gather(aquecimento_ia, return_exceptions=True)
+    encerrar_pool_hashing()
+    await fechar_engines()
+
 
 # Criação da instância principal do FastAPI
 app = FastAPI(
     title="API Mustafa",
     description="API para gestão de fotos de promotores via WhatsApp.", 
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 # Configuração do CORS (já estava correta)
 origins = [
@@ -19,6 +63,14 @@ origins = [
 ]
 
 
+# Aborta com 413 o upload que passa do limite enquanto o corpo ainda chega.
+# Adicionado antes do CORS, que fica por fora dele: o 413 também leva os
+# cabeçalhos de CORS e o frontend consegue ler o erro.
+app.add_middleware(
+    LimiteDeCorpo,
+    limites={"/contratos/upload": settings.CONTRATO_MAX_BYTES + FOLGA_MULTIPART},
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -27,8 +79,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.mount("/fotos-promotores", StaticFiles(directory="uploads/fotos_promotores"), name="fotos-promotores")
-app.mount("/arquivos-contratos", StaticFiles(directory="uploads"), name="arquivos-contratos")
+if settings.DB_CONTAR_QUERIES:
+    from app.db.contagem_queries import contar_queries
+
+    @app.middleware("http")
+    async def cabecalho_contagem_queries(request: Request, call_next):
+        """X-Query-Count: queries que o request rodou até a resposta começar a sair."""
+        with contar_queries() as contagem:
+            resposta = await call_next(request)
+        resposta.headers["X-Query-Count"] = str(contagem.total)
+        return resposta
 
 # Incluindo todas as nossas rotas de forma limpa
 # Note que no seu código, a rota de insights ainda não estava sendo incluída
@@ -38,6 +98,8 @@ app.include_router(empresas.router, prefix="/empresas", tags=["Empresas"])
 app.include_router(fotos.router, prefix="/fotos", tags=["Fotos"]) # <-- prefixo /fotos para a rota ""
 app.include_router(contratos_router.router, prefix="/contratos", tags=["Contratos"]) # <-- prefixo /contratos para a rota ""
 app.include_router(insights.router, prefix="/insights", tags=["Insights"])
+# Fotos e contratos do storage, por URL assinada (substitui os antigos StaticFiles públicos)
+app.include_router(midia.router, prefix=settings.STORAGE_URL_PREFIXO, tags=["Mídia"])
 
 # <<<< CORREÇÃO PRINCIPAL AQUI >>>>
 # Como o `webhook_whatsapp.py` JÁ TEM prefix="/webhook", nós NÃO o colocamos aqui.
@@ -48,4 +110,9 @@ async def read_root():
     """
     Endpoint principal para verificar se a API está online.
     """
-    return {"status": "ok", "message": "Bem-vindo à API da Mustafá!"}
\ No newline at end of file
+    return {"status": "ok", "message": "Bem-vindo à API da Mustafá!"}
+
+@app.get("/metricas", tags=["Root"], summary="Métricas internas do worker")
+async def read_metricas():
+    """Contadores deste processo da API (cada worker tem os seus)."""
+    return {"hashing": metricas_hashing(), "banco": metricas_pool()}
@@ -6,17 +6,16 @@ from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
-from app.db.models import Base
-from app.db.connection import engine, SessionLocal
+from app.core.config import settings
+from app.db import migracoes
+from app.db.connection import criar_engine_administrativo, SessionLocal
+from app.db.particoes import garantir_particoes, tabela_particionada
 from app.crud import empresa as crud_empresa
 from app.schemas.empresa import EmpresaCreate
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-max_tries = 60 * 5
-wait_seconds = 1
-
 def create_initial_data(db: Session):
     logger.info("Verificando dados iniciais...")
     empresa = crud_empresa.get_empresa(db, empresa_id=1)
@@ -28,33 +27,54 @@ def create_initial_data(db: Session):
     else:
         logger.info("Empresa principal já existe.")
 
+def aguardar_banco(engine, prazo_segundos: float = settings.PRESTART_PRAZO_SEGUNDOS):
+    """
+    Sonda o banco com backoff exponencial (0,1s, 0,2s, ... até 5s entre as
+    tentativas). Com o banco já no ar, o boot não espera nada.
+    """
+    limite = time.monotonic() + prazo_segundos
+    espera, tentativas = 0.1, 0
+    while True:
+        tentativas += 1
+        try:
+            with engine.connect() as conexao:
+                conexao.execute(text("SELECT 1"))
+            logger.info(f"Banco de dados disponível (tentativa {tentativas}).")
+            return
+        except (OperationalError, ConnectionRefusedError) as e:
+            if time.monotonic() + espera > limite:
+                raise RuntimeError(f"FALHA: banco de dados indisponível após {prazo_segundos:.0f}s.") from e
+            logger.info(f"Banco de dados indisponível (tentativa {tentativas}). Nova tentativa em {espera:.1f}s...")
+            time.sleep(espera)
+            espera = min(espera * 2, 5.0)
+
 def init():
+    engine = criar_engine_administrativo()
+    try:
+        aguardar_banco(engine)
+
+        # Só uma réplica migra (advisory lock); as demais esperam e seguem
+        aplicadas = migracoes.aplicar_pendentes(engine)
+        logger.info(f"Migrações aplicadas: {', '.join(aplicadas)}" if aplicadas else "Esquema já atualizado.")
+
+        with engine.begin() as conexao:
+            if tabela_particionada(conexao):
+                garantir_particoes(conexao)
+            else:
+                logger.warning(
+                    "fotos_promotores ainda não é particionada: rode `python manage.py particionar-fotos` "
+                    "numa janela de manutenção."
+                )
+    finally:
+        engine.dispose()
+
     db = SessionLocal()
     try:
-        logger.info("Aguardando o banco de dados ficar disponível...")
-        tries = 0
-        while tries < max_tries:
-            try:
-                db.execute(text("SELECT 1"))
-                logger.info("Conexão com o banco de dados bem-sucedida!")
-                
-                logger.info("Criando tabelas (se não existirem)...")
-                Base.metadata.create_all(bind=engine)
-                logger.info("Tabelas verificadas/criadas com sucesso!")
-                
-                create_initial_data(db)
-                
-                return
-            except (OperationalError, ConnectionRefusedError):
-                tries += 1
-                logger.info(f"Banco de dados indisponível. Tentativa {tries}/{max_tries}. Tentando novamente em {wait_seconds}s...")
-                time.sleep(wait_seconds)
-        
-        raise Exception("FALHA: Não foi possível conectar ao banco de dados.")
+        create_initial_data(db)
     finally:
         db.close()
 
 if __name__ == "__main__":
     logger.info("Iniciando script de pré-inicialização da API...")
     init()
-    logger.info("Script de pré-inicialização concluído. Iniciando a aplicação principal.")
\ No newline at end of file
+    logger.info("Script de pré-inicialização concluído. Iniciando a aplicação principal.")
@@ -1,16 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
 from typing import List
 
 # Importações necessárias e limpas
-from app.db.connection import get_db
+from app.db.connection import get_async_db
 from app.db import models
 from app.schemas import usuario as schemas_usuario
-from app.crud import usuario as crud_usuario
+from app.crud.aio import usuario as crud_usuario
 from app.dependencies import create_access_token, get_current_user
 from app.core.config import settings
+from app.core import hashing
 
 router = APIRouter(
    # prefix="/auth",
@@ -23,15 +24,24 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/token")
 
 
 @router.post("/token", response_model=schemas_usuario.Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    # A lógica de autenticação agora é uma única chamada de função limpa.
-    user = crud_usuario.authenticate_user(db, email=form_data.username, password=form_data.password)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    # O bcrypt roda no pool de processos de hashing e as queries são
+    # assíncronas: nada aqui trava o event loop nem ocupa o threadpool.
+    credenciais_invalidas = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="E-mail ou senha incorretos",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    user = await crud_usuario.get_user_by_email(db, form_data.username)
     if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="E-mail ou senha incorretos",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise credenciais_invalidas
+
+    senha_ok, novo_hash = await hashing.verify_password_async(form_data.password, user.hashed_password)
+    if not senha_ok:
+        raise credenciais_invalidas
+    if novo_hash:
+        # O custo do bcrypt mudou desde que a senha foi gravada: atualiza o hash
+        await crud_usuario.atualizar_hash_senha(db, user, novo_hash)
     
     access_token = create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
@@ -40,36 +50,41 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
 # A rota para criar usuário não precisa estar aqui, pode ir para um router de "empresas"
 # ou de administração, mas vamos manter por enquanto.
 @router.post("/", response_model=schemas_usuario.Usuario, status_code=status.HTTP_201_CREATED)
-def create_new_user(user: schemas_usuario.UsuarioCreate, db: Session = Depends(get_db)):
-    db_user = crud_usuario.get_user_by_email(db=db, email=user.email)
+async def create_new_user(user: schemas_usuario.UsuarioCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await crud_usuario.get_user_by_email(db, user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="E-mail já registrado."
         )
+    hashed_password = await hashing.get_password_hash_async(user.password)
     # Supondo que a empresa_id seja passada no corpo ou obtida de outra forma.
     # Se a empresa_id vier do usuário logado, essa rota precisaria de autenticação.
-    return crud_usuario.create_user(db=db, user_in=user, empresa_id=1) # Usando 1 como placeholder
+    return await crud_usuario.create_user(db, user, 1, hashed_password) # Usando 1 como placeholder
 
 
 @router.get("/me", response_model=schemas_usuario.Usuario)
-def read_users_me(current_user: models.Usuario = Depends(get_current_user)):
+async def read_users_me(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.Usuario = Depends(get_current_user)
+):
     """Retorna os dados do usuário atualmente logado."""
-    return current_user
+    # O usuário do cache só tem as colunas: a resposta (com os contratos) vem por projeção
+    return await crud_usuario.get_user_com_contratos(db, current_user.id)
 
 @router.get("", response_model=List[schemas_usuario.Usuario], summary="Lista todos os usuários da empresa")
-def read_users(
-    db: Session = Depends(get_db), 
+async def read_users(
+    db: AsyncSession = Depends(get_async_db), 
     current_user: models.Usuario = Depends(get_current_user)
 ):
     """Retorna uma lista de usuários da empresa do usuário logado."""
-    return crud_usuario.get_users_by_empresa(db, empresa_id=current_user.empresa_id)
+    return await crud_usuario.get_users_by_empresa(db, empresa_id=current_user.empresa_id)
 
 @router.put("/{user_id}", response_model=schemas_usuario.Usuario, summary="Atualiza um usuário")
-def update_user_details(
+async def update_user_details(
     user_id: int, 
     user_in: schemas_usuario.UsuarioUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.Usuario = Depends(get_current_user)
 ):
     """Atualiza as informações de um usuário. (Requer perfil de gestor/admin)"""
@@ -77,7 +92,7 @@ def update_user_details(
     # if current_user.perfil not in [PerfilUsuario.ADMIN, PerfilUsuario.GESTOR]:
     #     raise HTTPException(status_code=403, detail="Não autorizado")
 
-    db_user = crud_usuario.update_user(db, user_id=user_id, user_in=user_in)
+    db_user = await crud_usuario.update_user(db, user_id=user_id, user_in=user_in)
     if db_user is None:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     return db_user
\ No newline at end of file
@@ -1,109 +1,123 @@
 # backend/app/routers/contratos.py
 
-import os
-import uuid
 from typing import List # <<< IMPORTAR LIST
 from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Nossos módulos
 from app.db import models
-from app.db.connection import get_db
-from app.crud import contrato as crud_contrato
+from app.db.connection import get_async_db
+from app.crud.aio import contrato as crud_contrato
 from app.schemas import contrato as schemas_contrato
 from app.dependencies import get_current_user
+from app.core.config import settings
+from app.core.uploads import salvar_upload, ArquivoSalvo, TipoNaoPermitido, ArquivoMuitoGrande
+from app.crud.aio import blob as crud_blob
+from app.crud.contrato import url_acesso
+from app.services.storage import get_storage, chave_conteudo, DIRETORIO_TEMPORARIO
 
 # --- Configuração ---
 router = APIRouter()
-UPLOAD_DIRECTORY = "./uploads"
+TIPOS_PERMITIDOS = {"application/pdf", "image/jpeg", "image/png"}
+
+def url_do_contrato(contrato: models.Contrato) -> str:
+    """URL de acesso de um contrato já carregado (ver `crud.contrato.url_acesso`)."""
+    return url_acesso(
+        contrato.empresa_id, contrato.caminho_arquivo, contrato.blob_sha256, contrato.nome_arquivo_servidor
+    )
+
+async def _armazenar_e_registrar(db: AsyncSession, salvo: ArquivoSalvo, **dados) -> models.Contrato:
+    """
+    Move o arquivo para o storage (deduplicado pelo SHA-256) e registra o
+    contrato com a referência ao blob. Se o registro falhar, o arquivo que
+    esta chamada colocou no storage sai de lá (a menos que outro registro já
+    referencie o mesmo conteúdo): nenhum blob fica órfão.
+    """
+    storage = get_storage()
+    chave = chave_conteudo(salvo.sha256, salvo.extensao)
+    # Operações de disco: rodam no threadpool para não travar o event loop
+    criado = not await run_in_threadpool(storage.existe, chave)
+    await run_in_threadpool(storage.salvar_arquivo, salvo.caminho, chave)
+    try:
+        await crud_blob.adicionar_referencia(
+            db, sha256=salvo.sha256, chave=chave, content_type=salvo.content_type, tamanho=salvo.tamanho
+        )
+        return await crud_contrato.create_contrato(
+            db=db,
+            nome_servidor=salvo.nome_servidor,
+            caminho=chave,
+            sha256=salvo.sha256,
+            blob_sha256=salvo.sha256,
+            **dados
+        )
+    except Exception:
+        await db.rollback()
+        if criado and not await crud_blob.existe(db, salvo.sha256):
+            await run_in_threadpool(storage.remover, chave)
+        raise
 
 # =========================================================================
 # <<< ROTA ADICIONADA AQUI >>>
 # =========================================================================
 @router.get("", response_model=List[schemas_contrato.Contrato], summary="Lista todos os contratos da empresa")
-def read_contratos(
-    db: Session = Depends(get_db),
+async def read_contratos(
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.Usuario = Depends(get_current_user)
 ):
     """
     Retorna uma lista de todos os contratos registrados para a empresa
     do usuário autenticado. A lista é ordenada do mais recente para o mais antigo.
     """
-    # 1. Usar o CRUD para buscar os contratos do banco de dados de forma segura.
-    #    A função já filtra pela empresa do usuário logado.
-    db_contratos = crud_contrato.get_contratos_by_empresa(
-        db=db, empresa_id=current_user.empresa_id
-    )
-
-    # 2. Como nosso schema de resposta (schemas.Contrato) espera uma 'url_acesso',
-    #    e o banco armazena apenas o caminho, precisamos construir a resposta.
-    response_list = []
-    for contrato in db_contratos:
-        # Gera a URL de acesso público para cada arquivo de contrato.
-        url_acesso = f"/arquivos-contratos/{contrato.nome_arquivo_servidor}"
-        
-        # Constrói o objeto de resposta Pydantic, garantindo que ele tenha o formato correto.
-        response_contrato = schemas_contrato.Contrato(
-            id=contrato.id,
-            nome_promotor=contrato.nome_promotor,
-            cpf_promotor=contrato.cpf_promotor,
-            nome_arquivo_original=contrato.nome_arquivo_original,
-            data_upload=contrato.data_upload,
-            usuario_id=contrato.usuario_id,
-            url_acesso=url_acesso  # Adiciona a URL que criamos dinamicamente
-        )
-        response_list.append(response_contrato)
-
-    return response_list
+    # Só as colunas da resposta, com a url_acesso montada na mesma passada (uma query)
+    return await crud_contrato.get_contratos_resposta(db, empresa_id=current_user.empresa_id)
 
 # =============================================================
 # Sua rota de upload existente (não altere)
 # =============================================================
 @router.post("/upload", response_model=schemas_contrato.Contrato, summary="Upload de um novo contrato")
 async def upload_contrato_assinado(
-    # (O restante da sua função de upload permanece igual...)
     file: UploadFile = File(..., description="Arquivo do contrato (.pdf, .jpg, .png)"),
     nome_promotor: str = Form(..., description="Nome completo do promotor"),
     cpf_promotor: str = Form(..., description="CPF do promotor"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.Usuario = Depends(get_current_user)
 ):
     """
     Endpoint para um promotor fazer o upload de um contrato assinado.
     O sistema salva o arquivo, registra no banco e o associa ao usuário logado.
     """
-    # ... (toda a lógica da sua função de upload continua aqui)
-    # 1. Validação simples do tipo de arquivo (pode ser melhorada)
-    if file.content_type not in ["application/pdf", "image/jpeg", "image/png"]:
-        raise HTTPException(status_code=400, detail="Formato de arquivo inválido. Apenas PDF, JPG ou PNG são permitidos.")
-
-    # 2. Criar um nome de arquivo único e seguro para evitar sobreposições
-    extensao = file.filename.split('.')[-1]
-    nome_arquivo_servidor = f"{uuid.uuid4()}.{extensao}"
-    caminho_completo = os.path.join(UPLOAD_DIRECTORY, nome_arquivo_servidor)
-
-    # 3. Salvar o arquivo no disco (operação de I/O, por isso o 'async')
+    # 1. O corpo inteiro já foi limitado pelo LimiteDeCorpo (main.py) antes do
+    #    parse do multipart; aqui vale o limite exato do arquivo.
+    # 2. Copiar para o disco em chunks (sem bloquear o event loop), validando o
+    #    tipo pelos magic bytes, o limite de tamanho e calculando o SHA-256.
     try:
-        with open(caminho_completo, "wb") as buffer:
-            conteudo = await file.read() # Ler o arquivo
-            buffer.write(conteudo)
-    except Exception as e:
+        salvo = await salvar_upload(
+            file,
+            diretorio=DIRETORIO_TEMPORARIO,
+            max_bytes=settings.CONTRATO_MAX_BYTES,
+            tipos_permitidos=TIPOS_PERMITIDOS,
+        )
+    except TipoNaoPermitido:
+        raise HTTPException(status_code=400, detail="Formato de arquivo inválido. Apenas PDF, JPG ou PNG são permitidos.")
+    except ArquivoMuitoGrande as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except OSError as e:
         raise HTTPException(status_code=500, detail=f"Não foi possível salvar o arquivo: {e}")
 
-    # 4. Registrar as informações no banco de dados usando nosso CRUD
-    db_contrato = crud_contrato.create_contrato(
-        db=db,
+    # 3. Guardar no storage e registrar as informações no banco de dados
+    db_contrato = await _armazenar_e_registrar(
+        db,
+        salvo,
         nome_promotor=nome_promotor,
         cpf_promotor=cpf_promotor,
         nome_original=file.filename,
-        nome_servidor=nome_arquivo_servidor,
-        caminho=caminho_completo,
         usuario_id=current_user.id,
         empresa_id=current_user.empresa_id
     )
 
-    # 5. Criar a URL de acesso dinamicamente para o retorno da API
-    url_acesso = f"/arquivos-contratos/{nome_arquivo_servidor}"
+    # 4. Criar a URL de acesso dinamicamente para o retorno da API
+    url_acesso = url_do_contrato(db_contrato)
     
     # Montar o objeto de resposta final
     response_data = schemas_contrato.Contrato(
@@ -116,4 +130,4 @@ async def upload_contrato_assinado(
         url_acesso=url_acesso # Adicionando a URL acessível
     )
 
-    return response_data
\ No newline at end of file
+    return response_data
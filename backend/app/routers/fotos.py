@@ -1,31 +1,123 @@
 # backend/app/routers/fotos.py
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Literal, Optional
+from datetime import date, datetime
 from app.db import models
-from app.db.connection import get_db
-from app.crud import foto_promotor as crud_foto
+from app.db.connection import get_async_db
+from app.crud.aio import foto_promotor as crud_foto
+from app.crud import foto_promotor as crud_foto_sql
+from app.services import exportacao
 from app.schemas import foto_promotor as schemas_foto
 from app.dependencies import get_current_user
+from app.core.paginacao import codificar_cursor, decodificar_cursor
 
 router = APIRouter()
 
-@router.get("", response_model=List[schemas_foto.FotoPromotor])
-def read_fotos_empresa(
-    db: Session = Depends(get_db), 
+@router.get("", response_model=schemas_foto.PaginaFotos)
+async def read_fotos_empresa(
+    db: AsyncSession = Depends(get_async_db), 
     current_user: models.Usuario = Depends(get_current_user),
     # Parâmetros de filtro
     promotor_id: Optional[int] = None,
     data_inicio: Optional[date] = None,
     data_fim: Optional[date] = None,
-    busca: Optional[str] = None
+    busca: Optional[str] = None,
+    ocultar_duplicatas: bool = Query(False, description="Esconde as fotos marcadas como quase-duplicatas"),
+    loja: Optional[str] = Query(None, description="Loja extraída da legenda (nome exato)"),
+    cidade: Optional[str] = Query(None, description="Cidade extraída da legenda (nome exato)"),
+    ordem: Literal["recentes", "relevancia"] = Query(
+        "recentes", description="'relevancia' ordena pela busca textual (exige `busca`)"
+    ),
+    # Paginação por cursor
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="Valor de `next_cursor` da página anterior")
 ):
-    return crud_foto.get_fotos_by_empresa(
+    por_relevancia = ordem == "relevancia" and bool(busca)
+
+    apos = None
+    if cursor:
+        try:
+            apos = decodificar_cursor(cursor, 2)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Cursor inválido.")
+        # O cursor da ordenação por relevância guarda o rank; o da cronológica, a data
+        tipo_esperado = (int, float) if por_relevancia else datetime
+        if not isinstance(apos[0], tipo_esperado) or not isinstance(apos[1], int):
+            raise HTTPException(status_code=400, detail="Cursor inválido.")
+
+    # Busca um item a mais só para saber se existe próxima página
+    if por_relevancia:
+        resultados = await crud_foto.buscar_fotos_por_relevancia(
+            db,
+            empresa_id=current_user.empresa_id,
+            busca=busca,
+            promotor_id=promotor_id,
+            data_inicio=data_inicio,
+            data_fim=data_fim,
+            limite=limit + 1,
+            apos=apos,
+            ocultar_duplicatas=ocultar_duplicatas,
+            loja=loja,
+            cidade=cidade
+        )
+        next_cursor = None
+        if len(resultados) > limit:
+            resultados = resultados[:limit]
+            ultima_foto, ultimo_rank = resultados[-1]
+            next_cursor = codificar_cursor(ultimo_rank, ultima_foto.id)
+        return {"items": [foto for foto, _ in resultados], "next_cursor": next_cursor}
+
+    fotos = await crud_foto.get_fotos_by_empresa(
         db, 
         empresa_id=current_user.empresa_id,
         promotor_id=promotor_id,
         data_inicio=data_inicio,
         data_fim=data_fim,
-        busca=busca
-    )
\ No newline at end of file
+        busca=busca,
+        limite=limit + 1,
+        apos=apos,
+        ocultar_duplicatas=ocultar_duplicatas,
+        loja=loja,
+        cidade=cidade
+    )
+
+    next_cursor = None
+    if len(fotos) > limit:
+        fotos = fotos[:limit]
+        next_cursor = codificar_cursor(fotos[-1].data_envio, fotos[-1].id)
+
+    return {"items": fotos, "next_cursor": next_cursor}
+
+
+@router.get("/export", summary="Exporta as fotos filtradas em CSV ou XLSX")
+async def exportar_fotos(
+    current_user: models.Usuario = Depends(get_current_user),
+    # Mesmos filtros da listagem
+    promotor_id: Optional[int] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    busca: Optional[str] = None,
+    ocultar_duplicatas: bool = Query(False, description="Esconde as fotos marcadas como quase-duplicatas"),
+    loja: Optional[str] = Query(None, description="Loja extraída da legenda (nome exato)"),
+    cidade: Optional[str] = Query(None, description="Cidade extraída da legenda (nome exato)"),
+    formato: Literal["csv", "xlsx"] = "csv"
+):
+    """
+    Exporta todas as fotos que a listagem retornaria com os mesmos filtros.
+    O arquivo é gerado lote a lote num temporário (o XLSX em modo write-only)
+    e enviado em streaming: a memória usada não cresce com o número de fotos.
+    """
+    stmt = crud_foto_sql.select_exportacao_fotos(
+        empresa_id=current_user.empresa_id,
+        promotor_id=promotor_id,
+        data_inicio=data_inicio,
+        data_fim=data_fim,
+        busca=busca,
+        ocultar_duplicatas=ocultar_duplicatas,
+        loja=loja,
+        cidade=cidade
+    )
+    return await exportacao.responder(
+        stmt, exportacao.COLUNAS_FOTOS, exportacao.formatador_fotos(current_user.empresa_id), formato, "fotos"
+    )
@@ -1,14 +1,21 @@
-from fastapi import APIRouter, Depends
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-import json
-from app.db.connection import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.connection import get_async_db, AsyncSessionLocal
+from app.core.config import settings
 from app.dependencies import get_current_user
-from app.services import ai_service
+from app.services import ai_service, contexto_ia, cache_ia
 from app.db import models
 from app.crud import foto_promotor as crud_foto
-from pydantic import BaseModel
-from typing import List
+from app.crud.aio import foto_promotor as crud_foto_aio
+from app.services import exportacao
+from app.crud.aio import agregados as crud_agregados
+from typing import List, Literal, Optional
+from datetime import date, datetime, timedelta
 
 
 class RankingItem(BaseModel):
@@ -21,51 +28,195 @@ class KPISchema(BaseModel):
     fotos_mes: int
     ranking_promotores: List[RankingItem]
 
+class CoberturaLoja(BaseModel):
+    loja: str
+    cidade: str
+    fotos_hoje: int
+    ultima_foto: Optional[datetime]
+    dias_sem_foto: Optional[int]
+    apagada: bool
+
+class CoberturaSchema(BaseModel):
+    data: date
+    total_lojas: int
+    lojas_com_foto_hoje: int
+    lojas_apagadas: int
+    lojas: List[CoberturaLoja]
+
+class CidadeItem(BaseModel):
+    cidade: Optional[str] # None = fotos sem cidade identificada
+    total_fotos: int
+    lojas: int
+    ultima_foto: Optional[datetime]
+
+class HeatmapSchema(BaseModel):
+    desde: date
+    matriz: List[List[int]] # 7 linhas (segunda a domingo) x 24 horas locais
+
 router = APIRouter(tags=["Insights e KPIs"])
 
 
 @router.get("/kpis", response_model=KPISchema)
-def get_kpis(
-    db: Session = Depends(get_db),
+async def get_kpis(
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.Usuario = Depends(get_current_user)
 ):
     """Retorna os KPIs para o dashboard principal."""
-    return crud_foto.get_dashboard_kpis(db, empresa_id=current_user.empresa_id)
+    return await crud_foto_aio.get_dashboard_kpis(db, empresa_id=current_user.empresa_id)
+
+# Painéis servidos por painel_fotos_loja_hora (atualizado junto com cada foto):
+# leem poucas linhas já agregadas, nunca as fotos.
+
+@router.get("/lojas/cobertura", response_model=CoberturaSchema)
+async def get_cobertura_lojas(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.Usuario = Depends(get_current_user),
+    dias_sem_foto: int = Query(3, ge=1, description="A partir de quantos dias sem foto a loja conta como apagada")
+):
+    """Lojas cadastradas com as fotos de hoje e há quantos dias não recebem foto (as apagadas primeiro)."""
+    return await crud_agregados.get_cobertura_lojas(db, current_user.empresa_id, dias_sem_foto)
+
+@router.get("/cidades", response_model=List[CidadeItem])
+async def get_cidades(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.Usuario = Depends(get_current_user),
+    data_inicio: Optional[date] = Query(None, description="Padrão: 30 dias atrás"),
+    data_fim: Optional[date] = Query(None, description="Padrão: hoje")
+):
+    """Fotos e lojas com foto por cidade no período (dias no fuso dos relatórios)."""
+    data_fim = data_fim or crud_agregados.hoje_local()
+    data_inicio = data_inicio or data_fim - timedelta(days=30)
+    if data_inicio > data_fim:
+        raise HTTPException(status_code=400, detail="data_inicio deve ser anterior a data_fim.")
+    return await crud_agregados.get_cidades(db, current_user.empresa_id, data_inicio, data_fim)
+
+@router.get("/heatmap", response_model=HeatmapSchema)
+async def get_heatmap(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.Usuario = Depends(get_current_user),
+    dias: int = Query(30, ge=1, le=365, description="Janela, em dias, até hoje"),
+    loja: Optional[str] = None,
+    cidade: Optional[str] = None
+):
+    """Fotos por dia da semana e hora local (mapa de calor), da empresa ou de uma loja/cidade."""
+    desde = crud_agregados.hoje_local() - timedelta(days=dias - 1)
+    return await crud_agregados.get_heatmap(db, current_user.empresa_id, desde, loja, cidade)
+
+@router.get("/export", summary="Exporta o rollup diário de fotos por promotor em CSV ou XLSX")
+async def exportar_kpis(
+    current_user: models.Usuario = Depends(get_current_user),
+    promotor_id: Optional[int] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    formato: Literal["csv", "xlsx"] = "csv"
+):
+    """Uma linha por dia e promotor (quase-duplicatas não contam), do dia mais recente ao mais antigo."""
+    stmt = crud_foto.select_exportacao_kpis(
+        empresa_id=current_user.empresa_id,
+        promotor_id=promotor_id,
+        data_inicio=data_inicio,
+        data_fim=data_fim
+    )
+    return await exportacao.responder(stmt, exportacao.COLUNAS_KPIS, exportacao.formatar_kpi, formato, "kpis")
 
 class QuestionRequest(BaseModel):
      question: str
 
+def _preparar_pergunta(db: Session, empresa_id: int, question: str) -> tuple[str, str | None, str | None]:
+     """
+     Parte de banco do /ask: retorna a chave do cache, a resposta em cache
+     (se houver) e, se não houver, os dados de contexto para a IA.
+
+     Escrita para Session síncrona (o contexto e o cache são compartilhados
+     com o CLI); as rotas a executam com `AsyncSession.run_sync`, que roda as
+     mesmas queries pela conexão assíncrona, sem ocupar o threadpool.
+     """
+     cache = cache_ia.get_cache_ia()
+     versao = crud_foto.get_versao_dados(db, empresa_id=empresa_id)
+     chave = cache_ia.montar_chave(empresa_id, question, versao)
+     answer = cache.obter(db, chave)
+     if answer is not None:
+         return chave, answer, None
+     # Montar um resumo compacto e limitado dos dados para dar contexto à IA
+     return chave, None, contexto_ia.montar_contexto_ia(db, empresa_id=empresa_id)
+
+async def _guardar_no_cache(chave: str, empresa_id: int, answer: str):
+     # Sessão própria: na resposta em streaming a sessão do request já foi encerrada
+     async with AsyncSessionLocal() as db:
+         await db.run_sync(cache_ia.get_cache_ia().guardar, chave, empresa_id, answer)
+
+def _evento_sse(evento: str, dados: dict) -> str:
+     return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
 @router.post("/ask")
-def ask_ai_question(
+async def ask_ai_question(
      request: QuestionRequest,
-     db: Session = Depends(get_db),
-     current_user: models.Usuario = Depends(get_current_user)
+     db: AsyncSession = Depends(get_async_db),
+     current_user: models.Usuario = Depends(get_current_user),
+     cliente: ai_service.ClienteGemini = Depends(ai_service.get_cliente_ia)
  ):
-     # 1. Coletar os dados das fotos para dar contexto à IA
-     fotos = crud_foto.get_fotos_by_empresa(db=db, empresa_id=current_user.empresa_id)
-     
-     # 2. Formatar os dados em um JSON legível
-     data_for_ai = {
-         "registros_fotos": [
-             {
-                 "id_foto": f.id,
-                 "id_promotor": f.promotor_id,
-                 "nome_promotor": f.promotor.nome,
-                 "data_envio": f.data_envio.isoformat(),
-                 "legenda_original": f.legenda,
-                 "loja_identificada": f.loja, # Adicionar lógica para extrair isso
-                 "cidade_identificada": f.cidade # da legenda se necessário
-             } 
-             for f in fotos
-         ]
-     }
-     system_data_json = json.dumps(data_for_ai, default=str, indent=2)
-
-     # 3. Chamar o serviço de IA com a pergunta do usuário e os dados coletados
-     answer = ai_service.generate_analysis_from_data(
-         user_question=request.question,
-         system_data=system_data_json
-     )
-     
+     empresa_id = current_user.empresa_id
+
+     # 1. Mesma pergunta sobre os mesmos dados? Responde do cache, sem chamar a IA.
+     chave, answer, system_data_json = await db.run_sync(_preparar_pergunta, empresa_id, request.question)
+     if answer is not None:
+         return {"answer": answer, "question": request.question}
+
+     # 2. Chamar o serviço de IA com a pergunta do usuário e os dados coletados.
+     #    Só respostas bem-sucedidas vão para o cache.
+     try:
+         answer = await cliente.gerar_async(ai_service.montar_prompt(request.question, system_data_json))
+     except ai_service.ErroIA as e:
+         return {"answer": str(e), "question": request.question}
+
+     await db.run_sync(cache_ia.get_cache_ia().guardar, chave, empresa_id, answer)
      return {"answer": answer, "question": request.question}
-     
\ No newline at end of file
+
+@router.post("/ask/stream", summary="Pergunta à IA com resposta em streaming (Server-Sent Events)")
+async def ask_ai_question_stream(
+     request: QuestionRequest,
+     http_request: Request,
+     db: AsyncSession = Depends(get_async_db),
+     current_user: models.Usuario = Depends(get_current_user),
+     cliente: ai_service.ClienteGemini = Depends(ai_service.get_cliente_ia)
+ ):
+     """
+     Igual ao /ask, mas envia a resposta em pedaços à medida que a IA gera.
+
+     Eventos: `token` ({"texto": ...}) a cada pedaço, depois `fim` ou `erro`
+     ({"detail": ...}). A geração é interrompida se o cliente desconectar ou
+     se passar de IA_STREAM_TIMEOUT_SEGUNDOS, sem ocupar o threadpool em nenhum momento.
+     """
+     empresa_id = current_user.empresa_id
+     chave, answer, system_data_json = await db.run_sync(_preparar_pergunta, empresa_id, request.question)
+
+     async def eventos():
+         if answer is not None:
+             yield _evento_sse("token", {"texto": answer})
+             yield _evento_sse("fim", {"cache": True})
+             return
+
+         prompt = ai_service.montar_prompt(request.question, system_data_json)
+         partes = []
+         try:
+             async with asyncio.timeout(settings.IA_STREAM_TIMEOUT_SEGUNDOS):
+                 async for texto in cliente.gerar_stream(prompt):
+                     if await http_request.is_disconnected():
+                         return # Cliente foi embora: para de gerar (e de pagar por tokens)
+                     partes.append(texto)
+                     yield _evento_sse("token", {"texto": texto})
+         except TimeoutError:
+             yield _evento_sse("erro", {"detail": "A IA demorou demais para responder. Tente novamente."})
+             return
+         except ai_service.ErroIA as e:
+             yield _evento_sse("erro", {"detail": str(e)})
+             return
+
+         await _guardar_no_cache(chave, empresa_id, "".join(partes))
+         yield _evento_sse("fim", {"cache": False})
+
+     return StreamingResponse(
+         eventos(),
+         media_type="text/event-stream",
+         headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+     )
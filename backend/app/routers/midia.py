@@ -0,0 +1,137 @@
+# backend/app/routers/midia.py
+import mimetypes
+import os
+import re
+import time
+from email.utils import formatdate
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+from app.core.midia import caminho_legado, verificar_assinatura
+from app.services.storage import get_storage
+
+router = APIRouter()
+
+CHUNK_BYTES = 64 * 1024
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _etag(caminho: str, tamanho: int) -> str:
+    # Forte: o nome do arquivo é o SHA-256 do conteúdo (ou derivado dele), que nunca muda
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    return f'"{nome}-{tamanho:x}"'
+
+
+def _intervalo(cabecalho: str | None, tamanho: int) -> tuple[int, int] | None:
+    """
+    Interpreta um Range de intervalo único ("bytes=a-b", "a-" ou "-n").
+    Retorna (inicio, fim) inclusivo, None para servir o arquivo inteiro
+    (sem Range ou com múltiplos intervalos) ou lança 416 se não for satisfazível.
+    """
+    if not cabecalho:
+        return None
+    encontrado = _RANGE.match(cabecalho.strip())
+    if not encontrado:
+        return None
+    inicio, fim = encontrado.groups()
+    if not inicio and not fim:
+        return None
+    if not inicio:
+        # Sufixo: os últimos `fim` bytes
+        inicio, fim = max(tamanho - int(fim), 0), tamanho - 1
+    else:
+        inicio, fim = int(inicio), min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or inicio > fim:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{tamanho}"},
+        )
+    return inicio, fim
+
+
+def _ler(caminho: str, inicio: int, quantidade: int):
+    with open(caminho, "rb") as arquivo:
+        arquivo.seek(inicio)
+        while quantidade > 0:
+            bloco = arquivo.read(min(CHUNK_BYTES, quantidade))
+            if not bloco:
+                break
+            quantidade -= len(bloco)
+            yield bloco
+
+
+@router.get("/{chave:path}", summary="Entrega uma foto ou contrato do storage (URL assinada)")
+def servir_midia(
+    chave: str,
+    request: Request,
+    e: int = Query(..., description="Empresa para a qual a URL foi assinada"),
+    exp: int = Query(..., description="Expiração da assinatura (epoch)"),
+    sig: str = Query(...),
+):
+    """
+    Serve um arquivo do storage endereçado por conteúdo (ou, sob `legado/`,
+    um arquivo ainda não migrado por `manage.py migrar-storage`). As URLs saem
+    assinadas da própria API (ver `app.core.midia.assinar_url`) só para a
+    empresa dona do registro, então não há consulta ao banco aqui.
+
+    Como o conteúdo de uma chave nunca muda, a resposta é `immutable` até a
+    assinatura expirar e tem ETag forte; responde 304 a GETs condicionais e
+    206 a pedidos de intervalo. Com MIDIA_ENTREGA 'nginx'/'sendfile', a
+    API só autoriza e o servidor web entrega os bytes.
+    """
+    if not verificar_assinatura(chave, e, exp, sig):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Link de mídia inválido ou expirado.")
+    if chave.startswith("tmp/") or chave.endswith(".part"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Arquivo não encontrado.")
+
+    try:
+        legado = caminho_legado(chave)
+        caminho = legado or get_storage().caminho_local(chave)
+        estado = os.stat(caminho)
+    except (ValueError, FileNotFoundError):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Arquivo não encontrado.")
+
+    tamanho = estado.st_size
+    etag = _etag(caminho, tamanho)
+    cabecalhos = {
+        "ETag": etag,
+        "Last-Modified": formatdate(estado.st_mtime, usegmt=True),
+        # private: é conteúdo de uma empresa; immutable: a chave nunca muda de conteúdo
+        "Cache-Control": f"private, max-age={max(exp - int(time.time()), 0)}, immutable",
+        "Accept-Ranges": "bytes",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [v.strip() for v in if_none_match.split(",")]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cabecalhos)
+
+    content_type = mimetypes.guess_type(caminho)[0] or "application/octet-stream"
+
+    # Arquivos legados ficam fora do STORAGE_DIR (e da location do nginx): a API entrega
+    if settings.MIDIA_ENTREGA == "nginx" and legado is None:
+        # O nginx trata Range e condicionais; mantém os nossos cabeçalhos de cache
+        cabecalhos["X-Accel-Redirect"] = f"{settings.MIDIA_ACCEL_PREFIXO}/{chave}"
+        return Response(headers=cabecalhos, media_type=content_type)
+    if settings.MIDIA_ENTREGA == "sendfile":
+        cabecalhos["X-Sendfile"] = os.path.abspath(caminho)
+        return Response(headers=cabecalhos, media_type=content_type)
+
+    # If-Range com outro ETag: o arquivo mudou desde o pedaço que o cliente tem, manda inteiro
+    if_range = request.headers.get("if-range")
+    intervalo = None if if_range and if_range.strip() != etag else _intervalo(request.headers.get("range"), tamanho)
+
+    if intervalo is None:
+        cabecalhos["Content-Length"] = str(tamanho)
+        return StreamingResponse(_ler(caminho, 0, tamanho), media_type=content_type, headers=cabecalhos)
+
+    inicio, fim = intervalo
+    cabecalhos["Content-Range"] = f"bytes {inicio}-{fim}/{tamanho}"
+    cabecalhos["Content-Length"] = str(fim - inicio + 1)
+    return StreamingResponse(
+        _ler(caminho, inicio, fim - inicio + 1),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=content_type,
+        headers=cabecalhos,
+    )
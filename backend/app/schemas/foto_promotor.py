@@ -1,5 +1,6 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, field_serializer
 from datetime import datetime
+from app.core.midia import assinar_url
 
 class FotoPromotorBase(BaseModel):
     url_foto: str
@@ -12,5 +13,18 @@ class FotoPromotor(FotoPromotorBase):
     promotor_id: int
     empresa_id: int
     data_envio: datetime
+    url_miniatura: str | None = None
+    url_preview: str | None = None
+    url_grande: str | None = None
+    duplicata_de_id: int | None = None # Preenchido quando a foto é quase-duplicata de outra do mesmo dia
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+    @field_serializer("url_foto", "url_miniatura", "url_preview", "url_grande")
+    def _assinar(self, url: str | None) -> str | None:
+        # O banco guarda a URL "crua" do storage; a API entrega a assinada para a empresa da foto
+        return assinar_url(url, self.empresa_id)
+
+class PaginaFotos(BaseModel):
+    items: list[FotoPromotor]
+    next_cursor: str | None = None # Passe em `cursor` para buscar a próxima página
@@ -13,7 +13,7 @@ class UsuarioBase(BaseModel):
 class ContratoInfo(BaseModel):
     id: int
     nome_arquivo_original: str
-    url_acesso: str
+    url_acesso: str # Não é coluna: vem de `crud.contrato.agrupar_por_usuario`
 
 
 class PerfilUsuario(str, Enum):
@@ -1,47 +1,134 @@
-import google.generativeai as genai 
-from typing import List, Dict, Any
+import json
+import threading
+from typing import AsyncIterator
 from app.core.config import settings
 
- # Configura a API uma vez, quando o módulo é carregado.
-try:
-     genai.configure(api_key=settings.GOOGLE_API_KEY)
-     model = genai.GenerativeModel('gemini-2.0-flash') # Modelo rápido e eficiente
-     print("✅ Modelo de IA Gemini inicializado com sucesso.")
-except Exception as e:
-     print(f"❌ Erro ao configurar a API do Gemini: {e}")
-     model = None
+class ErroIA(Exception):
+     """Falha ao obter uma resposta da IA (a mensagem já é própria para o usuário)."""
 
-def generate_analysis_from_data(user_question: str, system_data: str) -> str:
+class ClienteGemini:
      """
-     Função genérica para enviar uma pergunta e dados contextuais para a IA.
+     Cliente do modelo de IA usado pelos insights. As rotas o recebem por
+     `Depends(get_cliente_ia)`, então pode ser trocado (ex.: por um fake local
+     em testes, via `app.dependency_overrides`).
      """
-     if not model:
-         return "Erro: O modelo de IA não foi inicializado corretamente. Verifique a chave da API no servidor."
-     
-     # Este é o nosso "Mega Prompt". É a instrução principal para a IA.
-     prompt_template = f"""
-     Você é o "Assistente de Análise Mustafa", uma IA especialista em gestão de estoque e análise de dados de negócios. 
+
+     def __init__(self, model):
+          self.model = model
+
+     def gerar(self, prompt: str) -> str:
+          """Gera a resposta completa (bloqueante)."""
+          if not self.model:
+               raise ErroIA("Erro: O modelo de IA não foi inicializado corretamente. Verifique a chave da API no servidor.")
+          try:
+               response = self.model.generate_content(prompt)
+               return response.text
+          except Exception as e:
+               raise ErroIA(f"Ocorreu um erro ao comunicar com a IA: {e}") from e
+
+     async def gerar_async(self, prompt: str) -> str:
+          """Como `gerar`, mas sem bloquear o event loop (cliente assíncrono)."""
+          if not self.model:
+               raise ErroIA("Erro: O modelo de IA não foi inicializado corretamente. Verifique a chave da API no servidor.")
+          try:
+               response = await self.model.generate_content_async(prompt)
+               return response.text
+          except Exception as e:
+               raise ErroIA(f"Ocorreu um erro ao comunicar com a IA: {e}") from e
+
+     async def gerar_stream(self, prompt: str) -> AsyncIterator[str]:
+          """Gera a resposta em pedaços, à medida que o modelo produz o texto (cliente assíncrono)."""
+          if not self.model:
+               raise ErroIA("Erro: O modelo de IA não foi inicializado corretamente. Verifique a chave da API no servidor.")
+          try:
+               response = await self.model.generate_content_async(prompt, stream=True)
+               async for chunk in response:
+                    if chunk.text:
+                         yield chunk.text
+          except Exception as e:
+               raise ErroIA(f"Ocorreu um erro ao comunicar com a IA: {e}") from e
+
+def _criar_modelo():
+     try:
+          # Import adiado: o SDK (gRPC, protobuf) custa centenas de ms e só a IA precisa dele
+          import google.generativeai as genai
+          genai.configure(api_key=settings.GOOGLE_API_KEY)
+          model = genai.GenerativeModel('gemini-2.0-flash') # Modelo rápido e eficiente
+          print("✅ Modelo de IA Gemini inicializado com sucesso.")
+          return model
+     except Exception as e:
+          print(f"❌ Erro ao configurar a API do Gemini: {e}")
+          return None
+
+# Criado no primeiro uso (ou no startup de cada worker), nunca no import: o
+# cliente gRPC não sobrevive a um fork, e o gunicorn importa o app antes de forkar.
+_cliente: ClienteGemini | None = None
+_cliente_lock = threading.Lock()
+
+def get_cliente_ia() -> ClienteGemini:
+     """Dependência do FastAPI que fornece o cliente de IA."""
+     global _cliente
+     if _cliente is None:
+          with _cliente_lock:
+               if _cliente is None:
+                    _cliente = ClienteGemini(_criar_modelo())
+     return _cliente
+
+def montar_prompt(user_question: str, system_data: str) -> str:
+     """Monta o "Mega Prompt" com a pergunta do gestor e os dados do sistema."""
+     return f"""
+     Você é o "Assistente de Análise Mustafa", uma IA especialista em gestão de estoque e análise de dados de negócios.
      Sua função é ajudar o gestor a entender os dados do sistema e tomar melhores decisões.
-     
-     O gestor fez a seguinte pergunta: 
+
+     O gestor fez a seguinte pergunta:
      "{user_question}"
-     
+
      Para te ajudar a responder, aqui estão os dados relevantes do sistema no momento da pergunta. Use-os para basear sua resposta.
+     Os dados são resumos agregados em JSON compacto; cada tabela vem no formato {{"colunas": [...], "linhas": [[...], ...]}}.
      ---
      DADOS DO SISTEMA:
      {system_data}
      ---
-     
+
      Instruções para sua resposta:
      1. Responda de forma clara, profissional e direta.
      2. Utilize o formato Markdown para melhorar a legibilidade (use títulos, negrito e listas).
      3. Se os dados fornecidos não forem suficientes para responder à pergunta, explique o motivo e sugira que tipo de dado seria necessário.
      4. Se a pergunta for fora do escopo de gestão de estoque, recuse educadamente.
      """
-     
+
+def montar_prompt_extracao(legendas: list[str], lojas_conhecidas: list[str]) -> str:
+     """Prompt que pede loja e cidade de várias legendas de uma vez, em JSON."""
+     numeradas = "\n".join(f"{i}: {json.dumps(legenda, ensure_ascii=False)}" for i, legenda in enumerate(legendas))
+     conhecidas = "\n".join(f"- {loja}" for loja in lojas_conhecidas) or "(nenhuma cadastrada)"
+     return f"""
+     Você recebe legendas de fotos enviadas por promotores de vendas pelo WhatsApp.
+     Para cada legenda, identifique a loja (ponto de venda) e a cidade citadas.
+
+     Lojas cadastradas da empresa (nome e cidade). Se a legenda citar uma delas, use exatamente o nome cadastrado:
+     {conhecidas}
+
+     Legendas (índice: texto):
+     {numeradas}
+
+     Responda SOMENTE com uma lista JSON, um objeto por legenda, no formato
+     [{{"i": 0, "loja": "Nome da loja" ou null, "cidade": "Cidade" ou null}}, ...].
+     Use null quando a informação não estiver na legenda; não invente.
+     """
+
+def generate_analysis_from_data(user_question: str, system_data: str) -> str:
+     """
+     Função genérica para enviar uma pergunta e dados contextuais para a IA.
+     Em caso de erro, retorna a mensagem de erro como texto.
+     """
      try:
-         response = model.generate_content(prompt_template)
-         return response.text
-     except Exception as e:
-         return f"Ocorreu um erro ao comunicar com a IA: {e}"
- 
\ No newline at end of file
+         return gerar_analise(user_question, system_data)
+     except ErroIA as e:
+         return str(e)
+
+def gerar_analise(user_question: str, system_data: str, cliente: ClienteGemini | None = None) -> str:
+     """
+     Igual a `generate_analysis_from_data`, mas lança ErroIA em caso de falha,
+     para quem precisa distinguir uma resposta de um erro (ex.: o cache).
+     """
+     return (cliente or get_cliente_ia()).gerar(montar_prompt(user_question, system_data))
@@ -0,0 +1,148 @@
+import logging
+import os
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud import blob as crud_blob, foto_promotor as crud_foto
+from app.db import models
+from app.db.particoes import TABELA, inicio_do_mes, listar_particoes, somar_meses
+from app.services.imagens import TAMANHOS_DERIVADOS, nome_derivado
+from app.services.storage import chave_vizinha, copiar_entre, get_storage, get_storage_frio
+
+logger = logging.getLogger(__name__)
+
+# Estado da tabela desanexada, guardado no COMMENT dela: as referências aos
+# blobs são soltas numa transação separada do DETACH e uma falha entre as
+# duas deixa o arquivo `pendente`, retomado na próxima execução.
+_PENDENTE = "arquivo:pendente"
+_CONCLUIDO = "arquivo:concluido"
+
+
+def _chaves_do_blob(chave: str) -> list[str]:
+    """O original e os derivados que ficam ao lado dele."""
+    nome = os.path.basename(chave)
+    return [chave] + [chave_vizinha(chave, nome_derivado(nome, tamanho)) for tamanho in TAMANHOS_DERIVADOS.values()]
+
+
+def particoes_expiradas(db: Session, antes_de: date) -> list[tuple[str, date]]:
+    """Partições mensais que terminam até o início do mês de `antes_de`."""
+    limite = inicio_do_mes(antes_de)
+    return [(nome, mes) for nome, mes in listar_particoes(db.connection()) if somar_meses(mes, 1) <= limite]
+
+
+def arquivos_pendentes(db: Session) -> list[str]:
+    """Partições já desanexadas cujas referências aos blobs ainda não foram soltas."""
+    return list(db.execute(text(
+        "SELECT relname FROM pg_class WHERE relkind = 'r' AND relname LIKE :prefixo "
+        "AND obj_description(oid, 'pg_class') = :pendente ORDER BY relname"
+    ), {"prefixo": f"arquivo_{TABELA}_p%", "pendente": _PENDENTE}).scalars())
+
+
+def _desanexar(db: Session, nome: str, arquivo: str) -> None:
+    """
+    DETACH, RENAME e remoção das FKs herdadas numa transação curta. O DETACH
+    trava fotos_promotores (ACCESS EXCLUSIVE; o CONCURRENTLY não é aceito com
+    a partição DEFAULT): o lock_timeout faz ele desistir em vez de enfileirar
+    atrás de uma query longa e bloquear as que chegam depois.
+    """
+    conexao = db.connection()
+    conexao.execute(text(f"SET LOCAL lock_timeout = {int(settings.MIGRACAO_LOCK_TIMEOUT_MS)}"))
+    conexao.execute(text(f"ALTER TABLE {TABELA} DETACH PARTITION {nome}"))
+    conexao.execute(text(f"ALTER TABLE {nome} RENAME TO {arquivo}"))
+    restricoes = conexao.execute(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:tabela AS regclass) AND contype = 'f'"
+    ), {"tabela": arquivo}).scalars().all()
+    for restricao in restricoes:
+        conexao.execute(text(f'ALTER TABLE {arquivo} DROP CONSTRAINT "{restricao}"'))
+    conexao.execute(text(f"COMMENT ON TABLE {arquivo} IS '{_PENDENTE}'"))
+    db.commit()
+
+
+def _copiar_para_frio(storage, frio, sha256: str, chave: str) -> list[str]:
+    copiadas = []
+    for chave_arquivo in _chaves_do_blob(chave):
+        if storage.existe(chave_arquivo):
+            copiar_entre(storage, frio, chave_arquivo)
+            copiadas.append(chave_arquivo)
+        elif chave_arquivo == chave:
+            logger.warning(f"Arquivo do blob {sha256} ({chave}) não encontrado no storage.")
+    return copiadas
+
+
+def concluir_arquivo(db: Session, arquivo: str, apagar_tabela: bool = False) -> dict:
+    """
+    Solta as referências das fotos de `arquivo` (uma tabela já desanexada) aos
+    blobs. Nenhuma tabela quente fica travada durante a cópia dos arquivos:
+
+    1. fora de transação, copia para o storage frio os blobs que devem zerar;
+    2. numa transação curta, solta as referências, sobe a versão dos dados
+       das empresas e marca o arquivo como concluído (juntos: as referências
+       nunca são soltas duas vezes);
+    3. depois do commit, apaga do storage quente o que deixou de ser referenciado.
+
+    Uma falha no meio nunca perde mídia: no pior caso sobra uma cópia no frio.
+    """
+    storage, frio = get_storage(), get_storage_frio()
+    conexao = db.connection()
+    # Varre a tabela desanexada inteira (ninguém mais a usa): não cabe no statement_timeout das rotas
+    conexao.execute(text("SET LOCAL statement_timeout = 0"))
+    fotos = conexao.execute(text(f"SELECT count(*) FROM {arquivo}")).scalar()
+    empresas = conexao.execute(text(f"SELECT DISTINCT empresa_id FROM {arquivo}")).scalars().all()
+    referencias = conexao.execute(text(
+        f"SELECT blob_sha256, count(*) FROM {arquivo} WHERE blob_sha256 IS NOT NULL GROUP BY blob_sha256"
+    )).all()
+    quantidades = dict(referencias)
+    candidatos = db.query(models.Blob.sha256, models.Blob.chave, models.Blob.ref_count).filter(
+        models.Blob.sha256.in_(list(quantidades))
+    ).all() if quantidades else []
+    db.rollback()
+
+    copiadas: dict[str, list[str]] = {}
+    for sha256, chave, ref_count in candidatos:
+        if ref_count <= quantidades[sha256]:
+            copiadas[sha256] = _copiar_para_frio(storage, frio, sha256, chave)
+
+    para_remover = []
+    for sha256, quantidade in referencias:
+        blob = crud_blob.remover_referencia(db, sha256, quantidade)
+        if blob is None:
+            continue # Ainda referenciado por fotos mais novas ou contratos: fica no quente
+        if sha256 not in copiadas:
+            # Zerou por uma remoção concorrente depois da leitura acima
+            copiadas[sha256] = _copiar_para_frio(storage, frio, sha256, blob.chave)
+        para_remover.extend(copiadas[sha256])
+
+    # As fotos saíram da fotos_promotores: muda a versão dos dados dessas empresas
+    if empresas:
+        crud_foto.marcar_fotos_alteradas(db, empresas)
+    if apagar_tabela:
+        db.execute(text(f"DROP TABLE {arquivo}"))
+    else:
+        db.execute(text(f"COMMENT ON TABLE {arquivo} IS '{_CONCLUIDO}'"))
+    db.commit()
+
+    for chave in para_remover:
+        storage.remover(chave)
+    logger.info(f"{arquivo}: {fotos} foto(s) arquivada(s), {len(para_remover)} arquivo(s) movido(s) para o storage frio.")
+    return {
+        "fotos": fotos,
+        "arquivos_movidos": len(para_remover),
+        "tabela": None if apagar_tabela else arquivo,
+    }
+
+
+def arquivar_particao(db: Session, nome: str, apagar_tabela: bool = False) -> dict:
+    """
+    Desanexa a partição (as fotos saem da fotos_promotores) e depois solta as
+    referências aos blobs, movendo para o storage frio o conteúdo que não é
+    mais referenciado por nenhuma foto ou contrato (ver `concluir_arquivo`).
+
+    A tabela desanexada fica como `arquivo_<partição>` (consultável à parte),
+    a menos que `apagar_tabela`. Os KPIs diários já contados não mudam.
+    """
+    arquivo = f"arquivo_{nome}"
+    _desanexar(db, nome, arquivo)
+    return {"particao": nome, **concluir_arquivo(db, arquivo, apagar_tabela=apagar_tabela)}
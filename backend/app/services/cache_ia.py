@@ -0,0 +1,96 @@
+import hashlib
+import random
+import re
+import unicodedata
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.db import models
+from app.core.cache import CacheTTL
+from app.core.config import settings
+
+
+def normalizar_pergunta(pergunta: str) -> str:
+    """Minúsculas, sem acentos, espaços colapsados e sem pontuação nas pontas."""
+    sem_acentos = unicodedata.normalize("NFKD", pergunta).encode("ascii", "ignore").decode()
+    return re.sub(r"\s+", " ", sem_acentos.lower()).strip(" ?!.")
+
+
+def montar_chave(empresa_id: int, pergunta: str, versao_dados: str) -> str:
+    """
+    Chave do cache. Inclui a versão dos dados (muda a cada foto nova) e o dia,
+    pois o contexto enviado à IA é uma janela relativa a hoje.
+    """
+    bruto = f"{empresa_id}|{versao_dados}|{date.today().isoformat()}|{normalizar_pergunta(pergunta)}"
+    return hashlib.sha256(bruto.encode()).hexdigest()
+
+
+class CacheMemoria:
+    """Cache no próprio processo: o mais rápido, mas cada worker tem o seu."""
+
+    def __init__(self, max_itens: int, ttl_segundos: int):
+        self._cache = CacheTTL(max_itens=max_itens, ttl_segundos=ttl_segundos)
+
+    def obter(self, db: Session, chave: str) -> str | None:
+        return self._cache.get(chave)
+
+    def guardar(self, db: Session, chave: str, empresa_id: int, resposta: str) -> None:
+        self._cache.set(chave, resposta)
+
+
+class CachePostgres:
+    """Cache na tabela cache_respostas_ia, compartilhado por todos os workers."""
+
+    # Fração das gravações que também fazem a limpeza (expirados + LRU)
+    PROBABILIDADE_LIMPEZA = 0.02
+
+    def __init__(self, max_itens: int, ttl_segundos: int):
+        self.max_itens = max_itens
+        self.ttl_segundos = ttl_segundos
+
+    def obter(self, db: Session, chave: str) -> str | None:
+        agora = datetime.now(timezone.utc)
+        item = db.query(models.CacheRespostaIA).filter(
+            models.CacheRespostaIA.chave == chave,
+            models.CacheRespostaIA.expira_em > agora
+        ).first()
+        if not item:
+            return None
+        item.ultimo_acesso = agora
+        db.commit()
+        return item.resposta
+
+    def guardar(self, db: Session, chave: str, empresa_id: int, resposta: str) -> None:
+        agora = datetime.now(timezone.utc)
+        valores = {
+            "empresa_id": empresa_id,
+            "resposta": resposta,
+            "expira_em": agora + timedelta(seconds=self.ttl_segundos),
+            "ultimo_acesso": agora,
+        }
+        stmt = insert(models.CacheRespostaIA).values(chave=chave, **valores)
+        db.execute(stmt.on_conflict_do_update(index_elements=["chave"], set_=valores))
+        if random.random() < self.PROBABILIDADE_LIMPEZA:
+            self._limpar(db, agora)
+        db.commit()
+
+    def _limpar(self, db: Session, agora: datetime) -> None:
+        tabela = models.CacheRespostaIA
+        db.query(tabela).filter(tabela.expira_em <= agora).delete(synchronize_session=False)
+        # LRU: mantém só os `max_itens` acessados mais recentemente
+        mais_recentes = db.query(tabela.chave).order_by(tabela.ultimo_acesso.desc()).limit(self.max_itens)
+        db.query(tabela).filter(tabela.chave.notin_(mais_recentes.scalar_subquery()))\
+            .delete(synchronize_session=False)
+
+
+_cache: CacheMemoria | CachePostgres | None = None
+
+
+def get_cache_ia() -> CacheMemoria | CachePostgres:
+    """Retorna o backend de cache configurado em IA_CACHE_BACKEND."""
+    global _cache
+    if _cache is None:
+        backend = CachePostgres if settings.IA_CACHE_BACKEND == "postgres" else CacheMemoria
+        _cache = backend(max_itens=settings.IA_CACHE_MAX_ITENS, ttl_segundos=settings.IA_CACHE_TTL_SEGUNDOS)
+    return _cache
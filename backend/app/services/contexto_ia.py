@@ -0,0 +1,125 @@
+import json
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, tuple_, cast, Date
+from sqlalchemy.orm import Session
+
+from app.db import models
+from app.core.config import settings
+
+# Aproximação usual para texto em português: ~4 caracteres por token
+CARACTERES_POR_TOKEN = 4
+
+
+def _estimar_tokens(texto: str) -> int:
+    return len(texto) // CARACTERES_POR_TOKEN + 1
+
+
+def _serializar(contexto: dict) -> str:
+    # Compacto: sem indentação nem espaços, e acentos sem escape
+    return json.dumps(contexto, default=str, separators=(",", ":"), ensure_ascii=False)
+
+
+def _tabela(colunas: list[str], linhas: list[list]) -> dict:
+    """Formato colunar: não repete o nome dos campos em cada linha."""
+    return {"colunas": colunas, "linhas": linhas}
+
+
+def _agregados(db: Session, empresa_id: int, desde: datetime):
+    """
+    Contagens por promotor, por loja/cidade e por dia em uma única passada
+    (GROUPING SETS), já com o nome do promotor vindo do JOIN.
+    """
+    foto = models.FotoPromotor
+    dia = cast(foto.data_envio, Date)
+    return (
+        db.query(
+            func.grouping(foto.promotor_id).label("sem_promotor"),
+            func.grouping(foto.loja).label("sem_loja"),
+            foto.promotor_id,
+            models.Usuario.nome,
+            foto.loja,
+            foto.cidade,
+            dia.label("dia"),
+            func.count(foto.id).label("total"),
+        )
+        .join(models.Usuario, foto.promotor_id == models.Usuario.id)
+        .filter(foto.empresa_id == empresa_id, foto.data_envio >= desde)
+        .group_by(func.grouping_sets(
+            tuple_(foto.promotor_id, models.Usuario.nome),
+            tuple_(foto.loja, foto.cidade),
+            tuple_(dia),
+        ))
+        .all()
+    )
+
+
+def _amostras(db: Session, empresa_id: int, limite: int):
+    """Fotos mais recentes, só com as colunas necessárias (sem lazy load do promotor)."""
+    foto = models.FotoPromotor
+    return (
+        db.query(foto.data_envio, models.Usuario.nome, foto.loja, foto.cidade, foto.legenda)
+        .join(models.Usuario, foto.promotor_id == models.Usuario.id)
+        .filter(foto.empresa_id == empresa_id)
+        .order_by(foto.data_envio.desc(), foto.id.desc())
+        .limit(limite)
+        .all()
+    )
+
+
+def montar_contexto_ia(
+    db: Session,
+    empresa_id: int,
+    max_tokens: int | None = None,
+    dias: int | None = None,
+    max_amostras: int | None = None,
+) -> str:
+    """
+    Monta o contexto de dados enviado ao Gemini: resumos pré-agregados
+    (por promotor, por loja e por dia) mais algumas fotos recentes, em JSON
+    compacto e limitado a `max_tokens`. O custo não cresce com o histórico.
+    """
+    max_tokens = max_tokens or settings.IA_CONTEXTO_MAX_TOKENS
+    dias = dias or settings.IA_CONTEXTO_DIAS
+    max_amostras = max_amostras if max_amostras is not None else settings.IA_CONTEXTO_AMOSTRAS
+
+    desde = datetime.now(timezone.utc) - timedelta(days=dias)
+    por_promotor, por_loja, por_dia = [], [], []
+    for linha in _agregados(db, empresa_id, desde):
+        if not linha.sem_promotor:
+            por_promotor.append([linha.promotor_id, linha.nome, linha.total])
+        elif not linha.sem_loja:
+            por_loja.append([linha.loja, linha.cidade, linha.total])
+        else:
+            por_dia.append([linha.dia.isoformat(), linha.total])
+
+    # Mais relevantes primeiro: é o fim das listas que é cortado se faltar espaço
+    por_promotor.sort(key=lambda l: l[2], reverse=True)
+    por_loja.sort(key=lambda l: l[2], reverse=True)
+    por_dia.sort(key=lambda l: l[0], reverse=True)
+    amostras = [
+        [data_envio.isoformat(timespec="minutes"), nome, loja, cidade, legenda]
+        for data_envio, nome, loja, cidade, legenda in _amostras(db, empresa_id, max_amostras)
+    ]
+
+    listas = {"por_dia": por_dia, "por_loja": por_loja, "fotos_recentes": amostras, "por_promotor": por_promotor}
+
+    def montar() -> dict:
+        return {
+            "periodo": f"últimos {dias} dias",
+            "total_fotos_periodo": sum(total for _, total in por_dia),
+            "fotos_por_promotor": _tabela(["id_promotor", "nome", "total"], listas["por_promotor"]),
+            "fotos_por_loja": _tabela(["loja", "cidade", "total"], listas["por_loja"]),
+            "fotos_por_dia": _tabela(["dia", "total"], listas["por_dia"]),
+            "fotos_recentes": _tabela(["data_envio", "promotor", "loja", "cidade", "legenda"], listas["fotos_recentes"]),
+        }
+
+    # Enquanto estourar o orçamento, corta pela metade a maior lista (em ordem de prioridade inversa)
+    texto = _serializar(montar())
+    while _estimar_tokens(texto) > max_tokens:
+        nome, maior = max(listas.items(), key=lambda item: len(item[1]))
+        if not maior:
+            break
+        listas[nome] = maior[: len(maior) // 2]
+        texto = _serializar(montar())
+
+    return texto
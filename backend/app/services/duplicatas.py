@@ -0,0 +1,43 @@
+from itertools import combinations
+
+# O dHash de 64 bits é dividido em 4 segmentos de 16 bits (multi-index hashing).
+# Pelo princípio da casa dos pombos, duas fotos a até `d` bits de distância têm
+# pelo menos um segmento a até d // 4 bits de distância: basta buscar, por
+# índice, as variações de cada segmento com até d // 4 bits trocados e conferir
+# a distância exata só nesses poucos candidatos.
+QUANTIDADE_SEGMENTOS = 4
+BITS_SEGMENTO = 16
+_MASCARA_SEGMENTO = (1 << BITS_SEGMENTO) - 1
+
+
+def segmentos(valor: int) -> list[int]:
+    """Divide o hash (sem sinal) em segmentos de 16 bits, do mais significativo ao menos."""
+    return [
+        (valor >> (BITS_SEGMENTO * (QUANTIDADE_SEGMENTOS - 1 - i))) & _MASCARA_SEGMENTO
+        for i in range(QUANTIDADE_SEGMENTOS)
+    ]
+
+
+def variacoes(segmento: int, raio: int) -> list[int]:
+    """Todos os valores a até `raio` bits de distância do segmento (incluindo ele mesmo)."""
+    resultado = [segmento]
+    for bits in range(1, raio + 1):
+        for posicoes in combinations(range(BITS_SEGMENTO), bits):
+            valor = segmento
+            for posicao in posicoes:
+                valor ^= 1 << posicao
+            resultado.append(valor)
+    return resultado
+
+
+def distancia_hamming(a: int, b: int) -> int:
+    return bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count("1")
+
+
+def para_bigint(valor: int) -> int:
+    """O Postgres só tem bigint com sinal: guarda o hash de 64 bits em complemento de dois."""
+    return valor - (1 << 64) if valor >= (1 << 63) else valor
+
+
+def de_bigint(valor: int) -> int:
+    return valor & 0xFFFFFFFFFFFFFFFF
@@ -0,0 +1,166 @@
+import csv
+import os
+import re
+import tempfile
+from datetime import datetime
+from typing import Callable, Sequence
+from zoneinfo import ZoneInfo
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from sqlalchemy import Select
+from starlette.background import BackgroundTask
+
+from app.core.config import settings
+from app.core.midia import assinar_url
+from app.db.connection import SessionLocal
+
+# Memória constante, qualquer que seja o número de linhas: as linhas vêm de um
+# cursor no servidor (yield_per), em lotes de EXPORTACAO_LOTE, e vão direto
+# para um arquivo temporário, enviado depois em streaming.
+
+COLUNAS_FOTOS = ["ID", "Data de envio", "Promotor", "Loja", "Cidade", "Legenda", "Duplicata de", "URL da foto"]
+COLUNAS_KPIS = ["Dia", "Promotor", "Fotos"]
+
+CONTENT_TYPE_CSV = "text/csv; charset=utf-8"
+CONTENT_TYPE_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+_fuso = ZoneInfo(settings.FUSO_HORARIO_RELATORIOS)
+
+# Legendas, lojas e cidades vêm de qualquer remetente do WhatsApp. Uma célula
+# que começa com um destes caracteres vira fórmula no Excel (e no openpyxl,
+# "=..." é gravado como fórmula): prefixa com um apóstrofo, que a mantém como texto.
+_INICIO_DE_FORMULA = ("=", "+", "-", "@", "\t", "\r")
+# Caracteres de controle que o XML do XLSX não aceita (o openpyxl lança IllegalCharacterError)
+_CARACTERES_ILEGAIS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _data_local(valor: datetime | None) -> datetime | None:
+    # O Excel não aceita datas com fuso: converte para o horário local e remove o tzinfo
+    if valor is None or valor.tzinfo is None:
+        return valor
+    return valor.astimezone(_fuso).replace(tzinfo=None)
+
+
+def texto_seguro(valor: str | None) -> str | None:
+    """Texto livre pronto para uma célula: sem caracteres de controle e sem virar fórmula."""
+    if not valor:
+        return valor
+    valor = _CARACTERES_ILEGAIS.sub("", valor)
+    if valor.startswith(_INICIO_DE_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def formatador_fotos(empresa_id: int) -> Callable[[Sequence], list]:
+    """Linha de `select_exportacao_fotos` -> células (URL assinada para a empresa)."""
+    def formatar(linha) -> list:
+        return [
+            linha.id,
+            _data_local(linha.data_envio),
+            texto_seguro(linha.promotor),
+            texto_seguro(linha.loja),
+            texto_seguro(linha.cidade),
+            texto_seguro(linha.legenda),
+            linha.duplicata_de_id,
+            assinar_url(linha.url_foto, empresa_id),
+        ]
+    return formatar
+
+
+def formatar_kpi(linha) -> list:
+    """Linha de `select_exportacao_kpis` -> células."""
+    return [linha.dia, texto_seguro(linha.promotor), linha.total_fotos]
+
+
+def _celula_csv(valor):
+    if isinstance(valor, datetime):
+        return valor.strftime("%Y-%m-%d %H:%M:%S")
+    return "" if valor is None else valor
+
+
+def _arquivo_temporario(sufixo: str) -> str:
+    descritor, caminho = tempfile.mkstemp(prefix="exportacao_", suffix=sufixo)
+    os.close(descritor)
+    return caminho
+
+
+def gerar_csv(stmt: Select, colunas: list[str], formatar: Callable[[Sequence], list]) -> str:
+    """
+    Grava o CSV num arquivo temporário a partir do cursor no servidor do
+    engine síncrono. Separador ';' e BOM UTF-8, como o Excel em português espera.
+
+    Não escreve direto na resposta: o cursor prende uma transação (e uma
+    conexão do pool) aberta, e um cliente lento passaria do
+    idle_in_transaction_session_timeout, cortando o CSV no meio de um 200.
+    Bloqueante: rodar no threadpool. Retorna o caminho; quem chama apaga.
+    """
+    caminho = _arquivo_temporario(".csv")
+    db = SessionLocal()
+    try:
+        with open(caminho, "w", encoding="utf-8-sig", newline="") as arquivo:
+            escritor = csv.writer(arquivo, delimiter=";")
+            escritor.writerow(colunas)
+            resultado = db.execute(stmt.execution_options(yield_per=settings.EXPORTACAO_LOTE))
+            for linha in resultado:
+                escritor.writerow([_celula_csv(valor) for valor in formatar(linha)])
+    except BaseException:
+        os.remove(caminho)
+        raise
+    finally:
+        db.close()
+    return caminho
+
+
+def gerar_xlsx(stmt: Select, colunas: list[str], formatar: Callable[[Sequence], list], titulo: str) -> str:
+    """
+    Grava o XLSX num arquivo temporário, com o openpyxl em modo write-only
+    (as linhas vão para o disco à medida que são escritas) e o cursor no
+    servidor do engine síncrono. Bloqueante: rodar no threadpool.
+    Retorna o caminho do arquivo; quem chama deve apagá-lo depois de enviar.
+    """
+    from openpyxl import Workbook
+
+    caminho = _arquivo_temporario(".xlsx")
+    db = SessionLocal()
+    try:
+        planilha = Workbook(write_only=True)
+        aba = planilha.create_sheet(titulo)
+        aba.append(colunas)
+        resultado = db.execute(stmt.execution_options(yield_per=settings.EXPORTACAO_LOTE))
+        for linha in resultado:
+            aba.append(formatar(linha))
+        planilha.save(caminho)
+    except BaseException:
+        os.remove(caminho)
+        raise
+    finally:
+        db.close()
+    return caminho
+
+
+async def responder(
+    stmt: Select,
+    colunas: list[str],
+    formatar: Callable[[Sequence], list],
+    formato: str,
+    nome_base: str,
+):
+    """
+    Resposta de download no formato pedido. O arquivo é gerado antes num
+    temporário (a conexão volta ao pool assim que a consulta termina) e
+    enviado em streaming pelo FileResponse, que o apaga no fim.
+    """
+    nome_arquivo = f"{nome_base}_{datetime.now(_fuso):%Y%m%d_%H%M}.{formato}"
+    if formato == "xlsx":
+        caminho = await run_in_threadpool(gerar_xlsx, stmt, colunas, formatar, nome_base)
+        media_type = CONTENT_TYPE_XLSX
+    else:
+        caminho = await run_in_threadpool(gerar_csv, stmt, colunas, formatar)
+        media_type = CONTENT_TYPE_CSV
+    return FileResponse(
+        caminho,
+        media_type=media_type,
+        filename=nome_arquivo,
+        background=BackgroundTask(os.remove, caminho),
+    )
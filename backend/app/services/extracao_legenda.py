@@ -0,0 +1,338 @@
+import json
+import logging
+import re
+import unicodedata
+from collections import deque
+from typing import Any, Iterator
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.cache import CacheTTL
+from app.core.config import settings
+from app.crud import foto_promotor as crud_foto, loja as crud_loja
+
+logger = logging.getLogger(__name__)
+
+# Extração de loja/cidade das legendas em duas etapas:
+# 1. local (na ingestão): um autômato de Aho–Corasick com os nomes, apelidos e
+#    cidades das lojas da empresa acha todas as ocorrências numa única passada
+#    pela legenda, sem chamar modelo nenhum;
+# 2. IA em lote: só as legendas que a etapa local não resolveu, várias por
+#    chamada, com cache por legenda normalizada. O worker de ingestão esvazia
+#    as pendentes aos poucos (`drenar_pendentes`); `manage.py extrair-lojas`
+#    fica para o histórico e para rodadas grandes.
+
+# Chave do pg_try_advisory_lock: só um worker drena as pendentes por vez
+CHAVE_LOCK_DRENAGEM = 7_220_002
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sem acentos e só letras/dígitos separados por um espaço."""
+    sem_acentos = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", " ", sem_acentos.lower()).strip()
+
+
+class AhoCorasick:
+    """Acha todas as ocorrências de vários termos num texto em uma única passada."""
+
+    def __init__(self):
+        self._transicoes: list[dict[str, int]] = [{}]
+        self._falha: list[int] = [0]
+        self._saidas: list[list[tuple[int, Any]]] = [[]]
+
+    def adicionar(self, termo: str, valor: Any) -> None:
+        estado = 0
+        for caractere in termo:
+            proximo = self._transicoes[estado].get(caractere)
+            if proximo is None:
+                proximo = len(self._transicoes)
+                self._transicoes.append({})
+                self._falha.append(0)
+                self._saidas.append([])
+                self._transicoes[estado][caractere] = proximo
+            estado = proximo
+        self._saidas[estado].append((len(termo), valor))
+
+    def compilar(self) -> None:
+        """Calcula os links de falha (busca em largura). Chamar depois de adicionar todos os termos."""
+        fila = deque(self._transicoes[0].values())
+        while fila:
+            estado = fila.popleft()
+            for caractere, proximo in self._transicoes[estado].items():
+                fila.append(proximo)
+                falha = self._falha[estado]
+                while falha and caractere not in self._transicoes[falha]:
+                    falha = self._falha[falha]
+                self._falha[proximo] = self._transicoes[falha].get(caractere, 0)
+                self._saidas[proximo] = self._saidas[proximo] + self._saidas[self._falha[proximo]]
+
+    def buscar(self, texto: str) -> Iterator[tuple[int, int, Any]]:
+        """Gera (início, tamanho, valor) de cada ocorrência, inclusive sobrepostas."""
+        estado = 0
+        for posicao, caractere in enumerate(texto):
+            while estado and caractere not in self._transicoes[estado]:
+                estado = self._falha[estado]
+            estado = self._transicoes[estado].get(caractere, 0)
+            for tamanho, valor in self._saidas[estado]:
+                yield posicao + 1 - tamanho, tamanho, valor
+
+
+class Dicionario:
+    """
+    Lojas e cidades de uma empresa compiladas num único autômato. Termos e
+    texto são normalizados e cercados por espaços, então só casam palavras
+    inteiras ('pao' não casa dentro de 'paola').
+    """
+
+    def __init__(self, lojas: list[tuple[str, str, list[str]]]):
+        """`lojas`: (nome, cidade, apelidos) de cada loja."""
+        self.lojas = lojas
+        self._automato = AhoCorasick()
+        self._lojas_por_termo: dict[str, set[tuple[str, str]]] = {}
+        self._cidades: dict[str, str] = {}
+        for nome, cidade, apelidos in lojas:
+            for termo in (nome, *apelidos):
+                chave = normalizar(termo)
+                if chave:
+                    self._lojas_por_termo.setdefault(chave, set()).add((nome, cidade))
+            if normalizar(cidade):
+                self._cidades[normalizar(cidade)] = cidade
+
+        for chave, candidatas in self._lojas_por_termo.items():
+            self._automato.adicionar(f" {chave} ", ("loja", candidatas))
+        for chave, cidade in self._cidades.items():
+            self._automato.adicionar(f" {chave} ", ("cidade", cidade))
+        self._automato.compilar()
+
+    def extrair(self, legenda: str) -> tuple[str | None, str | None]:
+        """
+        (loja, cidade) citadas na legenda; qualquer um pode ser None. Entre
+        várias lojas citadas vale o termo mais longo (o mais específico); uma
+        cidade citada desempata lojas de mesmo nome em cidades diferentes.
+        """
+        melhor: tuple[int, set[tuple[str, str]]] | None = None
+        cidades_citadas: list[str] = []
+        for _, tamanho, (tipo, valor) in self._automato.buscar(f" {normalizar(legenda)} "):
+            if tipo == "cidade":
+                cidades_citadas.append(valor)
+            elif melhor is None or tamanho > melhor[0]:
+                melhor = (tamanho, valor)
+
+        cidade_citada = cidades_citadas[0] if len(set(cidades_citadas)) == 1 else None
+        if melhor is None:
+            return None, cidade_citada
+
+        candidatas = melhor[1]
+        if cidades_citadas:
+            candidatas = {c for c in candidatas if c[1] in cidades_citadas} or candidatas
+        nomes = {nome for nome, _ in candidatas}
+        cidades = {cidade for _, cidade in candidatas}
+        if len(nomes) > 1:
+            # Apelido compartilhado por lojas diferentes: ambíguo, fica para a IA
+            return None, cidade_citada
+        return nomes.pop(), cidades.pop() if len(cidades) == 1 else cidade_citada
+
+    def loja_canonica(self, texto: str | None) -> str | None:
+        """Nome cadastrado da loja se `texto` for o nome ou um apelido dela; senão, o próprio texto."""
+        if not texto or not texto.strip():
+            return None
+        candidatas = self._lojas_por_termo.get(normalizar(texto))
+        nomes = {nome for nome, _ in candidatas or ()}
+        return nomes.pop() if len(nomes) == 1 else texto.strip()
+
+    def cidade_canonica(self, texto: str | None) -> str | None:
+        """Grafia cadastrada da cidade, se conhecida; senão, o próprio texto."""
+        if not texto or not texto.strip():
+            return None
+        return self._cidades.get(normalizar(texto), texto.strip())
+
+
+# Um dicionário por empresa, recompilado de tempos em tempos para enxergar lojas novas
+_dicionarios = CacheTTL(max_itens=1000, ttl_segundos=settings.EXTRACAO_DICIONARIO_TTL_SEGUNDOS)
+# Respostas da IA por (empresa, legenda normalizada): legendas repetidas não geram chamadas novas
+_cache_ia = CacheTTL(max_itens=settings.EXTRACAO_CACHE_MAX_ITENS, ttl_segundos=settings.EXTRACAO_CACHE_TTL_SEGUNDOS)
+
+
+def get_dicionario(db: Session, empresa_id: int) -> Dicionario:
+    """Dicionário compilado das lojas da empresa (em cache)."""
+    dicionario = _dicionarios.get(empresa_id)
+    if dicionario is None:
+        lojas = [(l.nome, l.cidade, list(l.apelidos or [])) for l in crud_loja.get_lojas(db, empresa_id)]
+        dicionario = Dicionario(lojas)
+        _dicionarios.set(empresa_id, dicionario)
+    return dicionario
+
+
+def invalidar_dicionario(empresa_id: int | None = None) -> None:
+    """Descarta o dicionário compilado (de uma empresa ou de todas) após mudar as lojas."""
+    if empresa_id is None:
+        _dicionarios.clear()
+    else:
+        _dicionarios.delete(empresa_id)
+
+
+def extrair_local(db: Session, empresa_id: int, legenda: str | None) -> tuple[str | None, str | None, str | None]:
+    """
+    Etapa local, barata o bastante para a ingestão. Retorna (loja, cidade, status):
+    'local' se achou a loja, 'pendente' (para a IA) se não achou, e status
+    None para fotos sem legenda.
+    """
+    if not legenda or not normalizar(legenda):
+        return None, None, None
+    loja, cidade = get_dicionario(db, empresa_id).extrair(legenda)
+    return loja, cidade, "local" if loja else "pendente"
+
+
+def _ler_resposta_ia(resposta: str) -> list[dict]:
+    # O modelo às vezes cerca o JSON com ```json ... ```: pega só a lista
+    inicio, fim = resposta.find("["), resposta.rfind("]")
+    if inicio == -1 or fim < inicio:
+        raise ValueError("a resposta da IA não contém uma lista JSON")
+    itens = json.loads(resposta[inicio:fim + 1])
+    return [item for item in itens if isinstance(item, dict)]
+
+
+def extrair_com_ia(cliente, dicionario: Dicionario, legendas: list[str]) -> list[tuple[str | None, str | None]]:
+    """
+    Uma única chamada à IA para um lote de legendas. Retorna (loja, cidade)
+    na ordem das legendas, com os nomes já trocados pelos cadastrados quando
+    a IA devolver um nome ou apelido conhecido. Lança ErroIA ou ValueError.
+    """
+    from app.services import ai_service
+
+    lojas = [f"{nome} ({cidade})" for nome, cidade, _ in dicionario.lojas[:settings.EXTRACAO_IA_MAX_LOJAS_NO_PROMPT]]
+    itens = _ler_resposta_ia(cliente.gerar(ai_service.montar_prompt_extracao(legendas, lojas)))
+
+    resultados: list[tuple[str | None, str | None]] = [(None, None)] * len(legendas)
+    for item in itens:
+        indice = item.get("i")
+        if isinstance(indice, int) and 0 <= indice < len(legendas):
+            resultados[indice] = (
+                dicionario.loja_canonica(item.get("loja")),
+                dicionario.cidade_canonica(item.get("cidade")),
+            )
+    return resultados
+
+
+def _resolver_com_ia(cliente, empresa_id: int, dicionario: Dicionario, legendas: list[str]) -> dict[str, tuple]:
+    """(loja, cidade) de cada legenda normalizada, consultando o cache antes da IA."""
+    resolvidas: dict[str, tuple] = {}
+    faltando: dict[str, str] = {}
+    for legenda in legendas:
+        chave = normalizar(legenda)
+        em_cache = _cache_ia.get((empresa_id, chave))
+        if em_cache is not None:
+            resolvidas[chave] = em_cache
+        else:
+            faltando.setdefault(chave, legenda)
+
+    chaves = list(faltando)
+    por_chamada = settings.EXTRACAO_IA_LEGENDAS_POR_CHAMADA
+    for inicio in range(0, len(chaves), por_chamada):
+        lote = chaves[inicio:inicio + por_chamada]
+        for chave, resultado in zip(lote, extrair_com_ia(cliente, dicionario, [faltando[c] for c in lote])):
+            _cache_ia.set((empresa_id, chave), resultado)
+            resolvidas[chave] = resultado
+    return resolvidas
+
+
+def extrair_historico(db: Session, lote: int = 500) -> tuple[int, int]:
+    """
+    Etapa local para as fotos que nunca passaram pela extração (ex.: anteriores
+    a ela). Faz commit por lote e retorna (resolvidas, pendentes para a IA).
+    """
+    resolvidas, pendentes, ultimo_id = 0, 0, 0
+    while True:
+        fotos = crud_foto.get_fotos_para_extracao(db, status=None, apos_id=ultimo_id, limite=lote)
+        if not fotos:
+            break
+        ultimo_id = fotos[-1].id
+        for foto in fotos:
+            loja, cidade, status = extrair_local(db, foto.empresa_id, foto.legenda)
+            crud_foto.atualizar_extracao(db, foto.id, loja, cidade, status)
+            resolvidas += status == "local"
+            pendentes += status == "pendente"
+        db.commit()
+        logger.info(f"... {resolvidas + pendentes} legenda(s) analisada(s) até o ID {ultimo_id}")
+    return resolvidas, pendentes
+
+
+def processar_pendentes(db: Session, cliente, lote: int = 500, limite_fotos: int | None = None) -> tuple[int, int, int]:
+    """
+    Resolve as fotos 'pendente' de todas as empresas: primeiro de novo pelo
+    dicionário (lojas podem ter sido cadastradas desde a ingestão) e o resto
+    pela IA, em lotes. As respostas locais são gravadas antes da chamada à IA,
+    que roda sem transação aberta; as da IA, numa transação curta depois dela.
+    Uma falha da IA interrompe com as fotos restantes ainda pendentes. Retorna (pelo dicionário, pela IA, sem resultado).
+    """
+    locais, pela_ia, sem_resultado = 0, 0, 0
+    for empresa_id in crud_foto.get_empresas_com_extracao_pendente(db):
+        invalidar_dicionario(empresa_id)
+        dicionario = get_dicionario(db, empresa_id)
+        ultimo_id = 0
+        while limite_fotos is None or locais + pela_ia + sem_resultado < limite_fotos:
+            fotos = crud_foto.get_fotos_para_extracao(
+                db, status="pendente", empresa_id=empresa_id, apos_id=ultimo_id, limite=lote
+            )
+            if not fotos:
+                break
+            ultimo_id = fotos[-1].id
+
+            restantes = []
+            for foto in fotos:
+                loja, cidade = dicionario.extrair(foto.legenda)
+                if loja:
+                    crud_foto.atualizar_extracao(db, foto.id, loja, cidade, "local")
+                    locais += 1
+                else:
+                    restantes.append((foto.id, foto.legenda, foto.cidade))
+            # Nenhuma transação (nem lock de foto) fica aberta durante a chamada à IA
+            db.commit()
+            if not restantes:
+                continue
+
+            respostas = _resolver_com_ia(cliente, empresa_id, dicionario, [legenda for _, legenda, _ in restantes])
+            for foto_id, legenda, cidade_local in restantes:
+                loja, cidade = respostas[normalizar(legenda)]
+                # A cidade achada localmente vale se a IA não trouxer outra
+                cidade = cidade or cidade_local
+                status = "ia" if loja or cidade else "sem_resultado"
+                # Só se ninguém resolveu a foto enquanto a IA respondia
+                if crud_foto.atualizar_extracao(db, foto_id, loja, cidade, status, se_status="pendente"):
+                    pela_ia += status == "ia"
+                    sem_resultado += status == "sem_resultado"
+            db.commit()
+            logger.info(f"Empresa {empresa_id}: lote até o ID {ultimo_id} processado.")
+    return locais, pela_ia, sem_resultado
+
+
+def drenar_pendentes(limite_fotos: int) -> tuple[int, int, int] | None:
+    """
+    Uma rodada de `processar_pendentes` para o worker de ingestão: até
+    `limite_fotos` fotos, em lotes do tamanho de uma chamada à IA. Retorna
+    None se outro processo já está drenando. Lança ErroIA ou ValueError como
+    `processar_pendentes`.
+    """
+    from app.db.connection import get_engine
+    from app.services import ai_service
+
+    with get_engine().connect() as conexao:
+        # Lock de sessão: vale entre os commits de cada lote, na mesma conexão
+        if not conexao.execute(text("SELECT pg_try_advisory_lock(:chave)"), {"chave": CHAVE_LOCK_DRENAGEM}).scalar():
+            conexao.rollback()
+            return None
+        conexao.commit()
+        db = Session(bind=conexao, autoflush=False)
+        try:
+            return processar_pendentes(
+                db,
+                ai_service.get_cliente_ia(),
+                lote=settings.EXTRACAO_IA_LEGENDAS_POR_CHAMADA,
+                limite_fotos=limite_fotos,
+            )
+        finally:
+            db.close()
+            conexao.rollback()
+            conexao.execute(text("SELECT pg_advisory_unlock(:chave)"), {"chave": CHAVE_LOCK_DRENAGEM})
+            conexao.commit()
@@ -0,0 +1,94 @@
+import os
+
+# Pillow é importado dentro das funções: módulos que só precisam dos nomes
+# dos derivados (API, migração) não carregam a biblioteca de imagens.
+
+# Derivados gerados para cada foto: nome -> maior lado em pixels.
+# Ordenados do maior para o menor: cada um é reduzido a partir do anterior.
+TAMANHOS_DERIVADOS = {
+    "grande": 1280,
+    "preview": 640,
+    "miniatura": 160,
+}
+QUALIDADE_WEBP = 80
+
+
+def nome_derivado(nome_arquivo: str, tamanho: int) -> str:
+    """Nome do arquivo derivado, ex.: 'abc.jpg' -> 'abc_640.webp'."""
+    base, _ = os.path.splitext(nome_arquivo)
+    return f"{base}_{tamanho}.webp"
+
+
+def derivados_existentes(caminho_original: str) -> dict[str, str] | None:
+    """
+    Se todos os derivados já existem ao lado do original (ex.: o mesmo conteúdo
+    foi reenviado), retorna-os no formato de `gerar_derivados`; senão, None.
+    """
+    diretorio = os.path.dirname(caminho_original)
+    nome_arquivo = os.path.basename(caminho_original)
+    nomes = {nome: nome_derivado(nome_arquivo, tamanho) for nome, tamanho in TAMANHOS_DERIVADOS.items()}
+    if all(os.path.exists(os.path.join(diretorio, arquivo)) for arquivo in nomes.values()):
+        return nomes
+    return None
+
+
+def gerar_derivados(caminho_original: str) -> dict[str, str]:
+    """
+    Gera as versões reduzidas (WebP) de uma foto, ao lado do original.
+
+    A orientação EXIF é aplicada antes de reduzir, então os derivados já saem
+    "de pé" e sem metadados. Função pura de CPU e sem acesso ao banco, para
+    poder rodar numa thread (ingestão) ou num processo separado (backfill).
+
+    Returns:
+        dict[str, str]: nome do derivado ('miniatura', 'preview', 'grande') -> nome do arquivo gerado.
+    """
+    diretorio = os.path.dirname(caminho_original)
+    nome_arquivo = os.path.basename(caminho_original)
+    from PIL import Image, ImageOps
+
+    maior = max(TAMANHOS_DERIVADOS.values())
+
+    with Image.open(caminho_original) as img:
+        # Para JPEG, decodifica já reduzido (bem mais rápido em fotos de celular)
+        img.draft("RGB", (maior, maior))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGB")
+
+        gerados = {}
+        atual = img
+        for nome, tamanho in TAMANHOS_DERIVADOS.items():
+            atual = atual.copy()
+            atual.thumbnail((tamanho, tamanho), Image.Resampling.LANCZOS)
+            nome_saida = nome_derivado(nome_arquivo, tamanho)
+            caminho_saida = os.path.join(diretorio, nome_saida)
+            # Grava em arquivo temporário e renomeia: nunca expõe um derivado pela metade
+            caminho_temporario = f"{caminho_saida}.part"
+            atual.save(caminho_temporario, format="WEBP", quality=QUALIDADE_WEBP, method=4)
+            os.replace(caminho_temporario, caminho_saida)
+            gerados[nome] = nome_saida
+
+    return gerados
+
+
+def calcular_dhash(caminho: str) -> int:
+    """
+    Hash perceptual (dHash) de 64 bits: compara o brilho de pixels vizinhos
+    numa versão 9x8 em tons de cinza. Fotos quase iguais (mesma gôndola
+    fotografada de novo, recompressão, pequeno recorte) ficam a poucos bits
+    de distância. Função pura de CPU, como `gerar_derivados`.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(caminho) as img:
+        img.draft("L", (64, 64))
+        img = ImageOps.exif_transpose(img)
+        pixels = img.convert("L").resize((9, 8), Image.Resampling.LANCZOS).tobytes()
+
+    valor = 0
+    for linha in range(8):
+        for coluna in range(8):
+            posicao = linha * 9 + coluna
+            valor = (valor << 1) | (pixels[posicao] > pixels[posicao + 1])
+    return valor
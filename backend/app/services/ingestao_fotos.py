@@ -0,0 +1,224 @@
+import os
+import uuid
+import asyncio
+import httpx
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from app.db.connection import SessionLocal
+from app.crud import usuario as crud_usuario, foto_promotor as crud_foto, blob as crud_blob, ingestao as crud_ingestao
+from app.core.uploads import detectar_tipo
+from app.services.media_client import baixar_para_arquivo
+from app.services.imagens import gerar_derivados, derivados_existentes, calcular_dhash
+from app.services.extracao_legenda import extrair_local
+from app.services.storage import get_storage, chave_conteudo, chave_vizinha, DIRETORIO_TEMPORARIO
+
+logger = logging.getLogger(__name__)
+
+
+class ErroPermanente(Exception):
+    """Falha que não adianta tentar de novo (o job vai direto para o dead-letter)."""
+
+
+class ErroTemporario(RuntimeError):
+    """
+    Falha que pode se resolver numa nova tentativa. `espera_segundos` é o
+    mínimo pedido pelo servidor (Retry-After) antes dela, se ele informou.
+    """
+
+    def __init__(self, mensagem: str, espera_segundos: float | None = None):
+        super().__init__(mensagem)
+        self.espera_segundos = espera_segundos
+
+
+class ReservaPerdida(Exception):
+    """O job deixou de ser deste worker (lease vencido, devolvido ou já concluído): nada foi registrado."""
+
+
+def _buscar_promotor(from_number: str) -> tuple[int, str, int] | None:
+    db = SessionLocal()
+    try:
+        promotor = crud_usuario.get_user_by_whatsapp(db, whatsapp_number=from_number)
+        if not promotor:
+            return None
+        return promotor.id, promotor.nome, promotor.empresa_id
+    finally:
+        db.close()
+
+
+def _registrar_foto(
+    job_id: int,
+    reserva: str,
+    url_foto: str,
+    nome_arquivo: str,
+    legenda: str | None,
+    promotor_id: int,
+    empresa_id: int,
+    urls_derivados: dict[str, str],
+    blob: dict,
+    phash: int | None,
+):
+    db = SessionLocal()
+    try:
+        # Primeiro tira o job da fila (travando a linha dele): a foto, a
+        # referência ao blob e o KPI só entram uma vez, pelo dono da reserva
+        if not crud_ingestao.consumir_job(db, job_id, reserva):
+            db.rollback()
+            raise ReservaPerdida(f"Job {job_id} não pertence mais a esta reserva.")
+
+        # Loja/cidade pelo dicionário da empresa; o que não resolver fica 'pendente'
+        # para a extração em lote pela IA (`manage.py extrair-lojas`)
+        loja, cidade, extracao_status = extrair_local(db, empresa_id, legenda)
+
+        # Referência ao blob e registro da foto na mesma transação
+        crud_blob.adicionar_referencia(db, **blob)
+        crud_foto.create_foto_registro(
+            db=db,
+            url_foto=url_foto,
+            nome_arquivo=nome_arquivo,
+            legenda=legenda,
+            promotor_id=promotor_id,
+            empresa_id=empresa_id,
+            urls_derivados=urls_derivados,
+            blob_sha256=blob["sha256"],
+            phash=phash,
+            loja=loja,
+            cidade=cidade,
+            extracao_status=extracao_status
+        )
+    finally:
+        # É CRUCIAL fechar a sessão para liberar a conexão de volta para o pool.
+        db.close()
+
+
+def _retry_after(response: httpx.Response) -> float | None:
+    """Segundos pedidos no cabeçalho Retry-After (número ou data HTTP), ou None."""
+    valor = response.headers.get("retry-after")
+    if not valor:
+        return None
+    if valor.strip().isdigit():
+        return float(valor)
+    try:
+        quando = parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    if quando.tzinfo is None:
+        quando = quando.replace(tzinfo=timezone.utc)
+    return max((quando - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def _extensao_da_imagem(caminho: str, content_type: str) -> tuple[str, str]:
+    """
+    Decide (content_type, extensão) pelos magic bytes do arquivo baixado;
+    se não reconhecer, usa o content-type informado pela Twilio.
+    """
+    with open(caminho, "rb") as arquivo:
+        tipo = detectar_tipo(arquivo.read(16))
+    if tipo and tipo[0].startswith("image/"):
+        return tipo
+    content_type = content_type.split(';')[0].strip()
+    extensao = content_type.split('/')[-1] if '/' in content_type else 'jpg'
+    if extensao.lower() not in ['jpg', 'jpeg', 'png']:
+        extensao = 'jpg'  # Garante uma extensão padrão
+    return content_type, extensao
+
+
+def _armazenar_com_derivados(caminho_temporario: str, chave: str) -> tuple[dict[str, str], int | None]:
+    """
+    Move a foto para o storage (descartando-a se o conteúdo já existir),
+    garante os derivados ao lado dela e calcula o hash perceptual.
+    Retorna as URLs dos derivados e o dHash (None se não foi possível calcular).
+    """
+    storage = get_storage()
+    storage.salvar_arquivo(caminho_temporario, chave)
+    caminho_original = storage.caminho_local(chave)
+
+    # Uma falha aqui não perde a foto: `manage.py gerar-derivados` e
+    # `manage.py detectar-duplicatas` podem completar depois.
+    try:
+        phash = calcular_dhash(caminho_original)
+    except Exception as e:
+        logger.warning(f"TASK AVISO: Não foi possível calcular o hash perceptual de {chave}: {e}")
+        phash = None
+
+    # Conteúdo repetido já tem os derivados: não gasta CPU gerando de novo
+    derivados = derivados_existentes(caminho_original)
+    if derivados is None:
+        try:
+            derivados = gerar_derivados(caminho_original)
+        except Exception as e:
+            logger.warning(f"TASK AVISO: Não foi possível gerar os derivados de {chave}: {e}")
+            return {}, phash
+    return {nome: storage.url(chave_vizinha(chave, arquivo)) for nome, arquivo in derivados.items()}, phash
+
+
+async def process_foto_whatsapp(job_id: int, reserva: str, from_number: str, media_url: str, caption: str):
+    """
+    Processa uma foto recebida via WhatsApp.
+
+    Executada pelos workers da fila de ingestão; o job `job_id` sai da fila na
+    mesma transação que registra a foto (ReservaPerdida se ele já não é desta `reserva`). O download usa o cliente HTTP
+    compartilhado e grava a mídia em disco por streaming, já calculando o
+    SHA-256; a foto vai para o storage endereçado por conteúdo, então reenvios
+    da mesma imagem não ocupam espaço de novo. O hash perceptual marca fotos
+    quase iguais a outra da empresa no mesmo dia, que não contam nos KPIs. As operações de banco e de disco
+    rodam em threads. As exceções são propagadas para que o worker decida entre
+    reagendar (com backoff) ou mandar o job para o dead-letter.
+    """
+    logger.info(f"TASK INICIADA: Processando foto para o número {from_number}")
+
+    # 1. Encontrar o promotor pelo número de WhatsApp
+    promotor = await asyncio.to_thread(_buscar_promotor, from_number)
+    if not promotor:
+        raise ErroPermanente(f"Promotor com o número {from_number} não foi encontrado no banco de dados.")
+    promotor_id, promotor_nome, empresa_id = promotor
+    logger.info(f"TASK INFO: Promotor encontrado: {promotor_nome} (ID: {promotor_id})")
+
+    # 2. Baixar a imagem da Twilio direto para um arquivo temporário
+    os.makedirs(DIRETORIO_TEMPORARIO, exist_ok=True) # Garante que o diretório exista
+    nome_base = str(uuid.uuid4())
+    caminho_temporario = os.path.join(DIRETORIO_TEMPORARIO, f"{nome_base}.part")
+
+    try:
+        logger.info(f"TASK INFO: Baixando mídia de {media_url}")
+        content_type, tamanho, sha256 = await baixar_para_arquivo(media_url, caminho_temporario)
+        logger.info(f"TASK INFO: Mídia baixada com sucesso. Tipo: {content_type}, Tamanho: {tamanho} bytes")
+
+        # 3. Guardar no storage pelo hash do conteúdo e gerar miniatura/preview/grande
+        content_type, extensao = await asyncio.to_thread(_extensao_da_imagem, caminho_temporario, content_type)
+        chave = chave_conteudo(sha256, extensao)
+        urls_derivados, phash = await asyncio.to_thread(_armazenar_com_derivados, caminho_temporario, chave)
+        logger.info(f"TASK INFO: Arquivo armazenado como {chave}")
+    except BaseException as e:
+        # Não deixa arquivos parciais para trás
+        if os.path.exists(caminho_temporario):
+            os.remove(caminho_temporario)
+        if isinstance(e, httpx.HTTPStatusError):
+            status_code = e.response.status_code
+            mensagem = f"Falha ao baixar mídia da Twilio. Status: {status_code}."
+            # 4xx (exceto 429) não se resolve com nova tentativa
+            if 400 <= status_code < 500 and status_code != 429:
+                raise ErroPermanente(mensagem) from e
+            # 429/503 costumam dizer quando tentar de novo: o reagendamento respeita
+            raise ErroTemporario(mensagem, _retry_after(e.response)) from e
+        raise
+
+    # 4. Registrar a foto (e a referência ao blob) no banco de dados
+    storage = get_storage()
+    blob = {"sha256": sha256, "chave": chave, "content_type": content_type, "tamanho": tamanho}
+    await asyncio.to_thread(
+        _registrar_foto,
+        job_id,
+        reserva,
+        storage.url(chave),
+        f"{nome_base}.{extensao}", # Nome lógico único da foto; o arquivo em si é o blob
+        caption,
+        promotor_id,
+        empresa_id,
+        urls_derivados,
+        blob,
+        phash
+    )
+
+    logger.info(f"TASK SUCESSO: Foto de {promotor_nome} ({from_number}) foi registrada no banco de dados com sucesso.")
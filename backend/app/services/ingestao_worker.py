@@ -0,0 +1,152 @@
+import asyncio
+import logging
+
+from app.db.connection import SessionLocal
+from app.crud import ingestao as crud_ingestao
+from app.core.config import settings
+from app.services.ingestao_fotos import process_foto_whatsapp, ErroPermanente, ReservaPerdida
+from app.services.extracao_legenda import drenar_pendentes
+from app.services.media_client import fechar_media_client
+
+logger = logging.getLogger(__name__)
+
+
+def _reservar_um_job():
+    """Reserva o próximo job disponível (ou None) numa sessão curta."""
+    db = SessionLocal()
+    try:
+        jobs = crud_ingestao.reservar_jobs(
+            db,
+            limite=1,
+            lease_segundos=settings.INGESTAO_LEASE_SEGUNDOS,
+            max_tentativas=settings.INGESTAO_MAX_TENTATIVAS,
+        )
+        if not jobs:
+            return None
+        job = jobs[0]
+        return job.id, job.reserva, job.from_number, job.media_url, job.legenda
+    finally:
+        db.close()
+
+
+def _devolver(job_id: int, reserva: str) -> bool:
+    db = SessionLocal()
+    try:
+        return crud_ingestao.devolver_job(db, job_id, reserva)
+    finally:
+        db.close()
+
+
+def _falhar(job_id: int, reserva: str, erro: Exception):
+    db = SessionLocal()
+    try:
+        job = crud_ingestao.registrar_falha(
+            db,
+            job_id,
+            reserva,
+            erro=f"{type(erro).__name__}: {erro}",
+            max_tentativas=settings.INGESTAO_MAX_TENTATIVAS,
+            backoff_base=settings.INGESTAO_BACKOFF_BASE_SEGUNDOS,
+            backoff_max=settings.INGESTAO_BACKOFF_MAX_SEGUNDOS,
+            permanente=isinstance(erro, ErroPermanente),
+            espera_minima=getattr(erro, "espera_segundos", None),
+        )
+        if job and job.status == crud_ingestao.STATUS_MORTO:
+            logger.error(f"WORKER: Job {job_id} movido para o dead-letter após {job.tentativas} tentativa(s): {erro}")
+        elif job:
+            logger.warning(f"WORKER: Job {job_id} falhou (tentativa {job.tentativas}), reagendado para {job.disponivel_em}: {erro}")
+        else:
+            logger.warning(f"WORKER: Job {job_id} falhou, mas a reserva já tinha vencido; a falha foi descartada: {erro}")
+    finally:
+        db.close()
+
+
+async def _loop_worker(numero: int, parar: asyncio.Event):
+    logger.info(f"WORKER {numero}: iniciado.")
+    while not parar.is_set():
+        try:
+            reserva = await asyncio.to_thread(_reservar_um_job)
+        except Exception as e:
+            logger.error(f"WORKER {numero}: erro ao reservar job: {e}", exc_info=True)
+            reserva = None
+
+        if reserva is None:
+            # Fila vazia: espera o intervalo de polling (ou o sinal de parada)
+            try:
+                await asyncio.wait_for(parar.wait(), timeout=settings.INGESTAO_POLL_SEGUNDOS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        job_id, token, from_number, media_url, legenda = reserva
+        try:
+            await process_foto_whatsapp(job_id, token, from_number, media_url, legenda)
+        except ReservaPerdida:
+            # Outro worker ficou com o job (lease vencido): ele é quem registra a foto
+            logger.warning(f"WORKER {numero}: job {job_id} perdeu a reserva; descartado por este worker.")
+        except asyncio.CancelledError:
+            # Desligamento estourou o prazo de drenagem: devolve o job para outro worker.
+            # O cancelamento não para uma thread que já está registrando a foto: se
+            # ela consumiu o job, a devolução não acha nada; se ainda não, o token
+            # invalidado aqui faz o registro dela desistir (sem foto duplicada).
+            devolvido = await asyncio.shield(asyncio.to_thread(_devolver, job_id, token))
+            if devolvido:
+                logger.warning(f"WORKER {numero}: job {job_id} interrompido; devolvido à fila.")
+            else:
+                logger.info(f"WORKER {numero}: job {job_id} interrompido, mas a foto já tinha sido registrada.")
+            raise
+        except Exception as e:
+            await asyncio.to_thread(_falhar, job_id, token, e)
+    logger.info(f"WORKER {numero}: finalizado.")
+
+
+async def _loop_extracao(parar: asyncio.Event):
+    """
+    A cada EXTRACAO_IA_INTERVALO_SEGUNDOS, manda para a IA uma rodada das fotos
+    que a extração local deixou pendentes (só um processo por vez, ver
+    `drenar_pendentes`). Uma rodada cheia emenda na próxima sem esperar.
+    """
+    while not parar.is_set():
+        cheia = False
+        try:
+            resultado = await asyncio.to_thread(drenar_pendentes, settings.EXTRACAO_IA_FOTOS_POR_RODADA)
+            if resultado is not None and any(resultado):
+                locais, pela_ia, sem_resultado = resultado
+                cheia = locais + pela_ia + sem_resultado >= settings.EXTRACAO_IA_FOTOS_POR_RODADA
+                logger.info(f"EXTRAÇÃO: {locais} pelo dicionário, {pela_ia} pela IA, {sem_resultado} sem resultado.")
+        except Exception as e:
+            # As fotos continuam pendentes: tenta de novo na próxima rodada
+            logger.warning(f"EXTRAÇÃO: rodada interrompida: {e}")
+        if cheia:
+            continue
+        try:
+            await asyncio.wait_for(parar.wait(), timeout=settings.EXTRACAO_IA_INTERVALO_SEGUNDOS)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def executar_workers(quantidade: int, parar: asyncio.Event, drenagem_segundos: float | None = None):
+    """
+    Executa `quantidade` workers consumindo a fila até `parar` ser sinalizado
+    (mais a drenagem das extrações pendentes pela IA, ver `_loop_extracao`).
+
+    Depois do sinal, cada worker tem até `drenagem_segundos` (padrão:
+    INGESTAO_DRENAGEM_SEGUNDOS) para terminar o job em andamento; os que
+    passarem do prazo são cancelados e seus jobs voltam para a fila.
+    """
+    if drenagem_segundos is None:
+        drenagem_segundos = settings.INGESTAO_DRENAGEM_SEGUNDOS
+    tarefas = [asyncio.create_task(_loop_worker(i + 1, parar)) for i in range(quantidade)]
+    if settings.EXTRACAO_IA_INTERVALO_SEGUNDOS > 0:
+        tarefas.append(asyncio.create_task(_loop_extracao(parar)))
+    try:
+        await parar.wait()
+        logger.info(f"WORKERS: parando; aguardando até {drenagem_segundos:.0f}s os jobs em andamento.")
+        _, pendentes = await asyncio.wait(tarefas, timeout=drenagem_segundos)
+        if pendentes:
+            logger.warning(f"WORKERS: {len(pendentes)} worker(s) não terminaram a tempo e serão cancelados.")
+    finally:
+        for tarefa in tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+        await fechar_media_client()
@@ -0,0 +1,76 @@
+import asyncio
+import hashlib
+import logging
+from urllib.parse import urlsplit
+
+import anyio
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Cliente único durante a vida do processo: reaproveita conexões (keep-alive/HTTP2)
+# em vez de fazer um handshake TLS novo para cada foto.
+_client: httpx.AsyncClient | None = None
+_semaforos_por_host: dict[str, asyncio.Semaphore] = {}
+
+
+def get_media_client() -> httpx.AsyncClient:
+    """Retorna o cliente HTTP compartilhado, criando-o no primeiro uso."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            auth=(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN),
+            follow_redirects=True,
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=settings.MIDIA_MAX_CONEXOES,
+                max_keepalive_connections=settings.MIDIA_MAX_CONEXOES,
+            ),
+            timeout=httpx.Timeout(
+                settings.MIDIA_TIMEOUT_LEITURA_SEGUNDOS,
+                connect=settings.MIDIA_TIMEOUT_CONEXAO_SEGUNDOS,
+            ),
+        )
+    return _client
+
+
+async def fechar_media_client():
+    """Fecha o cliente compartilhado (chamar no desligamento do processo)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _semaforos_por_host.clear()
+
+
+def _semaforo(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc
+    if host not in _semaforos_por_host:
+        _semaforos_por_host[host] = asyncio.Semaphore(settings.MIDIA_MAX_CONCORRENTES_POR_HOST)
+    return _semaforos_por_host[host]
+
+
+async def baixar_para_arquivo(url: str, destino: str) -> tuple[str, int, str]:
+    """
+    Baixa `url` direto para o arquivo `destino`, em chunks, sem manter a mídia
+    inteira em memória. O SHA-256 é calculado na mesma passada.
+
+    Returns:
+        tuple[str, int, str]: o content-type informado pelo servidor, o total de
+        bytes gravados e o SHA-256 (hex) do conteúdo.
+    """
+    client = get_media_client()
+    tamanho = 0
+    sha256 = hashlib.sha256()
+    async with _semaforo(url):
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()  # Lança uma exceção se o status não for 2xx
+            content_type = response.headers.get("content-type", "image/jpeg")
+            async with await anyio.open_file(destino, "wb") as arquivo:
+                async for chunk in response.aiter_bytes(settings.MIDIA_CHUNK_BYTES):
+                    await arquivo.write(chunk)
+                    sha256.update(chunk)
+                    tamanho += len(chunk)
+    return content_type, tamanho, sha256.hexdigest()
@@ -0,0 +1,156 @@
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db import models
+from app.crud import blob as crud_blob
+from app.core.uploads import detectar_tipo
+from app.services.imagens import TAMANHOS_DERIVADOS, nome_derivado
+from app.services.storage import get_storage, chave_conteudo, DIRETORIO_TEMPORARIO
+
+logger = logging.getLogger(__name__)
+
+# Onde as fotos ficavam antes do storage endereçado por conteúdo
+DIRETORIO_FOTOS_LEGADO = settings.LEGADO_FOTOS_DIR
+
+
+def _copiar_para_storage(caminho: str) -> dict | None:
+    """
+    Copia um arquivo legado para o storage (sem apagar o original) e retorna os
+    dados do blob no formato de `crud.blob.adicionar_referencia`, ou None se o
+    arquivo não existir mais.
+    """
+    if not os.path.exists(caminho):
+        return None
+
+    sha256 = hashlib.sha256()
+    tamanho = 0
+    with open(caminho, "rb") as arquivo:
+        inicio = arquivo.read(16)
+        arquivo.seek(0)
+        for chunk in iter(lambda: arquivo.read(1024 * 1024), b""):
+            sha256.update(chunk)
+            tamanho += len(chunk)
+
+    tipo = detectar_tipo(inicio)
+    if tipo:
+        content_type, extensao = tipo
+    else:
+        extensao = os.path.splitext(caminho)[1].lstrip(".").lower() or "bin"
+        content_type = "application/octet-stream"
+
+    chave = chave_conteudo(sha256.hexdigest(), extensao)
+    storage = get_storage()
+    if not storage.existe(chave):
+        os.makedirs(DIRETORIO_TEMPORARIO, exist_ok=True)
+        temporario = os.path.join(DIRETORIO_TEMPORARIO, f"{uuid.uuid4()}.part")
+        shutil.copyfile(caminho, temporario)
+        storage.salvar_arquivo(temporario, chave)
+
+    return {"sha256": sha256.hexdigest(), "chave": chave, "content_type": content_type, "tamanho": tamanho}
+
+
+def _remover_arquivos(caminhos: list[str]) -> None:
+    for caminho in caminhos:
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+
+def migrar_fotos(db: Session, lote: int = 200, manter_originais: bool = False) -> tuple[int, int]:
+    """
+    Move as fotos com arquivo em `uploads/fotos_promotores` para o storage,
+    registrando a referência ao blob. Os derivados antigos são descartados
+    (rode `manage.py gerar-derivados` em seguida).
+
+    Returns:
+        tuple[int, int]: fotos migradas e fotos cujo arquivo não foi encontrado.
+    """
+    storage = get_storage()
+    migradas, faltando, ultimo_id = 0, 0, 0
+    while True:
+        fotos = (
+            db.query(models.FotoPromotor)
+            .filter(models.FotoPromotor.blob_sha256.is_(None), models.FotoPromotor.id > ultimo_id)
+            .order_by(models.FotoPromotor.id)
+            .limit(lote)
+            .all()
+        )
+        if not fotos:
+            break
+        ultimo_id = fotos[-1].id
+
+        a_remover = []
+        for foto in fotos:
+            caminho = os.path.join(DIRETORIO_FOTOS_LEGADO, foto.nome_arquivo_servidor)
+            blob = _copiar_para_storage(caminho)
+            if blob is None:
+                faltando += 1
+                logger.warning(f"Foto {foto.id}: arquivo {caminho} não encontrado.")
+                continue
+            crud_blob.adicionar_referencia(db, **blob)
+            foto.blob_sha256 = blob["sha256"]
+            foto.url_foto = storage.url(blob["chave"])
+            foto.url_miniatura = foto.url_preview = foto.url_grande = None
+            a_remover.append(caminho)
+            a_remover.extend(
+                os.path.join(DIRETORIO_FOTOS_LEGADO, nome_derivado(foto.nome_arquivo_servidor, tamanho))
+                for tamanho in TAMANHOS_DERIVADOS.values()
+            )
+            migradas += 1
+
+        db.commit()
+        # Só apaga os originais depois que o banco já aponta para o storage
+        if not manter_originais:
+            _remover_arquivos(a_remover)
+        logger.info(f"... {migradas} foto(s) migrada(s) até o ID {ultimo_id}")
+
+    return migradas, faltando
+
+
+def migrar_contratos(db: Session, lote: int = 200, manter_originais: bool = False) -> tuple[int, int]:
+    """
+    Move os contratos gravados fora do storage para ele. Depois da migração,
+    `caminho_arquivo` guarda a chave do blob.
+
+    Returns:
+        tuple[int, int]: contratos migrados e contratos cujo arquivo não foi encontrado.
+    """
+    migrados, faltando, ultimo_id = 0, 0, 0
+    while True:
+        contratos = (
+            db.query(models.Contrato)
+            .filter(models.Contrato.blob_sha256.is_(None), models.Contrato.id > ultimo_id)
+            .order_by(models.Contrato.id)
+            .limit(lote)
+            .all()
+        )
+        if not contratos:
+            break
+        ultimo_id = contratos[-1].id
+
+        a_remover = []
+        for contrato in contratos:
+            caminho = contrato.caminho_arquivo
+            blob = _copiar_para_storage(caminho)
+            if blob is None:
+                faltando += 1
+                logger.warning(f"Contrato {contrato.id}: arquivo {caminho} não encontrado.")
+                continue
+            crud_blob.adicionar_referencia(db, **blob)
+            contrato.blob_sha256 = blob["sha256"]
+            contrato.sha256 = blob["sha256"]
+            contrato.caminho_arquivo = blob["chave"]
+            a_remover.append(caminho)
+            migrados += 1
+
+        db.commit()
+        if not manter_originais:
+            _remover_arquivos(a_remover)
+        logger.info(f"... {migrados} contrato(s) migrado(s) até o ID {ultimo_id}")
+
+    return migrados, faltando
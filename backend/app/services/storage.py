@@ -0,0 +1,119 @@
+import os
+import shutil
+from abc import ABC, abstractmethod
+
+from app.core.config import settings
+
+# Onde downloads e uploads ficam até irem para o storage. Fica dentro de
+# STORAGE_DIR para que a mudança para o storage local seja um rename atômico.
+DIRETORIO_TEMPORARIO = os.path.join(settings.STORAGE_DIR, "tmp")
+
+
+def chave_conteudo(sha256: str, extensao: str) -> str:
+    """Chave fragmentada pelo hash: 'abcd12...' -> 'ab/cd/abcd12....jpg'."""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}.{extensao}"
+
+
+def chave_vizinha(chave: str, nome_arquivo: str) -> str:
+    """Chave de um arquivo no mesmo "diretório" de `chave` (ex.: os derivados de uma foto)."""
+    diretorio = chave.rsplit("/", 1)[0]
+    return f"{diretorio}/{nome_arquivo}"
+
+
+class Storage(ABC):
+    """
+    Interface dos backends de armazenamento de blobs. Cada conteúdo é gravado
+    uma única vez, sob a chave derivada do seu SHA-256 (ver `chave_conteudo`);
+    quem referencia o blob é contado na tabela `blobs`.
+    """
+
+    @abstractmethod
+    def existe(self, chave: str) -> bool: ...
+
+    @abstractmethod
+    def salvar_arquivo(self, caminho_origem: str, chave: str) -> None:
+        """
+        Move o arquivo local `caminho_origem` para `chave`. Se o conteúdo já
+        existir, o arquivo de origem é apenas descartado (deduplicação).
+        """
+
+    @abstractmethod
+    def remover(self, chave: str) -> None: ...
+
+    @abstractmethod
+    def caminho_local(self, chave: str) -> str:
+        """Caminho no disco local (para processar a imagem ou servir o arquivo)."""
+
+    def url(self, chave: str) -> str:
+        return f"{settings.STORAGE_URL_PREFIXO}/{chave}"
+
+
+class ArmazenamentoLocal(Storage):
+    """Blobs no sistema de arquivos local, em `raiz/ab/cd/<sha256>.<ext>`."""
+
+    def __init__(self, raiz: str):
+        self.raiz = raiz
+
+    def caminho_local(self, chave: str) -> str:
+        caminho = os.path.normpath(os.path.join(self.raiz, chave))
+        # Nunca deixa uma chave escapar da raiz (ex.: '../../etc/passwd')
+        if not caminho.startswith(os.path.normpath(self.raiz) + os.sep):
+            raise ValueError(f"Chave inválida: {chave}")
+        return caminho
+
+    def existe(self, chave: str) -> bool:
+        return os.path.exists(self.caminho_local(chave))
+
+    def salvar_arquivo(self, caminho_origem: str, chave: str) -> None:
+        destino = self.caminho_local(chave)
+        if os.path.exists(destino):
+            os.remove(caminho_origem)
+            return
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        try:
+            # Atômico no mesmo sistema de arquivos: o blob nunca aparece pela metade
+            os.replace(caminho_origem, destino)
+        except OSError:
+            # Origem em outro sistema de arquivos: copia para o lado e renomeia
+            temporario = f"{destino}.part"
+            shutil.copyfile(caminho_origem, temporario)
+            os.replace(temporario, destino)
+            os.remove(caminho_origem)
+
+    def remover(self, chave: str) -> None:
+        caminho = self.caminho_local(chave)
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+
+def copiar_entre(origem: Storage, destino: Storage, chave: str) -> None:
+    """Copia `chave` de um backend para outro, sem apagar da origem."""
+    os.makedirs(DIRETORIO_TEMPORARIO, exist_ok=True)
+    temporario = os.path.join(DIRETORIO_TEMPORARIO, f"{chave.replace('/', '_')}.copia")
+    shutil.copyfile(origem.caminho_local(chave), temporario)
+    destino.salvar_arquivo(temporario, chave)
+
+
+_storage: Storage | None = None
+_storage_frio: Storage | None = None
+
+
+def get_storage() -> Storage:
+    """
+    Retorna o backend configurado em STORAGE_BACKEND. Só 'local' existe por
+    enquanto; um backend S3-compatível deve implementar a interface `Storage`.
+    """
+    global _storage
+    if _storage is None:
+        if settings.STORAGE_BACKEND != "local":
+            raise ValueError(f"STORAGE_BACKEND desconhecido: {settings.STORAGE_BACKEND}")
+        _storage = ArmazenamentoLocal(settings.STORAGE_DIR)
+    return _storage
+
+
+def get_storage_frio() -> Storage:
+    """Storage das mídias arquivadas (STORAGE_FRIO_DIR), com a mesma interface e as mesmas chaves."""
+    global _storage_frio
+    if _storage_frio is None:
+        _storage_frio = ArmazenamentoLocal(settings.STORAGE_FRIO_DIR)
+    return _storage_frio
@@ -0,0 +1,48 @@
+# /backend/gunicorn.conf.py
+#
+# Perfil de produção: gunicorn gerenciando workers uvicorn (um event loop por
+# núcleo). Tudo pode ser sobrescrito por variáveis de ambiente.
+import os
+
+from app.core.config import settings
+
+
+def _nucleos_disponiveis() -> int:
+    # Respeita o limite de CPUs do container/cgroup quando o SO informa
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+# Workers assíncronos: um por núcleo já satura a CPU; WEB_CONCURRENCY fixa o número
+workers = int(os.getenv("WEB_CONCURRENCY") or 0) or _nucleos_disponiveis()
+
+# Importa o app uma vez no processo mestre: os workers herdam o código já
+# carregado (copy-on-write), sobem mais rápido e usam menos memória.
+preload_app = True
+
+# Desligamento: tempo para drenar os requests e a ingestão embutida (INGESTAO_WORKERS_NA_API)
+graceful_timeout = int(settings.INGESTAO_DRENAGEM_SEGUNDOS) + 10
+timeout = 120 # Streaming da IA e uploads grandes
+keepalive = 5
+
+# Recicla os workers de tempos em tempos (limita vazamentos de memória), sem todos ao mesmo tempo
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+
+def post_fork(server, worker):
+    # O preload criou os engines no processo mestre: cada worker começa com pools próprios
+    from app.db.connection import descartar_conexoes_herdadas
+    descartar_conexoes_herdadas()
+
+
+def on_starting(server):
+    server.log.info(f"Iniciando {workers} worker(s) uvicorn (preload ativo).")
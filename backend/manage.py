@@ -4,7 +4,7 @@ from sqlalchemy.orm import Session
 import click
 
 # <<<< CORREÇÃO: As importações agora começam com 'app.' >>>>
-from app.db.connection import get_db
+from app.db.connection import get_db, get_db_lote
 from app.crud import usuario as crud_usuario
 from app.schemas import usuario as schemas_usuario
 from app.db import models
@@ -66,5 +66,343 @@ def list_users():
     finally:
         db.close()
 
+@cli_app.command()
+def ingestao_worker(
+    workers: int = typer.Option(None, help="Número de workers concorrentes (padrão: INGESTAO_WORKERS)."),
+):
+    """Consome a fila de ingestão de fotos do WhatsApp até receber SIGINT/SIGTERM."""
+    import asyncio
+    import signal
+    import logging
+    from app.core.config import settings
+    from app.services.ingestao_worker import executar_workers
+
+    logging.basicConfig(level=logging.INFO)
+    quantidade = workers or settings.INGESTAO_WORKERS
+
+    async def principal():
+        parar = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sinal in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sinal, parar.set)
+        await executar_workers(quantidade, parar)
+
+    print(f"--- 📥 Iniciando {quantidade} worker(s) de ingestão ---")
+    asyncio.run(principal())
+
+@cli_app.command()
+def reprocessar_mortos():
+    """Devolve para a fila os jobs de ingestão que foram para o dead-letter."""
+    from app.crud import ingestao as crud_ingestao
+    db: Session = next(get_db())
+    try:
+        total = crud_ingestao.reprocessar_mortos(db)
+        print(f"{total} job(s) devolvido(s) para a fila.")
+    finally:
+        db.close()
+
+@cli_app.command()
+def gerar_derivados(
+    processos: int = typer.Option(None, help="Número de processos (padrão: número de CPUs)."),
+    lote: int = typer.Option(200, help="Quantidade de fotos buscadas no banco por vez."),
+):
+    """Gera miniatura/preview/grande para as fotos que ainda não os têm."""
+    from concurrent.futures import ProcessPoolExecutor
+    from app.crud import foto_promotor as crud_foto
+    from app.services.imagens import gerar_derivados as gerar
+    from app.services.storage import get_storage, chave_vizinha
+
+    print("--- 🖼️  Gerando derivados das fotos existentes ---")
+    storage = get_storage()
+    db: Session = next(get_db_lote())
+    ultimo_id, gerados, falhas = 0, 0, 0
+    try:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            while True:
+                fotos = crud_foto.get_fotos_sem_derivados(db, apos_id=ultimo_id, limite=lote)
+                if not fotos:
+                    break
+                ultimo_id = fotos[-1].id
+
+                futuros = [executor.submit(gerar, storage.caminho_local(f.blob.chave)) for f in fotos]
+                for foto, futuro in zip(fotos, futuros):
+                    try:
+                        derivados = futuro.result()
+                    except Exception as e:
+                        falhas += 1
+                        print(f"❌ Foto {foto.id} ({foto.blob.chave}): {e}")
+                        continue
+                    urls = {nome: storage.url(chave_vizinha(foto.blob.chave, arquivo)) for nome, arquivo in derivados.items()}
+                    crud_foto.atualizar_derivados(db, foto.id, urls)
+                    gerados += 1
+                db.commit()
+                print(f"... {gerados} foto(s) processada(s) até o ID {ultimo_id}")
+    finally:
+        db.close()
+
+    print(f"\n--- ✅ Concluído: {gerados} foto(s) com derivados, {falhas} falha(s). ---")
+
+@cli_app.command()
+def detectar_duplicatas(
+    processos: int = typer.Option(None, help="Número de processos (padrão: número de CPUs)."),
+    lote: int = typer.Option(200, help="Quantidade de fotos buscadas no banco por vez."),
+):
+    """Calcula o hash perceptual das fotos antigas, remarca as quase-duplicatas e reconstrói os KPIs."""
+    from concurrent.futures import ProcessPoolExecutor
+    from app.crud import foto_promotor as crud_foto
+    from app.services.imagens import calcular_dhash
+    from app.services.storage import get_storage
+
+    print("--- 🔍 Calculando hashes perceptuais das fotos existentes ---")
+    storage = get_storage()
+    db: Session = next(get_db_lote())
+    ultimo_id, calculados, falhas = 0, 0, 0
+    try:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            while True:
+                fotos = crud_foto.get_fotos_sem_phash(db, apos_id=ultimo_id, limite=lote)
+                if not fotos:
+                    break
+                ultimo_id = fotos[-1].id
+
+                futuros = [executor.submit(calcular_dhash, storage.caminho_local(f.blob.chave)) for f in fotos]
+                for foto, futuro in zip(fotos, futuros):
+                    try:
+                        phash = futuro.result()
+                    except Exception as e:
+                        falhas += 1
+                        print(f"❌ Foto {foto.id} ({foto.blob.chave}): {e}")
+                        continue
+                    crud_foto.atualizar_phash(db, foto.id, phash)
+                    calculados += 1
+                db.commit()
+                print(f"... {calculados} foto(s) processada(s) até o ID {ultimo_id}")
+
+        marcadas = crud_foto.marcar_duplicatas(db)
+        linhas = crud_foto.reconstruir_kpis(db)
+    finally:
+        db.close()
+
+    print(f"\n--- ✅ {calculados} hash(es) calculado(s), {falhas} falha(s). ---")
+    print(f"{marcadas} foto(s) marcada(s) como quase-duplicata; rollup de KPIs reconstruído ({linhas} linha(s)).")
+
+@cli_app.command()
+def reconstruir_kpis():
+    """Recalcula do zero o rollup diário usado pelos KPIs do dashboard."""
+    from app.crud import foto_promotor as crud_foto
+    db: Session = next(get_db_lote())
+    try:
+        linhas = crud_foto.reconstruir_kpis(db)
+        print(f"--- ✅ Rollup de KPIs reconstruído: {linhas} linha(s). ---")
+    finally:
+        db.close()
+
+@cli_app.command()
+def importar_lojas(
+    arquivo: str = typer.Argument(..., help="CSV com as colunas nome;cidade;apelidos (apelidos separados por '|')."),
+    empresa_id: int = typer.Option(..., help="ID da empresa dona das lojas."),
+):
+    """Cadastra (ou atualiza os apelidos de) lojas usadas na extração de loja/cidade das legendas."""
+    import csv
+    from app.crud import loja as crud_loja
+
+    db: Session = next(get_db_lote())
+    importadas = 0
+    try:
+        with open(arquivo, newline="", encoding="utf-8-sig") as entrada:
+            for linha in csv.DictReader(entrada, delimiter=";"):
+                nome, cidade = (linha.get("nome") or "").strip(), (linha.get("cidade") or "").strip()
+                if not nome or not cidade:
+                    print(f"⚠️  Linha ignorada (sem nome ou cidade): {linha}")
+                    continue
+                apelidos = [a.strip() for a in (linha.get("apelidos") or "").split("|") if a.strip()]
+                crud_loja.salvar_loja(db, empresa_id, nome, cidade, apelidos)
+                importadas += 1
+        db.commit()
+    finally:
+        db.close()
+    print(f"--- ✅ {importadas} loja(s) importada(s) para a empresa {empresa_id}. ---")
+    print("Rode `python manage.py extrair-lojas` para reprocessar as legendas pendentes.")
+
+@cli_app.command()
+def extrair_lojas(
+    lote: int = typer.Option(500, help="Quantidade de fotos buscadas no banco por vez."),
+    usar_ia: bool = typer.Option(True, help="Manda para a IA (em lotes) as legendas que o dicionário não resolveu."),
+    limite: int = typer.Option(None, help="Máximo de fotos pendentes processadas nesta execução."),
+):
+    """
+    Preenche loja/cidade das fotos a partir das legendas: primeiro pelo
+    dicionário de lojas de cada empresa e, para o que sobrar, pela IA.
+    O worker de ingestão já esvazia as pendentes aos poucos; este comando é para
+    o histórico (fotos de antes da extração) e para rodadas grandes.
+    """
+    import logging
+    from app.services import ai_service, extracao_legenda
+
+    logging.basicConfig(level=logging.INFO)
+    print("--- 🏪 Extraindo loja/cidade das legendas ---")
+    db: Session = next(get_db_lote())
+    try:
+        locais, pendentes = extracao_legenda.extrair_historico(db, lote=lote)
+        print(f"Histórico: {locais} resolvida(s) pelo dicionário, {pendentes} pendente(s).")
+        if not usar_ia:
+            return
+        try:
+            locais, pela_ia, sem_resultado = extracao_legenda.processar_pendentes(
+                db, ai_service.get_cliente_ia(), lote=lote, limite_fotos=limite
+            )
+        except (ai_service.ErroIA, ValueError) as e:
+            print(f"\n❌ Extração pela IA interrompida (o que faltou continua pendente): {e}")
+            raise typer.Exit(code=1)
+    finally:
+        db.close()
+
+    print(f"\n--- ✅ Pendentes: {locais} pelo dicionário, {pela_ia} pela IA, {sem_resultado} sem resultado. ---")
+
+@cli_app.command()
+def atualizar_paineis():
+    """Reconstrói do zero o painel de lojas, cidades e horários (normalmente mantido a cada foto)."""
+    import time
+    from app.crud import agregados as crud_agregados
+    db: Session = next(get_db_lote())
+    try:
+        inicio = time.perf_counter()
+        linhas = crud_agregados.reconstruir_paineis(db)
+        print(f"--- ✅ Painéis reconstruídos em {time.perf_counter() - inicio:.1f}s ({linhas} linha(s)). ---")
+    finally:
+        db.close()
+
+@cli_app.command()
+def migrar():
+    """Aplica as migrações pendentes do esquema (o prestart faz o mesmo a cada boot)."""
+    import logging
+    from app.db import migracoes
+
+    logging.basicConfig(level=logging.INFO)
+    aplicadas = migracoes.aplicar_pendentes()
+    print(f"--- ✅ {len(aplicadas)} migração(ões) aplicada(s). ---" if aplicadas else "Esquema já atualizado.")
+
+@cli_app.command()
+def status_migracoes():
+    """Lista as migrações do esquema e quais já foram aplicadas."""
+    from app.db import migracoes
+    from app.db.connection import criar_engine_administrativo
+
+    engine = criar_engine_administrativo()
+    try:
+        with engine.begin() as conexao:
+            aplicadas = migracoes.aplicadas(conexao)
+    finally:
+        engine.dispose()
+    for versao, modulo in migracoes.disponiveis():
+        quando = aplicadas.get(versao)
+        marca = f"✅ {quando:%Y-%m-%d %H:%M}" if quando else "⏳ pendente"
+        print(f"{marca}  {versao}: {modulo.DESCRICAO}")
+
+@cli_app.command()
+def garantir_particoes(
+    meses_a_frente: int = typer.Option(None, help="Meses futuros com partição criada (padrão: PARTICOES_MESES_A_FRENTE)."),
+):
+    """Cria as partições mensais de fotos_promotores que ainda faltam (rodar diariamente, ex.: cron)."""
+    from app.db.connection import engine
+    from app.db import particoes
+
+    with engine.begin() as conexao:
+        if not particoes.tabela_particionada(conexao):
+            print("❌ fotos_promotores não é particionada: rode `python manage.py particionar-fotos` antes.")
+            raise typer.Exit(code=1)
+        nomes = particoes.garantir_particoes(conexao, meses_a_frente=meses_a_frente)
+    print(f"--- ✅ Partições garantidas: {nomes[0]} ... {nomes[-1]}. ---")
+
+@cli_app.command()
+def particionar_fotos():
+    """
+    Converte uma fotos_promotores antiga (sem partições) na tabela particionada
+    por mês, copiando as fotos. Trava a tabela durante a cópia: rode numa
+    janela de manutenção, com a API e os workers de ingestão parados.
+    """
+    import logging
+    from app.db.connection import engine
+    from app.db import particoes
+
+    logging.basicConfig(level=logging.INFO)
+    print("--- 🗂️  Particionando fotos_promotores por mês ---")
+    with engine.begin() as conexao:
+        if particoes.tabela_particionada(conexao):
+            print("A tabela já é particionada; nada a fazer.")
+            return
+        # A cópia inteira não cabe no statement_timeout configurado para as rotas
+        conexao.exec_driver_sql("SET LOCAL statement_timeout = 0")
+        copiadas = particoes.particionar_tabela_existente(conexao)
+    print(f"--- ✅ {copiadas} foto(s) copiada(s) para a tabela particionada. ---")
+
+@cli_app.command()
+def arquivar_fotos(
+    meses: int = typer.Option(None, help="Meses mantidos na tabela principal (padrão: RETENCAO_MESES)."),
+    apagar_tabela: bool = typer.Option(False, help="Apaga a tabela da partição depois de arquivar (em vez de mantê-la como arquivo_*)."),
+    simular: bool = typer.Option(False, help="Só lista as partições que seriam arquivadas."),
+):
+    """
+    Retenção: desanexa as partições mensais mais antigas que a retenção e move
+    para o storage frio as mídias que deixaram de ser referenciadas.
+    """
+    import logging
+    from datetime import date
+    from app.core.config import settings
+    from app.db.particoes import inicio_do_mes, somar_meses
+    from app.services import arquivamento
+
+    logging.basicConfig(level=logging.INFO)
+    limite = somar_meses(inicio_do_mes(date.today()), -(meses or settings.RETENCAO_MESES))
+    db: Session = next(get_db_lote())
+    try:
+        # Arquivamentos interrompidos depois do DETACH: termina de soltar as referências
+        for arquivo in arquivamento.arquivos_pendentes(db):
+            if simular:
+                print(f"- {arquivo}: referências pendentes (simulação)")
+                continue
+            resultado = arquivamento.concluir_arquivo(db, arquivo, apagar_tabela=apagar_tabela)
+            print(f"✅ {arquivo} (retomado): {resultado['fotos']} foto(s), {resultado['arquivos_movidos']} arquivo(s) no storage frio.")
+
+        expiradas = arquivamento.particoes_expiradas(db, limite)
+        db.rollback()
+        if not expiradas:
+            print(f"Nenhuma partição anterior a {limite:%m/%Y} para arquivar.")
+            return
+        print(f"--- 🧊 Arquivando {len(expiradas)} partição(ões) anterior(es) a {limite:%m/%Y} ---")
+        for nome, _ in expiradas:
+            if simular:
+                print(f"- {nome} (simulação)")
+                continue
+            resultado = arquivamento.arquivar_particao(db, nome, apagar_tabela=apagar_tabela)
+            destino = f"tabela {resultado['tabela']}" if resultado["tabela"] else "tabela apagada"
+            print(f"✅ {nome}: {resultado['fotos']} foto(s), {resultado['arquivos_movidos']} arquivo(s) no storage frio ({destino}).")
+    finally:
+        db.close()
+
+@cli_app.command()
+def migrar_storage(
+    lote: int = typer.Option(200, help="Quantidade de registros processados por transação."),
+    manter_originais: bool = typer.Option(False, help="Não apaga os arquivos antigos depois de migrar."),
+):
+    """Move fotos e contratos antigos (nomeados por UUID) para o storage endereçado por conteúdo."""
+    import logging
+    from app.services import migracao_storage
+
+    logging.basicConfig(level=logging.INFO)
+    print("--- 📦 Migrando arquivos para o storage endereçado por conteúdo ---")
+    db: Session = next(get_db_lote())
+    try:
+        fotos, fotos_faltando = migracao_storage.migrar_fotos(db, lote=lote, manter_originais=manter_originais)
+        contratos, contratos_faltando = migracao_storage.migrar_contratos(db, lote=lote, manter_originais=manter_originais)
+    finally:
+        db.close()
+
+    print(f"\n--- ✅ {fotos} foto(s) e {contratos} contrato(s) migrados. ---")
+    if fotos_faltando or contratos_faltando:
+        print(f"⚠️  Arquivos não encontrados: {fotos_faltando} foto(s), {contratos_faltando} contrato(s).")
+    if fotos:
+        print("Rode `python manage.py gerar-derivados` para recriar as miniaturas.")
+
 if __name__ == "__main__":
     cli_app()
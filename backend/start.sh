@@ -3,8 +3,8 @@
 # Sair imediatamente se um comando falhar
 set -e
 
-# Executar o script de pre-inicialização do Python para criar as tabelas
-echo "==> Executando prestart.py para garantir que as tabelas existem..."
+# Pré-inicialização: espera o banco (backoff) e aplica as migrações pendentes
+echo "==> Executando prestart.py (banco + migrações)..."
 python -m app.prestart
 echo "==> prestart.py concluído."
 
@@ -14,6 +14,8 @@ python -m app.create_superuser
 echo "==> create_superuser.py concluído."
 
 
-# Iniciar o servidor Uvicorn como o processo principal
-echo "==> Iniciando o servidor Uvicorn..."
-exec uvicorn app.main:app --host 0.0.0.0 --port ${PORT:-8000} --workers 1
\ No newline at end of file
+# Iniciar o servidor como o processo principal: gunicorn com um worker uvicorn
+# por núcleo (ver gunicorn.conf.py). Para desenvolvimento local, com reload:
+#   uvicorn app.main:app --reload
+echo "==> Iniciando o servidor (gunicorn + uvicorn workers)..."
+exec gunicorn app.main:app -c gunicorn.conf.py
\ No newline at end of file
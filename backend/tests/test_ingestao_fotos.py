@@ -0,0 +1,134 @@
+import hashlib
+import io
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from PIL import Image
+
+from app.crud import ingestao as crud_ingestao
+from app.db import models
+from app.services import ingestao_fotos, ingestao_worker
+from app.services.ingestao_fotos import ErroPermanente, ErroTemporario, process_foto_whatsapp
+from app.services.storage import DIRETORIO_TEMPORARIO, chave_conteudo, get_storage
+
+pytestmark = pytest.mark.anyio
+
+NUMERO = "whatsapp:+5511900000000"
+
+
+@pytest.fixture
+def jpeg() -> bytes:
+    saida = io.BytesIO()
+    Image.new("RGB", (640, 480), (200, 40, 40)).save(saida, "JPEG")
+    return saida.getvalue()
+
+
+@pytest.fixture
+def registros(monkeypatch):
+    """Sem banco: um promotor fixo, e cada foto "registrada" fica na lista."""
+    registradas = []
+    monkeypatch.setattr(ingestao_fotos, "_buscar_promotor", lambda numero: (7, "Promotor", 3))
+    monkeypatch.setattr(ingestao_fotos, "_registrar_foto", lambda *args: registradas.append(args))
+    return registradas
+
+
+def _temporarios() -> list[str]:
+    return os.listdir(DIRETORIO_TEMPORARIO) if os.path.isdir(DIRETORIO_TEMPORARIO) else []
+
+
+async def test_foto_vai_para_o_storage_pelo_sha256(servidor_midia, registros, jpeg):
+    servidor_midia.rotas["/midia/1"] = (200, {"Content-Type": "image/jpeg"}, jpeg)
+
+    await process_foto_whatsapp(1, "reserva", NUMERO, servidor_midia.url("/midia/1"), "Loja Centro")
+
+    sha256 = hashlib.sha256(jpeg).hexdigest()
+    chave = chave_conteudo(sha256, "jpg")
+    with open(get_storage().caminho_local(chave), "rb") as arquivo:
+        assert arquivo.read() == jpeg
+    (job_id, reserva, url_foto, _, legenda, promotor_id, empresa_id, derivados, blob, phash), = registros
+    assert (job_id, reserva, legenda, promotor_id, empresa_id) == (1, "reserva", "Loja Centro", 7, 3)
+    assert blob == {"sha256": sha256, "chave": chave, "content_type": "image/jpeg", "tamanho": len(jpeg)}
+    assert url_foto == get_storage().url(chave)
+    assert set(derivados) == {"grande", "preview", "miniatura"}
+    assert phash is not None
+    assert not _temporarios()
+
+
+async def test_503_reagenda_respeitando_o_retry_after(servidor_midia, registros):
+    servidor_midia.rotas["/midia/1"] = (503, {"Retry-After": "120"}, b"")
+
+    with pytest.raises(ErroTemporario) as erro:
+        await process_foto_whatsapp(1, "reserva", NUMERO, servidor_midia.url("/midia/1"), None)
+
+    assert erro.value.espera_segundos == 120
+    assert not registros
+    assert not _temporarios()
+
+
+async def test_404_vai_direto_para_o_dead_letter(servidor_midia, registros):
+    with pytest.raises(ErroPermanente):
+        await process_foto_whatsapp(1, "reserva", NUMERO, servidor_midia.url("/nao-existe"), None)
+    assert not registros
+
+
+@pytest.fixture
+def job(db, empresa):
+    """Promotor com WhatsApp na empresa de teste e um job dele na fila (removido no fim)."""
+    empresa_id, _ = empresa
+    db.add(models.Usuario(
+        nome="Promotor", email=f"promotor.{empresa_id}@example.com", hashed_password="!",
+        perfil="OPERADOR", empresa_id=empresa_id, whatsapp_number=f"{NUMERO}{empresa_id}", is_active=True,
+    ))
+    db.commit()
+    criados = []
+
+    def criar(media_url: str):
+        registro = crud_ingestao.enfileirar_foto(db, f"{NUMERO}{empresa_id}", media_url, "Loja Centro")
+        criados.append(registro.id)
+        return registro.id
+
+    yield criar
+    db.rollback()
+    db.query(models.IngestaoFoto).filter(models.IngestaoFoto.id.in_(criados)).delete(synchronize_session=False)
+    db.commit()
+
+
+def _reservar(db, job_id: int) -> str:
+    # Reserva exatamente este job (a fila do banco de teste pode ter outros)
+    registro = db.get(models.IngestaoFoto, job_id)
+    registro.status, registro.tentativas, registro.reserva = crud_ingestao.STATUS_PROCESSANDO, 1, "reserva-do-teste"
+    db.commit()
+    return registro.reserva
+
+
+async def test_worker_registra_a_foto_e_consome_o_job(db, empresa, job, servidor_midia, jpeg):
+    empresa_id, _ = empresa
+    servidor_midia.rotas["/midia/1"] = (200, {"Content-Type": "image/jpeg"}, jpeg)
+    job_id = job(servidor_midia.url("/midia/1"))
+    reserva = _reservar(db, job_id)
+
+    await process_foto_whatsapp(job_id, reserva, f"{NUMERO}{empresa_id}", servidor_midia.url("/midia/1"), "Loja Centro")
+
+    db.expire_all()
+    assert db.get(models.IngestaoFoto, job_id) is None
+    foto = db.query(models.FotoPromotor).filter(models.FotoPromotor.empresa_id == empresa_id).one()
+    assert foto.blob_sha256 == hashlib.sha256(jpeg).hexdigest()
+    assert foto.legenda == "Loja Centro"
+
+
+async def test_worker_reagenda_o_503_depois_do_retry_after(db, empresa, job, servidor_midia):
+    empresa_id, _ = empresa
+    servidor_midia.rotas["/midia/1"] = (503, {"Retry-After": "600"}, b"")
+    job_id = job(servidor_midia.url("/midia/1"))
+    reserva = _reservar(db, job_id)
+
+    with pytest.raises(ErroTemporario) as erro:
+        await process_foto_whatsapp(job_id, reserva, f"{NUMERO}{empresa_id}", servidor_midia.url("/midia/1"), None)
+    ingestao_worker._falhar(job_id, reserva, erro.value)
+
+    db.expire_all()
+    registro = db.get(models.IngestaoFoto, job_id)
+    assert registro.status == crud_ingestao.STATUS_PENDENTE
+    assert registro.disponivel_em >= datetime.now(timezone.utc) + timedelta(seconds=590)
+    assert "503" in registro.ultimo_erro
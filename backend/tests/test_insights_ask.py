@@ -0,0 +1,174 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.dependencies import create_access_token
+from app.main import app
+from app.services import ai_service
+
+pytestmark = pytest.mark.anyio
+
+PERGUNTA = {"question": "Qual loja recebeu mais fotos?"}
+
+
+class ClienteIAFalso(ai_service.ClienteGemini):
+    """
+    ClienteGemini sem o modelo de verdade: responde `partes` (uma por vez no
+    streaming, esperando `atraso` segundos antes de cada) ou levanta `erro`.
+    """
+
+    def __init__(self, partes=("As lojas ", "do centro ", "lideram."), atraso: float = 0.0, erro: Exception | None = None):
+        super().__init__(model=None)
+        self.partes, self.atraso, self.erro = list(partes), atraso, erro
+        self.prompts: list[str] = []
+        self.entregues = 0
+
+    async def gerar_async(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        if self.erro:
+            raise self.erro
+        await asyncio.sleep(self.atraso)
+        return "".join(self.partes)
+
+    async def gerar_stream(self, prompt: str):
+        self.prompts.append(prompt)
+        if self.erro:
+            raise self.erro
+        for parte in self.partes:
+            await asyncio.sleep(self.atraso)
+            self.entregues += 1
+            yield parte
+
+
+@pytest.fixture
+def cabecalhos(empresa):
+    _, email = empresa
+    return {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
+
+
+def _usar(cliente: ClienteIAFalso) -> ClienteIAFalso:
+    app.dependency_overrides[ai_service.get_cliente_ia] = lambda: cliente
+    return cliente
+
+
+def _eventos(corpo: str) -> list[tuple[str, dict]]:
+    eventos = []
+    for bloco in corpo.strip().split("\n\n"):
+        linhas = dict(linha.split(": ", 1) for linha in bloco.splitlines())
+        eventos.append((linhas["event"], json.loads(linhas["data"])))
+    return eventos
+
+
+async def test_ask_responde_e_repete_a_resposta_do_cache(cliente_api, cabecalhos):
+    cliente = _usar(ClienteIAFalso())
+
+    primeira = await cliente_api.post("/insights/ask", json=PERGUNTA, headers=cabecalhos)
+    segunda = await cliente_api.post("/insights/ask", json=PERGUNTA, headers=cabecalhos)
+
+    assert primeira.status_code == 200
+    assert primeira.json() == {"answer": "As lojas do centro lideram.", "question": PERGUNTA["question"]}
+    assert segunda.json() == primeira.json()
+    assert len(cliente.prompts) == 1
+    assert PERGUNTA["question"] in cliente.prompts[0]
+
+
+async def test_ask_erro_da_ia_vira_resposta_e_nao_entra_no_cache(cliente_api, cabecalhos):
+    cliente = _usar(ClienteIAFalso(erro=ai_service.ErroIA("IA fora do ar")))
+
+    resposta = await cliente_api.post("/insights/ask", json=PERGUNTA, headers=cabecalhos)
+    await cliente_api.post("/insights/ask", json=PERGUNTA, headers=cabecalhos)
+
+    assert resposta.json()["answer"] == "IA fora do ar"
+    assert len(cliente.prompts) == 2
+
+
+async def test_ask_exige_login(cliente_api):
+    _usar(ClienteIAFalso())
+
+    resposta = await cliente_api.post("/insights/ask", json=PERGUNTA)
+
+    assert resposta.status_code == 401
+
+
+async def test_stream_envia_os_tokens_e_guarda_a_resposta(cliente_api, cabecalhos):
+    cliente = _usar(ClienteIAFalso())
+
+    resposta = await cliente_api.post("/insights/ask/stream", json=PERGUNTA, headers=cabecalhos)
+    repetida = await cliente_api.post("/insights/ask/stream", json=PERGUNTA, headers=cabecalhos)
+
+    assert resposta.headers["content-type"].startswith("text/event-stream")
+    eventos = _eventos(resposta.text)
+    assert eventos == [("token", {"texto": parte}) for parte in cliente.partes] + [("fim", {"cache": False})]
+    assert _eventos(repetida.text) == [("token", {"texto": "As lojas do centro lideram."}), ("fim", {"cache": True})]
+    assert len(cliente.prompts) == 1
+
+
+async def test_stream_erro_da_ia(cliente_api, cabecalhos):
+    _usar(ClienteIAFalso(erro=ai_service.ErroIA("IA fora do ar")))
+
+    resposta = await cliente_api.post("/insights/ask/stream", json=PERGUNTA, headers=cabecalhos)
+
+    assert _eventos(resposta.text) == [("erro", {"detail": "IA fora do ar"})]
+
+
+async def test_stream_timeout(cliente_api, cabecalhos, monkeypatch):
+    monkeypatch.setattr(settings, "IA_STREAM_TIMEOUT_SEGUNDOS", 0.5)
+    cliente = _usar(ClienteIAFalso(atraso=0.3))
+
+    resposta = await cliente_api.post("/insights/ask/stream", json=PERGUNTA, headers=cabecalhos)
+    await cliente_api.post("/insights/ask/stream", json=PERGUNTA, headers=cabecalhos)
+
+    eventos = _eventos(resposta.text)
+    assert eventos[0] == ("token", {"texto": cliente.partes[0]})
+    assert eventos[-1][0] == "erro"
+    assert "demorou demais" in eventos[-1][1]["detail"]
+    # A resposta incompleta não foi para o cache: a segunda pergunta chamou a IA de novo
+    assert len(cliente.prompts) == 2
+
+
+# Com ASGI < 2.4 o próprio Starlette escuta a desconexão e cancela o stream; a
+# partir do 2.4 quem para é a checagem `is_disconnected` da rota
+@pytest.mark.parametrize("spec_version", ["2.0", "2.4"])
+async def test_stream_para_de_gerar_quando_o_cliente_desconecta(cliente_api, cabecalhos, spec_version):
+    # O httpx lê a resposta inteira: a desconexão é simulada chamando o app ASGI direto
+    cliente = _usar(ClienteIAFalso(partes=[f"parte {i} " for i in range(200)], atraso=0.01))
+    corpo = json.dumps(PERGUNTA).encode()
+    primeiro_token = asyncio.Event()
+    enviados: list[dict] = []
+    pediu_o_corpo = False
+
+    async def receive():
+        nonlocal pediu_o_corpo
+        if not pediu_o_corpo:
+            pediu_o_corpo = True
+            return {"type": "http.request", "body": corpo, "more_body": False}
+        await primeiro_token.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(mensagem):
+        enviados.append(mensagem)
+        if mensagem["type"] == "http.response.body" and b"event: token" in mensagem.get("body", b""):
+            primeiro_token.set()
+
+    escopo = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": spec_version}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/insights/ask/stream", "raw_path": b"/insights/ask/stream",
+        "root_path": "", "query_string": b"", "client": ("127.0.0.1", 5000), "server": ("teste", 80),
+        "headers": [
+            (b"host", b"teste"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(corpo)).encode()),
+            (b"authorization", cabecalhos["Authorization"].encode()),
+        ],
+    }
+    await asyncio.wait_for(app(escopo, receive, send), timeout=5)
+
+    corpo_enviado = b"".join(m.get("body", b"") for m in enviados if m["type"] == "http.response.body")
+    assert b"event: token" in corpo_enviado
+    assert b"event: fim" not in corpo_enviado
+    assert cliente.entregues < len(cliente.partes)
+    # Nada foi para o cache: a próxima pergunta chama a IA de novo
+    await cliente_api.post("/insights/ask", json=PERGUNTA, headers=cabecalhos)
+    assert len(cliente.prompts) == 2
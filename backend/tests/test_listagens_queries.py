@@ -0,0 +1,86 @@
+# As listagens da API rodam um número de queries que não depende do número de
+# linhas (sem N+1): cada rota é chamada com N linhas de cada tipo e de novo com
+# 10N, sob `contar_queries()`, e as duas contagens têm de ser iguais.
+
+import uuid
+
+import pytest
+from sqlalchemy import insert
+
+from app.crud import foto_promotor as crud_foto
+from app.db import models
+from app.db.contagem_queries import contar_queries
+from app.dependencies import create_access_token
+
+pytestmark = pytest.mark.anyio
+
+# Listagens verificadas (GET, com os parâmetros padrão)
+ROTAS = (
+    "/users",
+    "/contratos",
+    "/fotos",
+    "/insights/kpis",
+    "/insights/lojas/cobertura",
+    "/insights/cidades",
+    "/insights/heatmap",
+)
+LINHAS = 20
+
+
+def semear(db, empresa_id: int, inicio: int, quantidade: int) -> None:
+    """
+    `quantidade` promotores, cada um com um contrato, uma loja cadastrada e
+    uma foto (pelo caminho da ingestão, que também alimenta KPIs e painel).
+    """
+    indices = range(inicio, inicio + quantidade)
+    promotores = db.execute(
+        insert(models.Usuario).returning(models.Usuario.id),
+        [{
+            "nome": f"Promotor {i}", "email": f"promotor{i}.{empresa_id}@example.com",
+            "hashed_password": "!", "perfil": "OPERADOR", "empresa_id": empresa_id, "is_active": True,
+        } for i in indices],
+    ).scalars().all()
+    db.execute(insert(models.Contrato), [{
+        "nome_promotor": f"Promotor {i}", "cpf_promotor": "000.000.000-00",
+        "nome_arquivo_original": "contrato.pdf", "nome_arquivo_servidor": f"{uuid.uuid4()}.pdf",
+        "caminho_arquivo": f"testes/{uuid.uuid4()}.pdf", "usuario_id": promotor_id, "empresa_id": empresa_id,
+    } for i, promotor_id in zip(indices, promotores)])
+    db.execute(insert(models.Loja), [
+        {"empresa_id": empresa_id, "nome": f"Loja {i}", "cidade": f"Cidade {i % 10}"} for i in indices
+    ])
+    db.commit()
+    for i, promotor_id in zip(indices, promotores):
+        nome_arquivo = f"{uuid.uuid4()}.jpg"
+        crud_foto.create_foto_registro(
+            db, url_foto=f"/fotos-promotores/{nome_arquivo}", nome_arquivo=nome_arquivo,
+            legenda=f"Loja {i}", promotor_id=promotor_id, empresa_id=empresa_id,
+            loja=f"Loja {i}", cidade=f"Cidade {i % 10}", extracao_status="local",
+        )
+
+
+async def medir(cliente_api, cabecalhos: dict) -> dict[str, int | str]:
+    """
+    Queries de cada rota de ROTAS (ou o status HTTP, se a rota falhou). Cada
+    rota é chamada uma vez antes da medição, para que o cache do usuário
+    autenticado esteja igual nas duas rodadas.
+    """
+    contagens: dict[str, int | str] = {}
+    for rota in ROTAS:
+        await cliente_api.get(rota, headers=cabecalhos)
+        with contar_queries() as contagem:
+            resposta = await cliente_api.get(rota, headers=cabecalhos)
+        contagens[rota] = contagem.total if resposta.status_code == 200 else f"HTTP {resposta.status_code}"
+    return contagens
+
+
+async def test_listagens_rodam_queries_constantes(db, empresa, cliente_api):
+    empresa_id, email = empresa
+    cabecalhos = {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
+
+    semear(db, empresa_id, 0, LINHAS)
+    poucas = await medir(cliente_api, cabecalhos)
+    semear(db, empresa_id, LINHAS, LINHAS * 9)
+    muitas = await medir(cliente_api, cabecalhos)
+
+    assert all(isinstance(total, int) for total in poucas.values()), poucas
+    assert muitas == poucas, f"queries com {LINHAS} linhas: {poucas}; com {LINHAS * 10}: {muitas}"
@@ -0,0 +1,44 @@
+import base64
+import hashlib
+import os
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.services.media_client import baixar_para_arquivo
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_baixa_em_chunks_e_calcula_o_sha256(servidor_midia, tmp_path):
+    # Maior que um chunk, e não múltiplo dele
+    conteudo = os.urandom(3 * settings.MIDIA_CHUNK_BYTES + 17)
+    servidor_midia.rotas["/midia/1"] = (200, {"Content-Type": "image/jpeg"}, conteudo)
+    destino = tmp_path / "foto.part"
+
+    content_type, tamanho, sha256 = await baixar_para_arquivo(servidor_midia.url("/midia/1"), str(destino))
+
+    assert content_type == "image/jpeg"
+    assert tamanho == len(conteudo)
+    assert sha256 == hashlib.sha256(conteudo).hexdigest()
+    assert destino.read_bytes() == conteudo
+
+
+async def test_autentica_com_as_credenciais_da_twilio(servidor_midia, tmp_path):
+    servidor_midia.rotas["/midia/1"] = (200, {"Content-Type": "image/png"}, b"x")
+
+    await baixar_para_arquivo(servidor_midia.url("/midia/1"), str(tmp_path / "foto.part"))
+
+    credenciais = base64.b64encode(f"{settings.TWILIO_ACCOUNT_SID}:{settings.TWILIO_AUTH_TOKEN}".encode()).decode()
+    assert servidor_midia.requests[0][1]["Authorization"] == f"Basic {credenciais}"
+
+
+async def test_503_levanta_com_o_retry_after(servidor_midia, tmp_path):
+    servidor_midia.rotas["/midia/1"] = (503, {"Retry-After": "30"}, b"")
+
+    with pytest.raises(httpx.HTTPStatusError) as erro:
+        await baixar_para_arquivo(servidor_midia.url("/midia/1"), str(tmp_path / "foto.part"))
+
+    assert erro.value.response.status_code == 503
+    assert erro.value.response.headers["Retry-After"] == "30"
@@ -0,0 +1,68 @@
+# Import a frio dos pontos de entrada (`python -X importtime` num interpretador
+# novo): cada um tem um orçamento, e nenhum pode carregar as dependências
+# pesadas, que são importadas sob demanda por quem realmente as usa.
+
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+# Orçamento (ms) por ponto de entrada; vale a menor de REPETICOES medições
+ORCAMENTOS_MS = {
+    "app.main": 1500, # API (cada worker e o processo mestre do gunicorn)
+    "manage": 800, # CLI
+}
+REPETICOES = 3
+
+# IA, imagens, export e drivers do banco
+MODULOS_PROIBIDOS = (
+    "google.generativeai",
+    "grpc",
+    "pandas",
+    "twilio",
+    "PIL",
+    "openpyxl",
+    "asyncpg",
+    "psycopg2",
+)
+
+DIRETORIO_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LINHA = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def medir_import(modulo: str) -> tuple[float, set[str]]:
+    """Tempo cumulativo (ms) do import de `modulo` num interpretador novo e os módulos carregados."""
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=DIRETORIO_BACKEND,
+        env=os.environ, # O ambiente mínimo do conftest: o import não conecta em nada
+        capture_output=True,
+        text=True,
+    )
+    assert resultado.returncode == 0, f"Falha ao importar {modulo}:\n{resultado.stderr[-2000:]}"
+
+    cumulativo_us, modulos = 0, set()
+    for linha in resultado.stderr.splitlines():
+        encontrado = _LINHA.match(linha)
+        if not encontrado:
+            continue
+        nome = encontrado.group(4)
+        modulos.add(nome)
+        if nome == modulo:
+            cumulativo_us = int(encontrado.group(2))
+    return cumulativo_us / 1000, modulos
+
+
+@pytest.mark.parametrize("modulo", ORCAMENTOS_MS)
+def test_import_a_frio_dentro_do_orcamento(modulo):
+    medicoes = [medir_import(modulo) for _ in range(REPETICOES)]
+    tempo_ms = min(ms for ms, _ in medicoes)
+    proibidos = sorted(
+        nome for nome in medicoes[0][1]
+        if any(nome == proibido or nome.startswith(proibido + ".") for proibido in MODULOS_PROIBIDOS)
+    )
+
+    assert not proibidos, f"{modulo} carrega no import: {', '.join(proibidos)}"
+    assert tempo_ms <= ORCAMENTOS_MS[modulo], f"{modulo}: {tempo_ms:.0f} ms (orçamento: {ORCAMENTOS_MS[modulo]} ms)"
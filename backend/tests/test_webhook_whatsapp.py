@@ -0,0 +1,43 @@
+import pytest
+
+from app.core.config import settings
+from app.db import models
+
+pytestmark = pytest.mark.anyio
+
+FORMULARIO = {"From": "whatsapp:+5511900000001", "NumMedia": "1", "MediaUrl0": "https://api.twilio.invalid/m/1"}
+
+
+@pytest.fixture
+def fila(db):
+    """Remove no fim os jobs que o webhook enfileirou."""
+    yield
+    db.query(models.IngestaoFoto).filter(
+        models.IngestaoFoto.from_number == FORMULARIO["From"]
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+async def test_enfileira_a_foto_e_responde_na_hora(db, fila, cliente_api):
+    resposta = await cliente_api.post("/webhook/whatsapp", data={**FORMULARIO, "Body": "Loja Centro"})
+
+    assert resposta.status_code == 200
+    assert resposta.headers["content-type"].startswith("application/xml")
+    job = db.query(models.IngestaoFoto).filter(models.IngestaoFoto.from_number == FORMULARIO["From"]).one()
+    assert (job.media_url, job.legenda, job.status) == (FORMULARIO["MediaUrl0"], "Loja Centro", "pendente")
+
+
+async def test_fila_cheia_responde_503_com_retry_after(db, fila, cliente_api, monkeypatch):
+    monkeypatch.setattr(settings, "INGESTAO_MAX_PENDENTES", 0)
+
+    resposta = await cliente_api.post("/webhook/whatsapp", data=FORMULARIO)
+
+    assert resposta.status_code == 503
+    assert resposta.headers["Retry-After"] == "30"
+    assert db.query(models.IngestaoFoto).filter(models.IngestaoFoto.from_number == FORMULARIO["From"]).count() == 0
+
+
+async def test_mensagem_sem_midia_nao_enfileira(cliente_api):
+    resposta = await cliente_api.post("/webhook/whatsapp", data={"From": FORMULARIO["From"], "Body": "oi"})
+
+    assert resposta.status_code == 200
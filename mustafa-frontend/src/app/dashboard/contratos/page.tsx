@@ -8,7 +8,7 @@ interface Contrato {
   nome_promotor: string;
   cpf_promotor: string;
   nome_arquivo_original: string;
-  url_acesso: string; // Ex: /arquivos-contratos/uuid.pdf
+  url_acesso: string; // Ex: /midia/ab/cd/<sha256>.pdf?e=1&exp=...&sig=... (assinada pela API)
   data_upload: string;
 }
 
@@ -9,6 +9,9 @@ import { ImageModal } from '@/components/ImageModal';
 interface FotoPromotor {
   id: number;
   url_foto: string;
+  url_miniatura: string | null;
+  url_preview: string | null;
+  url_grande: string | null;
   legenda: string | null;
   data_envio: string;
 }
@@ -19,6 +22,8 @@ interface Promotor {
 
 export default function FotosPage() {
   const [fotos, setFotos] = useState<FotoPromotor[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [promotores, setPromotores] = useState<Promotor[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
@@ -47,19 +52,23 @@ export default function FotosPage() {
 
   // Envolvemos a lógica de busca em uma função `useCallback`
   // para estabilizá-la e usá-la como dependência do `useEffect` com segurança.
-  const fetchFotos = useCallback(() => {
-    setLoading(true);
-    setError(null);
-
+  const buildParams = useCallback(() => {
     const params = new URLSearchParams();
     if (selectedPromotor) params.append('promotor_id', selectedPromotor);
     if (dataInicio) params.append('data_inicio', dataInicio);
     if (dataFim) params.append('data_fim', dataFim);
     if (buscaLegenda) params.append('busca', buscaLegenda);
+    return params;
+  }, [selectedPromotor, dataInicio, dataFim, buscaLegenda]);
 
-    api.get('/fotos', { params })
+  const fetchFotos = useCallback(() => {
+    setLoading(true);
+    setError(null);
+
+    api.get('/fotos', { params: buildParams() })
       .then(response => {
-        setFotos(response.data);
+        setFotos(response.data.items);
+        setNextCursor(response.data.next_cursor);
       })
       .catch(err => {
         console.error("Falha ao buscar fotos:", err);
@@ -68,7 +77,29 @@ export default function FotosPage() {
       .finally(() => {
         setLoading(false);
       });
-  }, [selectedPromotor, dataInicio, dataFim, buscaLegenda]); // A função só será recriada se um destes filtros mudar
+  }, [buildParams]); // A função só será recriada se um dos filtros mudar
+
+  // Busca a próxima página (paginação por cursor) e acrescenta ao final da galeria
+  const fetchMaisFotos = () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+
+    const params = buildParams();
+    params.append('cursor', nextCursor);
+
+    api.get('/fotos', { params })
+      .then(response => {
+        setFotos(prev => [...prev, ...response.data.items]);
+        setNextCursor(response.data.next_cursor);
+      })
+      .catch(err => {
+        console.error("Falha ao buscar mais fotos:", err);
+        setError("Não foi possível carregar mais fotos.");
+      })
+      .finally(() => {
+        setLoadingMore(false);
+      });
+  };
 
   // useEffect para buscar os dados iniciais
   useEffect(() => {
@@ -133,7 +164,9 @@ export default function FotosPage() {
             ) : (
               <div className="grid grid-cols-1 sm:grid-cols-2 md:grid-cols-3 lg:grid-cols-4 gap-6">
                 {fotos.map(foto => {
-                  const imageUrl = `${process.env.NEXT_PUBLIC_API_URL}${foto.url_foto}`;
+                  // Usa os derivados reduzidos quando existirem (fotos antigas podem não ter)
+                  const imageUrl = `${process.env.NEXT_PUBLIC_API_URL}${foto.url_grande ?? foto.url_foto}`;
+                  const previewUrl = `${process.env.NEXT_PUBLIC_API_URL}${foto.url_preview ?? foto.url_foto}`;
                   return (
                     // <<< 4. MODIFICAR O CARD DA IMAGEM >>>
                     <div 
@@ -144,7 +177,7 @@ export default function FotosPage() {
                       {/* Remover o link <a> que abria em nova aba */}
                       <div className="relative w-full h-48">
                         <Image 
-                          src={imageUrl} 
+                          src={previewUrl} 
                           alt={foto.legenda || 'Foto de promotor'}
                           fill // fill ocupa o container pai
                           className="object-cover"
@@ -163,6 +196,14 @@ export default function FotosPage() {
               </div>
             )
           )}
+
+          {!loading && !error && nextCursor && (
+            <div className="text-center mt-6">
+              <button onClick={fetchMaisFotos} disabled={loadingMore} className="bg-blue-500 text-white px-4 py-2 rounded-md hover:bg-blue-600 disabled:opacity-50">
+                {loadingMore ? 'Carregando...' : 'Carregar mais'}
+              </button>
+            </div>
+          )}
         </div>
   
         {/* <<< 5. RENDERIZAR O COMPONENTE MODAL AQUI >>> */}